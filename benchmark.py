@@ -0,0 +1,1130 @@
+"""Benchmarks do coletor de preços usando servidores locais, sem acesso à rede.
+
+Uso:
+    python benchmark.py stream --ticks 20000 --moedas 200
+    python benchmark.py coleta --moedas 500 --exchanges 4 --latencia 50
+    python benchmark.py shards --processos 1,2,4 --moedas 400 --exchanges 4
+    python benchmark.py partida --mercados 3000 --moedas 200 --exchanges 4 --latencia 300
+    python benchmark.py matriz --moedas 1000 --exchanges 12
+    python benchmark.py ciclos --ativos 500 --exchanges 4 --arestas-por-lote 1000
+    python benchmark.py db --eventos 5000
+    python benchmark.py banco --linhas 2000000
+    python benchmark.py livro --moedas 5000 --exchanges 4
+    python benchmark.py telegram --alertas 2000 --moedas 20
+    python benchmark.py completo --moedas 100 --exchanges 4 --latencia 20 --erros 0.02 --limite 50
+    python benchmark.py arbitragem --chamadas 5000
+
+Com --salvar ARQUIVO (antes do comando) o resultado é acrescentado a um
+arquivo JSON Lines; com --comparar ARQUIVO ele é comparado com o último
+resultado salvo do mesmo comando e parâmetros, para detectar regressões:
+    python benchmark.py --comparar resultados.jsonl --salvar resultados.jsonl completo
+"""
+import os
+
+# Evita que o webhook inicie a coleta real ao ser importado
+os.environ.setdefault('COLETA_AUTOMATICA', '0')
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import random
+import re
+import resource
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+import ccxt
+import ccxt.async_support
+import aiohttp
+import numpy as np
+import socketio
+from aiohttp import web
+
+import webhook
+import robo_telegram
+
+
+def percentil(valores, p):
+    """Retorna o percentil `p` (0-100) de uma lista de valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+async def iniciar_servidor(rotas):
+    """Sobe um servidor aiohttp em uma porta livre de localhost e retorna (runner, porta)."""
+    aplicacao = web.Application()
+    aplicacao.add_routes(rotas)
+    runner = web.AppRunner(aplicacao)
+    await runner.setup()
+    site = web.TCPSite(runner, 'localhost', 0)
+    await site.start()
+    porta = site._server.sockets[0].getsockname()[1]
+    return runner, porta
+
+
+class ServidorStreamFalso:
+    """Feed WebSocket local no formato esperado por webhook.assistir_stream_bruto.
+
+    Cada tick leva como preço o seu número de sequência, o que permite medir a
+    latência entre o envio pelo servidor e a emissão pelo coletor.
+    """
+    def __init__(self, ticks, exchanges, taxa=0, desconectar_a_cada=0):
+        self.ticks = ticks
+        self.exchanges = exchanges
+        self.taxa = taxa
+        self.desconectar_a_cada = desconectar_a_cada
+        self.proximo = 0
+        self.enviados = {}
+        self.conexoes = 0
+        self.concluido = asyncio.Event()
+
+    async def tratar(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.conexoes += 1
+        assinatura = await ws.receive_json()
+        moedas = assinatura['moedas']
+        enviados_na_conexao = 0
+        while self.proximo < self.ticks:
+            seq = self.proximo
+            self.proximo += 1
+            self.enviados[seq] = time.perf_counter()
+            await ws.send_json({
+                'exchange': self.exchanges[seq % len(self.exchanges)],
+                'moeda': moedas[seq % len(moedas)],
+                'preco': float(seq)
+            })
+            enviados_na_conexao += 1
+            if self.desconectar_a_cada and enviados_na_conexao >= self.desconectar_a_cada:
+                await ws.close()
+                return ws
+            if self.taxa:
+                await asyncio.sleep(1 / self.taxa)
+            elif seq % 100 == 0:
+                await asyncio.sleep(0)
+        self.concluido.set()
+        await ws.close()
+        return ws
+
+
+async def benchmark_stream(args):
+    """Mede latência tick-emissão e vazão do modo 'stream' contra um feed local."""
+    servidor = ServidorStreamFalso(args.ticks, ['BINANCE', 'KRAKEN', 'GATE', 'MEXC'], args.taxa, args.desconectar_a_cada)
+    runner, porta = await iniciar_servidor([web.get('/ws', servidor.tratar)])
+    moedas = [f"M{i}/USDT" for i in range(args.moedas)]
+    latencias = []
+
+    def emitir(exchange_name, moeda, preco, timestamp=None, topo=None):
+        latencias.append(time.perf_counter() - servidor.enviados[int(preco)])
+
+    inicio = time.perf_counter()
+    cliente = asyncio.create_task(webhook.assistir_stream_bruto(f"http://localhost:{porta}/ws", moedas, emitir))
+    await servidor.concluido.wait()
+    while len(latencias) < args.ticks and time.perf_counter() - inicio < args.ticks / 1000 + 30:
+        await asyncio.sleep(0.01)
+    duracao = time.perf_counter() - inicio
+    cliente.cancel()
+    await runner.cleanup()
+
+    print(f"Ticks recebidos: {len(latencias)}/{args.ticks} em {duracao:.2f}s ({len(latencias) / duracao:,.0f} ticks/s)")
+    print(f"Conexões: {servidor.conexoes}")
+    if latencias:
+        print(f"Latência tick-emissão: média {statistics.mean(latencias) * 1000:.3f} ms, "
+              f"p50 {percentil(latencias, 50) * 1000:.3f} ms, p99 {percentil(latencias, 99) * 1000:.3f} ms")
+    return {'ticks_por_s': len(latencias) / duracao, 'latencia_p50_ms': percentil(latencias, 50) * 1000,
+            'latencia_p99_ms': percentil(latencias, 99) * 1000}
+
+
+def servidor_em_thread(rotas):
+    """Sobe um servidor aiohttp em uma thread com loop próprio e retorna a porta."""
+    pronta = threading.Event()
+    resultado = {}
+
+    def rodar():
+        loop = asyncio.new_event_loop()
+        _, resultado['porta'] = loop.run_until_complete(iniciar_servidor(rotas))
+        pronta.set()
+        loop.run_forever()
+    threading.Thread(target=rodar, daemon=True).start()
+    pronta.wait()
+    return resultado['porta']
+
+
+class ExchangeFalsa:
+    """Exchange REST local compatível com os endpoints de ticker da Binance usados pelo ccxt.
+
+    Roda em uma thread com loop próprio, para atender tanto clientes síncronos
+    quanto assíncronos. `latencia` é o atraso, em segundos, de cada resposta.
+    O exchangeInfo lista `mercados` pares spot M{i}USDT. Uma fração `erros` das
+    requisições de ticker recebe 503, e as que passam de `limite` por segundo
+    recebem 429, como nas exchanges reais. Todos os preços valem 1.0 até
+    `saltar` mudar o de um par; o momento em que o novo preço é servido pela
+    primeira vez fica em `servidos`. Com `variacao`, cada resposta oscila o
+    preço aleatoriamente nessa fração, para que todo tick seja uma mudança.
+    """
+    def __init__(self, latencia=0.0, mercados=0, erros=0.0, limite=0, variacao=0.0):
+        self.latencia = latencia
+        self.mercados = mercados
+        self.erros = erros
+        self.limite = limite
+        self.variacao = variacao
+        self.requisicoes = 0
+        self.recusadas = 0
+        self.limitadas = 0
+        self.precos = {}
+        self.servidos = {}
+        self.segundo = 0
+        self.requisicoes_no_segundo = 0
+
+    def saltar(self, market_id, preco):
+        """Muda o preço de um par a partir da próxima resposta."""
+        self.precos[market_id] = preco
+        self.servidos.pop(market_id, None)
+
+    def ticker(self, market_id):
+        preco = self.precos.get(market_id, 1.0)
+        if self.variacao:
+            preco *= 1 + random.uniform(-self.variacao, self.variacao)
+        if market_id in self.precos and market_id not in self.servidos:
+            self.servidos[market_id] = time.perf_counter()
+        return {
+            'symbol': market_id,
+            'lastPrice': str(preco),
+            'bidPrice': str(preco * 0.99),
+            'bidQty': '1000',
+            'askPrice': str(preco * 1.01),
+            'askQty': '1000',
+            'volume': '1000000',
+            'quoteVolume': str(preco * 1000000),
+            'closeTime': int(time.time() * 1000)
+        }
+
+    def recusar(self):
+        """Resposta de erro simulada para esta requisição, ou None para atendê-la."""
+        if self.limite:
+            segundo = int(time.monotonic())
+            if segundo != self.segundo:
+                self.segundo, self.requisicoes_no_segundo = segundo, 0
+            self.requisicoes_no_segundo += 1
+            if self.requisicoes_no_segundo > self.limite:
+                self.limitadas += 1
+                return web.json_response({'code': -1003, 'msg': 'Too many requests.'}, status=429)
+        if self.erros and random.random() < self.erros:
+            self.recusadas += 1
+            return web.Response(status=503, text='Service Unavailable')
+        return None
+
+    async def tratar_ticker(self, request):
+        self.requisicoes += 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        recusa = self.recusar()
+        if recusa is not None:
+            return recusa
+        if 'symbol' in request.query:
+            return web.json_response(self.ticker(request.query['symbol']))
+        market_ids = json.loads(request.query.get('symbols', '[]'))
+        return web.json_response([self.ticker(market_id) for market_id in market_ids])
+
+    async def tratar_exchange_info(self, request):
+        self.requisicoes += 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        return web.json_response({'serverTime': int(time.time() * 1000), 'symbols': [{
+            'symbol': f"M{i}USDT", 'status': 'TRADING', 'baseAsset': f"M{i}", 'quoteAsset': 'USDT',
+            'baseAssetPrecision': 8, 'quotePrecision': 8, 'isSpotTradingAllowed': True,
+            'isMarginTradingAllowed': False, 'permissions': ['SPOT'], 'filters': []
+        } for i in range(self.mercados)]})
+
+    def iniciar(self):
+        """Inicia o servidor em segundo plano e retorna a URL base da API pública."""
+        porta = servidor_em_thread([web.get('/api/v3/ticker/24hr', self.tratar_ticker),
+                                    web.get('/api/v3/exchangeInfo', self.tratar_exchange_info)])
+        return f"http://localhost:{porta}/api/v3"
+
+
+class TelegramFalso:
+    """Bot API local: registra as mensagens recebidas e responde 429 a cada `limite_a_cada` requisições."""
+    def __init__(self, latencia=0.0, limite_a_cada=0, retry_after=1):
+        self.latencia = latencia
+        self.limite_a_cada = limite_a_cada
+        self.retry_after = retry_after
+        self.requisicoes = 0
+        self.recusadas = 0
+        self.mensagens = []
+
+    async def tratar_send_message(self, request):
+        self.requisicoes += 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        if self.limite_a_cada and self.requisicoes % self.limite_a_cada == 0:
+            self.recusadas += 1
+            return web.json_response({'ok': False, 'error_code': 429, 'parameters': {'retry_after': self.retry_after}}, status=429)
+        dados = await request.json()
+        self.mensagens.append((time.perf_counter(), dados['text']))
+        return web.json_response({'ok': True, 'result': {'message_id': len(self.mensagens)}})
+
+    def iniciar(self):
+        """Inicia o servidor em segundo plano e retorna a URL base a usar em TELEGRAM_API_URL."""
+        porta = servidor_em_thread([web.post('/bot{token}/sendMessage', self.tratar_send_message)])
+        return f"http://localhost:{porta}"
+
+
+def configurar_cliente_falso(cliente, url, moedas):
+    """Aponta um cliente ccxt binance (síncrono ou assíncrono) para a ExchangeFalsa."""
+    cliente.urls['api']['public'] = url
+    cliente.rateLimit = 0.001
+    cliente.enableRateLimit = False
+    cliente.set_markets([{
+        'id': moeda.replace('/', ''), 'symbol': moeda, 'base': moeda.split('/')[0], 'quote': 'USDT',
+        'baseId': moeda.split('/')[0], 'quoteId': 'USDT', 'type': 'spot', 'spot': True, 'margin': False,
+        'swap': False, 'future': False, 'option': False, 'contract': False, 'linear': None, 'inverse': None,
+        'active': True, 'precision': {}, 'limits': {}, 'info': {}
+    } for moeda in moedas])
+    return cliente
+
+
+def coleta_threads(clientes, moedas, workers):
+    """Um ciclo do caminho com threads (AgendadorRequisicoes + ThreadPoolExecutor). Retorna preços emitidos."""
+    emitidos = []
+    agendador = webhook.AgendadorRequisicoes(clientes, max_workers=workers)
+    futuros = [
+        agendador.agendar(nome, moeda, webhook.buscar_preco_exchange, nome, cliente, moeda, lambda *dados: emitidos.append(dados))
+        for nome, cliente in clientes.items() for moeda in moedas
+    ]
+    concurrent.futures.wait(futuros)
+    return len(emitidos), threading.active_count()
+
+
+async def coleta_async(url, nomes, moedas):
+    """Um ciclo do ColetorAssincrono. Retorna preços emitidos.
+
+    Uma sessão aiohttp por exchange: as exchanges falsas dividem o mesmo host, e
+    o limit_per_host da sessão única de buscar_precos_async as limitaria juntas.
+    """
+    emitidos = []
+    sessoes = {nome: aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=webhook.CONCORRENCIA_POR_EXCHANGE)) for nome in nomes}
+    clientes = {
+        nome: configurar_cliente_falso(ccxt.async_support.binance({'session': sessao}), url, moedas)
+        for nome, sessao in sessoes.items()
+    }
+    coletor = webhook.ColetorAssincrono(clientes, lambda *dados: emitidos.append(dados))
+    await coletor.ciclo(moedas)
+    coletor.emissor.shutdown(wait=True)
+    threads = threading.active_count()
+    for cliente in clientes.values():
+        await cliente.close()
+    for sessao in sessoes.values():
+        await sessao.close()
+    return len(emitidos), threads
+
+
+async def benchmark_coleta(args):
+    """Compara vazão e memória do coletor com threads e do coletor asyncio contra uma ExchangeFalsa.
+
+    Cada caminho roda em um processo separado para que o pico de memória (RSS)
+    de um não contamine a medição do outro.
+    """
+    caminhos = args.caminhos.split(',')
+    if len(caminhos) > 1:
+        for caminho in caminhos:
+            argv = [arg for arg in sys.argv[1:] if not arg.startswith('--caminhos')]
+            subprocess.run([sys.executable, sys.argv[0], *argv, f'--caminhos={caminho}'], check=True)
+        return None
+
+    exchange_falsa = ExchangeFalsa(args.latencia / 1000)
+    url = exchange_falsa.iniciar()
+    moedas = [f"M{i}/USDT" for i in range(args.moedas)]
+    nomes = [f"exchange{i}" for i in range(args.exchanges)]
+    total = len(moedas) * len(nomes)
+    memoria_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    inicio = time.perf_counter()
+    if caminhos[0] == 'threads':
+        clientes = {nome: configurar_cliente_falso(ccxt.binance(), url, moedas) for nome in nomes}
+        emitidos, threads = await asyncio.to_thread(coleta_threads, clientes, moedas, args.workers)
+    else:
+        emitidos, threads = await coleta_async(url, nomes, moedas)
+    duracao = time.perf_counter() - inicio
+    memoria = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoria_inicial) / 1024
+    print(f"{caminhos[0]:>7}: {emitidos}/{total} preços em {duracao:.2f}s ({emitidos / duracao:,.0f} req/s), "
+          f"+{memoria:.1f} MiB de pico RSS, {threads} threads")
+    return {'requisicoes_por_s': emitidos / duracao, 'memoria_mib': memoria}
+
+
+def coletor_falso(indice, total, fila, moedas, exchanges):
+    """Processo coletor do benchmark de shards: webhook.coletar_shard contra uma ExchangeFalsa própria."""
+    url = ExchangeFalsa().iniciar()
+    webhook.EXCHANGES = {nome: configurar_cliente_falso(ccxt.binance(), url, moedas) for nome in exchanges}
+    webhook.MOEDAS = moedas
+    webhook.MODO_COLETA = 'individual'
+    webhook.INTERVALO_BUSCA = 0.5
+    logging.getLogger().setLevel(logging.WARNING)
+    webhook.coletar_shard(indice, total, fila)
+
+
+async def benchmark_shards(args):
+    """Vazão de ticks recebidos pelo servidor com 1..N processos coletores (LancadorShards).
+
+    Cada coletor tem a sua ExchangeFalsa no mesmo processo, então o custo do
+    servidor falso escala junto com os coletores. O ganho só aparece com núcleos
+    livres: com P núcleos a vazão cresce até perto de P processos.
+    """
+    moedas = [f"M{i}/USDT" for i in range(args.moedas)]
+    exchanges = [f"exchange{i}" for i in range(args.exchanges)]
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"{os.cpu_count()} núcleos, {len(moedas) * len(exchanges)} pares (exchange, moeda)")
+    base = None
+    resultados = {}
+    for total in [int(processos) for processos in args.processos.split(',')]:
+        recebidos = []
+        lancador = webhook.LancadorShards(total, coletor_falso, (moedas, exchanges), emitir=lambda *dados: recebidos.append(1))
+        lancador.iniciar()
+        while not recebidos:
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(args.aquecimento)
+        inicio, contagem_inicial = time.perf_counter(), len(recebidos)
+        await asyncio.sleep(args.duracao)
+        vazao = (len(recebidos) - contagem_inicial) / (time.perf_counter() - inicio)
+        lancador.parar()
+        base = base or vazao
+        print(f"{total} coletor(es): {vazao:,.0f} ticks/s ({vazao / base:.2f}x)")
+        resultados[f'ticks_{total}_coletores_por_s'] = vazao
+    return resultados
+
+
+def primeiro_preco(url, cache, nome, moedas):
+    """Da criação do cliente até o primeiro preço: mercados (cache ou download) e um fetch_tickers. Retorna segundos."""
+    inicio = time.perf_counter()
+    cliente = ccxt.binance({'options': {'fetchMarkets': {'types': ['spot']}, 'fetchCurrencies': False}})
+    cliente.urls['api']['public'] = url
+    if not cache.aplicar(nome, cliente):
+        cache.carregar(nome, cliente)
+    tickers = cliente.fetch_tickers(cache.moedas_suportadas(nome, cliente, moedas))
+    assert any(ticker['last'] for ticker in tickers.values())
+    return time.perf_counter() - inicio
+
+
+async def benchmark_partida(args):
+    """Tempo até o primeiro preço de cada exchange com o cache de mercados vazio (partida a frio) e preenchido.
+
+    Os mercados vêm do exchangeInfo de uma ExchangeFalsa com `latencia` por
+    resposta; as exchanges são preparadas em paralelo, como no agendador.
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    exchange = ExchangeFalsa(args.latencia / 1000, args.mercados)
+    url = exchange.iniciar()
+    # Metade das moedas não é listada, para exercitar o índice de suporte
+    moedas = [f"M{i}/USDT" for i in range(0, args.moedas * 2, 2)] + [f"X{i}/USDT" for i in range(args.moedas)]
+    nomes = [f"exchange{i}" for i in range(args.exchanges)]
+    with tempfile.TemporaryDirectory() as diretorio:
+        cache = webhook.CacheMercados(diretorio, webhook.VALIDADE_CACHE_MERCADOS)
+        resultados = {}
+        with concurrent.futures.ThreadPoolExecutor(len(nomes)) as executor:
+            for rotulo, chave in (('a frio', 'frio'), ('com cache', 'cache')):
+                inicio = time.perf_counter()
+                tempos = list(executor.map(lambda nome: primeiro_preco(url, cache, nome, moedas), nomes))
+                total = time.perf_counter() - inicio
+                print(f"Partida {rotulo}: primeiro preço em {min(tempos):.3f}s, todas as {len(nomes)} exchanges em {total:.3f}s "
+                      f"({args.mercados} mercados, latência {args.latencia:.0f} ms)")
+                cache.indices.clear()
+                resultados[f'primeiro_preco_{chave}_s'] = min(tempos)
+                resultados[f'todas_{chave}_s'] = total
+    return resultados
+
+
+async def benchmark_matriz(args):
+    """Mede o custo por tick de atualizar a MatrizOportunidades e consultar as oportunidades da moeda."""
+    gerador = np.random.default_rng(42)
+    exchanges = [f"EXCHANGE{i}" for i in range(args.exchanges)]
+    taxas = dict(zip(exchanges, gerador.uniform(0.0005, 0.003, args.exchanges)))
+    matriz = robo_telegram.MatrizOportunidades(taxas)
+    moedas = [f"M{i}/USDT" for i in range(args.moedas)]
+    base = gerador.uniform(0.01, 1000, args.moedas)
+    for i, moeda in enumerate(moedas):
+        for exchange in exchanges:
+            matriz.atualizar(moeda, exchange, base[i])
+
+    indices_moeda = gerador.integers(0, args.moedas, args.ticks)
+    indices_exchange = gerador.integers(0, args.exchanges, args.ticks)
+    variacoes = gerador.normal(1, 0.01, args.ticks)
+    tempos = []
+    encontradas = 0
+    for i in range(args.ticks):
+        moeda = moedas[indices_moeda[i]]
+        inicio = time.perf_counter()
+        matriz.atualizar(moeda, exchanges[indices_exchange[i]], base[indices_moeda[i]] * variacoes[i])
+        encontradas += len(matriz.oportunidades(moeda))
+        tempos.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    ranking = matriz.ranking(limite=20)
+    tempo_ranking = time.perf_counter() - inicio
+    print(f"{args.ticks} ticks, {args.moedas} moedas × {args.exchanges} exchanges: "
+          f"média {statistics.mean(tempos) * 1e6:.1f} µs, p50 {percentil(tempos, 50) * 1e6:.1f} µs, "
+          f"p99 {percentil(tempos, 99) * 1e6:.1f} µs por tick ({encontradas} oportunidades)")
+    print(f"Ranking global (top {len(ranking)}) em {tempo_ranking * 1000:.2f} ms")
+    return {'tick_p50_us': percentil(tempos, 50) * 1e6, 'tick_p99_us': percentil(tempos, 99) * 1e6,
+            'ranking_ms': tempo_ranking * 1000}
+
+
+async def benchmark_ciclos(args):
+    """Mede a busca de ciclos do GrafoArbitragem por lote de arestas alteradas, com um ciclo triangular injetado."""
+    gerador = np.random.default_rng(42)
+    exchanges = [f"EXCHANGE{i}" for i in range(args.exchanges)]
+    taxas = dict(zip(exchanges, gerador.uniform(0.0005, 0.003, args.exchanges)))
+    grafo = robo_telegram.GrafoArbitragem(taxas, comprimento_maximo=args.comprimento)
+    cotacoes = ['USDT', 'BTC', 'ETH']
+    valores = dict(zip([f"A{i}" for i in range(args.ativos)], gerador.uniform(0.01, 1000, args.ativos)))
+    valores.update(USDT=1.0, BTC=60000.0, ETH=3000.0)
+    pares = [(base, quote) for base in valores if base not in cotacoes for quote in cotacoes]
+    pares += [('BTC', 'USDT'), ('ETH', 'USDT'), ('ETH', 'BTC')]
+    for exchange in exchanges:
+        for base, quote in pares:
+            grafo.atualizar(exchange, f"{base}/{quote}", valores[base] / valores[quote] * gerador.normal(1, 0.0002))
+    grafo.ciclos()
+    arestas = sum(len(por_exchange) for destinos in grafo.arestas for por_exchange in destinos.values())
+
+    tempos = []
+    encontrados = 0
+    for lote in range(args.lotes):
+        for i in gerador.integers(0, len(pares), args.arestas_por_lote):
+            base, quote = pares[i]
+            exchange = exchanges[gerador.integers(0, args.exchanges)]
+            grafo.atualizar(exchange, f"{base}/{quote}", valores[base] / valores[quote] * gerador.normal(1, 0.0002))
+        if lote == args.lotes - 1:
+            # Distorce um par em todas as exchanges: sem arbitragem simples, só o ciclo triangular
+            for exchange in exchanges:
+                grafo.atualizar(exchange, "A7/BTC", valores['A7'] / valores['BTC'] * 1.05)
+        inicio = time.perf_counter()
+        ciclos = grafo.ciclos()
+        tempos.append(time.perf_counter() - inicio)
+        encontrados += len(ciclos)
+
+    print(f"{len(grafo.ativos)} ativos, {arestas} arestas, {args.lotes} lotes de {args.arestas_por_lote} preços: "
+          f"busca média {statistics.mean(tempos) * 1000:.1f} ms, p50 {percentil(tempos, 50) * 1000:.1f} ms, "
+          f"p99 {percentil(tempos, 99) * 1000:.1f} ms")
+    print(f"{encontrados} ciclos encontrados; melhor no lote com distorção: "
+          + (" → ".join(passo.ativo_de for passo in ciclos[0].passos) + f" ({ciclos[0].lucro_percentual:.2f}%)" if ciclos else "nenhum"))
+    return {'busca_p50_ms': percentil(tempos, 50) * 1000, 'busca_p99_ms': percentil(tempos, 99) * 1000}
+
+
+def eventos_db(quantidade, moedas=200):
+    """Gera parâmetros de mensagem no formato usado por realizar_arbitragem."""
+    for i in range(quantidade):
+        moeda = f"M{i % moedas}/USDT"
+        yield (moeda, 'KRAKEN', 'MEXC', 1.0 + i * 1e-6, 1.02 + i * 1e-6, 2.0, 50.0, 0.6, 1767225600.0 + i * 60)
+
+
+def db_por_conexao(db_path, eventos):
+    """Reproduz o padrão anterior: uma conexão e um commit por operação, sem WAL."""
+    def executar(sql, parametros, ler=False):
+        with sqlite3.connect(db_path) as conexao:
+            cursor = conexao.execute(sql, parametros)
+            resultado = cursor.fetchone() if ler else None
+            conexao.commit()
+            return resultado
+
+    for parametros in eventos:
+        moeda = parametros[0]
+        executar("SELECT * FROM oportunidades WHERE moeda = ?", (moeda,), ler=True)
+        executar('''SELECT * FROM mensagens_enviadas WHERE moeda = ? AND compra_exchange = ? AND venda_exchange = ? AND
+                    preco_compra = ? AND preco_venda = ? AND diferenca_percentual = ? AND quantidade = ? AND
+                    lucro_liquido = ? AND data_hora = ?''', parametros, ler=True)
+        executar("INSERT OR IGNORE INTO mensagens_enviadas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", parametros)
+        executar('''INSERT INTO oportunidades VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(moeda) DO UPDATE SET
+                    preco_compra = excluded.preco_compra, preco_venda = excluded.preco_venda''',
+                 (moeda, 'KRAKEN', 'MEXC', parametros[3], parametros[4], parametros[7], datetime.now().isoformat()))
+
+
+def db_gerenciador(db_path, eventos):
+    """Fluxo de realizar_arbitragem para um alerta: CacheOportunidades em memória e DatabaseManager com escrita em lote.
+
+    Todo evento é registrado, como se a supressão não o tivesse barrado, para
+    gravar o mesmo volume que o padrão anterior.
+    """
+    db_manager = robo_telegram.DatabaseManager(db_path)
+    cache = robo_telegram.CacheOportunidades(db_manager)
+    for parametros in eventos:
+        moeda, compra, venda, preco_compra, preco_venda, _, _, lucro_liquido, _ = parametros
+        cache.motivo_supressao(moeda, compra, venda, preco_compra, preco_venda, lucro_liquido)
+        cache.registrar(moeda, compra, venda, preco_compra, preco_venda, lucro_liquido)
+        db_manager.registrar_mensagem_enviada(parametros)
+    db_manager.fechar()
+
+
+def livro_dicionarios(eventos):
+    """Reproduz o padrão anterior: dicionário de dicionários com um PrecoRecebido por (moeda, exchange)."""
+    precos_exchanges = {}
+    for moeda, exchange, preco, recebido_em in eventos:
+        if moeda not in precos_exchanges:
+            precos_exchanges[moeda] = {}
+        precos_exchanges[moeda][exchange] = robo_telegram.PrecoRecebido(preco, recebido_em, recebido_em)
+        precos = precos_exchanges[moeda]
+        if len(precos) >= 2:
+            max(preco.recebido_em for preco in precos.values())
+            menor = min(precos, key=lambda exchange: precos[exchange].preco)
+            maior = max(precos, key=lambda exchange: precos[exchange].preco)
+            (precos[maior].preco / precos[menor].preco - 1) * 100
+    return precos_exchanges
+
+
+def livro_arrays(eventos):
+    """Mesmo fluxo por evento com o LivroPrecos."""
+    livro = robo_telegram.LivroPrecos()
+    for moeda, exchange, preco, recebido_em in eventos:
+        livro.atualizar(moeda, exchange, preco, recebido_em, recebido_em)
+        if livro.spread_bruto(moeda) is not None:
+            livro.recebido_em(moeda)
+    return livro
+
+
+async def benchmark_livro(args):
+    """Custo por evento e memória do LivroPrecos contra o dicionário de dicionários que ele substituiu.
+
+    Cada evento grava um preço e faz as consultas de verificar_moeda
+    (quantidade de exchanges, recebimento mais recente e spread bruto). A
+    memória é a retida pela estrutura com todas as moedas em todas as exchanges,
+    e o pico do tracemalloc durante a montagem. O LivroPrecos guarda também o topo
+    do ticker, que antes tinha uma segunda cópia na MatrizOportunidades.
+    """
+    gerador = np.random.default_rng(42)
+    moedas = [f"M{i}/USDT" for i in range(args.moedas)]
+    exchanges = [f"EXCHANGE{i}" for i in range(args.exchanges)]
+    indices_moeda = gerador.integers(0, args.moedas, args.eventos).tolist()
+    indices_exchange = gerador.integers(0, args.exchanges, args.eventos).tolist()
+    precos = gerador.uniform(0.99, 1.01, args.eventos).tolist()
+    eventos = [(moedas[m], exchanges[e], preco, float(i)) for i, (m, e, preco) in enumerate(zip(indices_moeda, indices_exchange, precos))]
+    completos = [(moeda, exchange, 1.0, 0.0) for moeda in moedas for exchange in exchanges]
+
+    resultados = {}
+    for nome, chave, funcao in [('dicionários', 'dicionarios', livro_dicionarios), ('LivroPrecos', 'arrays', livro_arrays)]:
+        funcao(completos)
+        inicio = time.perf_counter()
+        funcao(eventos)
+        duracao = time.perf_counter() - inicio
+        tracemalloc.start()
+        estrutura = funcao(completos)
+        memoria, pico = (valor / 2 ** 20 for valor in tracemalloc.get_traced_memory())
+        tracemalloc.stop()
+        del estrutura
+        resultados[f'evento_{chave}_us'] = duracao / args.eventos * 1e6
+        resultados[f'memoria_{chave}_mib'] = memoria
+        resultados[f'pico_{chave}_mib'] = pico
+        print(f"{nome:>12}: {duracao / args.eventos * 1e6:.2f} µs por evento, {memoria:.2f} MiB retidos "
+              f"(pico {pico:.2f} MiB) com {args.moedas} moedas × {args.exchanges} exchanges")
+    return resultados
+
+
+async def benchmark_db(args):
+    """Eventos/s do fluxo de banco de um alerta: o padrão anterior (2 leituras + 2 escritas no disco) contra o atual."""
+    resultados = {}
+    for nome, chave, funcao in [('por conexão', 'por_conexao', db_por_conexao), ('gerenciador', 'gerenciador', db_gerenciador)]:
+        with tempfile.TemporaryDirectory() as diretorio:
+            db_path = os.path.join(diretorio, 'arbitragem.db')
+            robo_telegram.DatabaseManager(db_path).inicializar_tabelas()
+            inicio = time.perf_counter()
+            funcao(db_path, eventos_db(args.eventos))
+            duracao = time.perf_counter() - inicio
+            with sqlite3.connect(db_path) as conexao:
+                gravadas = conexao.execute("SELECT COUNT(*) FROM mensagens_enviadas").fetchone()[0]
+            print(f"{nome:>12}: {args.eventos / duracao:,.0f} eventos/s ({gravadas} mensagens gravadas)")
+        resultados[f'eventos_{chave}_por_s'] = args.eventos / duracao
+    return resultados
+
+
+# Esquema 1 de mensagens_enviadas (tudo TEXT, UNIQUE em todas as colunas), migrado por inicializar_tabelas
+ESQUEMA_MENSAGENS_V1 = '''
+CREATE TABLE mensagens_enviadas (
+    moeda TEXT, compra_exchange TEXT, venda_exchange TEXT, preco_compra TEXT, preco_venda TEXT,
+    diferenca_percentual TEXT, quantidade TEXT, lucro_liquido TEXT, data_hora TEXT,
+    UNIQUE(moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, diferenca_percentual, quantidade, lucro_liquido, data_hora)
+);
+CREATE INDEX idx_mensagens_par_data ON mensagens_enviadas (moeda, compra_exchange, venda_exchange, data_hora);
+CREATE INDEX idx_mensagens_data ON mensagens_enviadas (data_hora);
+CREATE TABLE oportunidades (
+    moeda TEXT PRIMARY KEY, compra_exchange TEXT, venda_exchange TEXT, preco_compra REAL, preco_venda REAL,
+    lucro_liquido REAL, timestamp TEXT
+);
+'''
+
+
+def criar_banco_v1(db_path, linhas, moedas, dias, agora):
+    """Cria um banco no esquema 1 com `linhas` mensagens espalhadas pelos últimos `dias` dias."""
+    gerador = np.random.default_rng(42)
+    exchanges = ['BINANCE', 'KRAKEN', 'MEXC', 'BYBIT', 'OKX', 'GATE']
+    with sqlite3.connect(db_path) as conexao:
+        conexao.executescript(ESQUEMA_MENSAGENS_V1)
+        for inicio in range(0, linhas, 100000):
+            quantidade = min(100000, linhas - inicio)
+            indices_moeda = gerador.integers(0, moedas, quantidade).tolist()
+            compras = gerador.integers(0, len(exchanges), quantidade).tolist()
+            deslocamentos = gerador.integers(1, len(exchanges), quantidade).tolist()
+            precos = gerador.uniform(0.5, 2.0, quantidade).tolist()
+            spreads = gerador.uniform(0.5, 5.0, quantidade).tolist()
+            # Em ordem cronológica, como o robô grava
+            datas = np.sort(gerador.uniform(inicio, inicio + quantidade, quantidade) / linhas * dias * 86400
+                            + agora - dias * 86400).tolist()
+            conexao.executemany("INSERT OR IGNORE INTO mensagens_enviadas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (f"M{m}/USDT", exchanges[c], exchanges[(c + d) % len(exchanges)], str(preco), str(preco * (1 + spread / 100)),
+                 str(spread), str(1000 / preco), str(10 * spread - 2), datetime.fromtimestamp(data).strftime('%Y-%m-%d %H:%M'))
+                for m, c, d, preco, spread, data in zip(indices_moeda, compras, deslocamentos, precos, spreads, datas)
+            ])
+    return os.path.getsize(db_path)
+
+
+def cronometrar(funcao, repeticoes=3):
+    """Melhor tempo, em ms, de `repeticoes` execuções de `funcao`, e o último resultado."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos) * 1000, resultado
+
+
+async def benchmark_banco(args):
+    """Manutenção do banco sobre um arquivo sintético no esquema antigo com milhões de mensagens.
+
+    Mede a migração para colunas tipadas, duas consultas de painel (spread
+    médio por hora e par nas últimas 24h e por par nos últimos 7 dias) na
+    tabela de mensagens contra o resumo por hora e uma rodada de manter() com a
+    retenção padrão, que apaga as mensagens mais velhas e compacta o arquivo.
+    O resumo só ganha das consultas na tabela quando cada linha dele junta
+    várias mensagens: com poucas mensagens por moeda, par e hora (muitas moedas
+    ou poucas linhas), as duas consultas leem quase o mesmo número de linhas.
+    """
+    agora = time.time()
+    desde = agora - 86400
+    semana = agora - 7 * 86400
+    pares_mensagens = '''
+    SELECT moeda, compra_exchange, venda_exchange, COUNT(*), AVG(diferenca_percentual)
+    FROM mensagens_enviadas WHERE data_hora >= ? GROUP BY 1, 2, 3
+    '''
+    pares_resumo = '''
+    SELECT moeda, compra_exchange, venda_exchange, SUM(alertas), SUM(soma_spread) / SUM(alertas)
+    FROM oportunidades_por_hora WHERE hora >= ? GROUP BY 1, 2, 3
+    '''
+    consulta_v1 = '''
+    SELECT substr(data_hora, 1, 13), moeda, compra_exchange, venda_exchange, COUNT(*), AVG(diferenca_percentual)
+    FROM mensagens_enviadas WHERE data_hora >= ? GROUP BY 1, 2, 3, 4
+    '''
+    consulta_v2 = '''
+    SELECT CAST(data_hora / 3600 AS INTEGER) * 3600, moeda, compra_exchange, venda_exchange, COUNT(*), AVG(diferenca_percentual)
+    FROM mensagens_enviadas WHERE data_hora >= ? GROUP BY 1, 2, 3, 4
+    '''
+    with tempfile.TemporaryDirectory() as diretorio:
+        db_path = os.path.join(diretorio, 'arbitragem.db')
+        inicio = time.perf_counter()
+        tamanho_v1 = criar_banco_v1(db_path, args.linhas, args.moedas, args.dias, agora)
+        print(f"Banco no esquema 1 com {args.linhas:,} mensagens criado em {time.perf_counter() - inicio:.1f}s: "
+              f"{tamanho_v1 / 2 ** 20:.0f} MiB")
+        with sqlite3.connect(db_path) as conexao:
+            painel_v1_ms, linhas_v1 = cronometrar(lambda: conexao.execute(
+                consulta_v1, (datetime.fromtimestamp(desde).strftime('%Y-%m-%d %H:%M'),)).fetchall())
+
+        banco = robo_telegram.DatabaseManager(db_path)
+        inicio = time.perf_counter()
+        banco.inicializar_tabelas()
+        migracao = time.perf_counter() - inicio
+        tamanho_v2 = os.path.getsize(db_path)
+        print(f"Migração: {migracao:.1f}s, {tamanho_v1 / 2 ** 20:.0f} → {tamanho_v2 / 2 ** 20:.0f} MiB")
+
+        conexao = banco.conectar()
+        alertas, linhas_resumo_total = conexao.execute("SELECT TOTAL(alertas), COUNT(*) FROM oportunidades_por_hora").fetchone()
+        compressao = alertas / max(linhas_resumo_total, 1)
+        print(f"Resumo por hora: {linhas_resumo_total:,} linhas para {alertas:,.0f} alertas ({compressao:.1f} alertas por linha)")
+        painel_v2_ms, linhas_v2 = cronometrar(lambda: conexao.execute(consulta_v2, (desde,)).fetchall())
+        painel_resumo_ms, linhas_resumo = cronometrar(lambda: banco.resumo_por_hora(desde))
+        pares_tabela_ms, _ = cronometrar(lambda: conexao.execute(pares_mensagens, (semana,)).fetchall())
+        pares_resumo_ms, linhas_pares = cronometrar(lambda: conexao.execute(pares_resumo, (int(semana // 3600) * 3600,)).fetchall())
+        print(f"Painel por hora nas últimas 24h: {painel_v1_ms:.0f} ms no esquema 1, {painel_v2_ms:.0f} ms na tabela tipada, "
+              f"{painel_resumo_ms:.1f} ms no resumo por hora ({len(linhas_v1)}/{len(linhas_v2)}/{len(linhas_resumo)} linhas)")
+        print(f"Painel por par nos últimos 7 dias: {pares_tabela_ms:.0f} ms na tabela tipada, "
+              f"{pares_resumo_ms:.1f} ms no resumo por hora ({len(linhas_pares)} pares)")
+
+        logging.getLogger().setLevel(logging.WARNING)
+        inicio = time.perf_counter()
+        banco.manter()
+        manutencao = time.perf_counter() - inicio
+        restantes = conexao.execute("SELECT COUNT(*) FROM mensagens_enviadas").fetchone()[0]
+        banco.fechar()
+        tamanho_final = os.path.getsize(db_path)
+        print(f"Manutenção (retenção de {robo_telegram.RETENCAO_MENSAGENS_DIAS} dias + VACUUM): {manutencao:.1f}s, "
+              f"{restantes:,} mensagens restantes, {tamanho_v2 / 2 ** 20:.0f} → {tamanho_final / 2 ** 20:.0f} MiB")
+    return {
+        'migracao_s': migracao, 'manutencao_s': manutencao,
+        'painel_v1_ms': painel_v1_ms, 'painel_tabela_ms': painel_v2_ms, 'painel_resumo_ms': painel_resumo_ms,
+        'pares_tabela_ms': pares_tabela_ms, 'pares_resumo_ms': pares_resumo_ms, 'alertas_por_linha_resumo': compressao,
+        'tamanho_v1_mib': tamanho_v1 / 2 ** 20, 'tamanho_migrado_mib': tamanho_v2 / 2 ** 20,
+        'tamanho_final_mib': tamanho_final / 2 ** 20,
+    }
+
+
+async def benchmark_telegram(args):
+    """Enfileira uma rajada de alertas no NotificadorTelegram contra um Bot API local."""
+    telegram = TelegramFalso(args.latencia / 1000, args.limite_a_cada)
+    notificador = robo_telegram.NotificadorTelegram(telegram.iniciar(), 'TOKEN', 'CHAT', intervalo_minimo=args.intervalo)
+    tempos = []
+    for i in range(args.alertas):
+        inicio = time.perf_counter()
+        notificador.enfileirar(f"M{i % args.moedas}/USDT", f"Alerta {i}")
+        tempos.append(time.perf_counter() - inicio)
+    inicio = time.perf_counter()
+    await asyncio.to_thread(notificador.aguardar)
+    duracao = time.perf_counter() - inicio
+    intervalos = [b[0] - a[0] for a, b in zip(telegram.mensagens, telegram.mensagens[1:])]
+    print(f"{args.alertas} alertas de {args.moedas} moedas: enfileirar p99 {percentil(tempos, 99) * 1e6:.1f} µs")
+    print(f"{notificador.enviadas} mensagens enviadas em {duracao:.2f}s, {notificador.agrupadas} alertas agrupados, "
+          f"{telegram.recusadas} respostas 429")
+    if intervalos:
+        print(f"Intervalo mínimo entre mensagens: {min(intervalos) * 1000:.0f} ms")
+    return {'enfileirar_p99_us': percentil(tempos, 99) * 1e6, 'envio_s': duracao}
+
+
+class Amostras:
+    """Substitui um histograma do módulo metricas guardando cada valor, para percentis exatos."""
+    def __init__(self):
+        self.valores = []
+
+    def observar(self, valor, *rotulos):
+        self.valores.append(valor)
+
+
+class NotificadorNulo:
+    """Substitui o NotificadorTelegram nos microbenchmarks: só conta os alertas."""
+    def __init__(self):
+        self.alertas = 0
+        self.pendentes = {}
+
+    def enfileirar(self, moeda, texto):
+        self.alertas += 1
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def total_metrica(metrica):
+    """Soma de um contador do módulo metricas em todos os rótulos."""
+    with metrica.trava:
+        return sum(metrica.valores.values())
+
+
+def configurar_robo(db_path, taxas, notificador):
+    """Prepara o estado global que o __main__ do robo_telegram criaria, com banco e notificador informados."""
+    banco = robo_telegram.DatabaseManager(db_path)
+    banco.inicializar_tabelas()
+    robo_telegram.TAXAS_EXCHANGES.update(taxas)
+    robo_telegram.db_manager = banco
+    robo_telegram.cache_oportunidades = robo_telegram.CacheOportunidades(banco)
+    robo_telegram.cache_ciclos = robo_telegram.CacheOportunidades(None)
+    robo_telegram.notificador = notificador
+    robo_telegram.matriz = robo_telegram.MatrizOportunidades(robo_telegram.TAXAS_EXCHANGES)
+    robo_telegram.grafo = robo_telegram.GrafoArbitragem(robo_telegram.TAXAS_EXCHANGES)
+    return banco
+
+
+async def benchmark_completo(args):
+    """webhook e robo_telegram de ponta a ponta contra exchanges e Telegram locais.
+
+    O webhook coleta das ExchangeFalsa (com latência, erros e limite de
+    requisições) e publica pelo seu servidor Socket.IO; o robô se conecta como
+    cliente, no mesmo processo, e alerta um TelegramFalso. Durante a medição,
+    `saltos` vezes por segundo o preço de uma moeda ainda não alertada sobe 5%
+    na primeira exchange. O tick-alerta vai do momento em que a exchange serve
+    esse preço até a mensagem chegar ao Telegram; o salto-alerta inclui também
+    a espera pelo próximo ciclo de busca.
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    moedas = [f"M{i}/USDT" for i in range(args.moedas)]
+    exchanges = {
+        f"exchange{i}": ExchangeFalsa(args.latencia / 1000, erros=args.erros, limite=args.limite, variacao=0.001)
+        for i in range(args.exchanges)
+    }
+    primeira = exchanges['exchange0']
+    telegram = TelegramFalso()
+    url_telegram = telegram.iniciar()
+    webhook.EXCHANGES = {nome: configurar_cliente_falso(ccxt.binance(), exchange.iniciar(), moedas) for nome, exchange in exchanges.items()}
+    webhook.MOEDAS = moedas
+    webhook.MODO_COLETA = args.modo
+    webhook.INTERVALO_BUSCA = args.intervalo
+    webhook.publicador.modo = args.eventos
+    ciclos = webhook.METRICA_CICLO = Amostras()
+    porta = porta_livre()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    threading.Thread(target=webhook.socketio.run, args=(webhook.app,), daemon=True,
+                     kwargs={'host': '127.0.0.1', 'port': porta, 'allow_unsafe_werkzeug': True}).start()
+    # Só conecta o robô quando o servidor já aceita conexões
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=1).close()
+            break
+        except OSError:
+            await asyncio.sleep(0.05)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        notificador = robo_telegram.NotificadorTelegram(url_telegram, 'TOKEN', 'CHAT', intervalo_minimo=0)
+        banco = configurar_robo(os.path.join(diretorio, 'arbitragem.db'), {nome.upper(): 0.001 for nome in exchanges}, notificador)
+        for _ in range(50):
+            try:
+                robo_telegram.sio.connect(f"http://127.0.0.1:{porta}")
+                break
+            except socketio.exceptions.ConnectionError:
+                await asyncio.sleep(0.1)
+        threading.Thread(target=webhook.buscar_precos, daemon=True).start()
+
+        # Aquecimento: todas as moedas com preço em todas as exchanges
+        limite_aquecimento = time.perf_counter() + 30 + args.moedas * args.exchanges * args.latencia / 1000
+        while time.perf_counter() < limite_aquecimento:
+            with robo_telegram.trava_precos:
+                completas = sum(robo_telegram.matriz.livro.quantidade(moeda) == args.exchanges for moeda in moedas)
+            if completas == args.moedas:
+                break
+            await asyncio.sleep(0.1)
+
+        inicio = time.perf_counter()
+        ciclos_iniciais = len(ciclos.valores)
+        emitidos_iniciais = total_metrica(webhook.METRICA_EMITIDOS)
+        recebidos_iniciais = total_metrica(robo_telegram.METRICA_TICKS)
+        saltos = {}
+        while time.perf_counter() - inicio < args.duracao:
+            if len(saltos) < len(moedas):
+                moeda = moedas[len(saltos)]
+                primeira.saltar(moeda.replace('/', ''), 1.05)
+                saltos[moeda] = time.perf_counter()
+            await asyncio.sleep(1 / args.saltos)
+        duracao = time.perf_counter() - inicio
+        emitidos = total_metrica(webhook.METRICA_EMITIDOS) - emitidos_iniciais
+        recebidos = total_metrica(robo_telegram.METRICA_TICKS) - recebidos_iniciais
+        tempos_ciclo = ciclos.valores[ciclos_iniciais:]
+
+        # Espera os alertas dos últimos saltos
+        limite_alertas = time.perf_counter() + 2 * args.intervalo + 5
+        alertadas = {}
+        while time.perf_counter() < limite_alertas:
+            for chegada, texto in list(telegram.mensagens):
+                encontrada = re.search(r"\*Moeda:\* `([^`]+)`", texto)
+                if encontrada and encontrada.group(1) in saltos:
+                    alertadas.setdefault(encontrada.group(1), chegada)
+            if len(alertadas) == len(saltos):
+                break
+            await asyncio.sleep(0.1)
+        robo_telegram.sio.disconnect()
+        banco.fechar()
+
+    tick_alerta = [chegada - primeira.servidos[moeda.replace('/', '')] for moeda, chegada in alertadas.items()]
+    salto_alerta = [chegada - saltos[moeda] for moeda, chegada in alertadas.items()]
+    resultados = {
+        'ciclo_p50_s': percentil(tempos_ciclo, 50),
+        'ciclo_p99_s': percentil(tempos_ciclo, 99),
+        'emitidos_por_s': emitidos / duracao,
+        'recebidos_por_s': recebidos / duracao,
+        'tick_alerta_p50_ms': percentil(tick_alerta, 50) * 1000,
+        'tick_alerta_p99_ms': percentil(tick_alerta, 99) * 1000,
+        'salto_alerta_p50_ms': percentil(salto_alerta, 50) * 1000,
+        'salto_alerta_p99_ms': percentil(salto_alerta, 99) * 1000,
+    }
+    requisicoes = sum(exchange.requisicoes for exchange in exchanges.values())
+    print(f"{args.moedas} moedas × {args.exchanges} exchanges, modo {args.modo}, eventos {args.eventos}, intervalo {args.intervalo}s, "
+          f"latência {args.latencia:.0f} ms, erros {args.erros:.0%}, limite {args.limite or '-'} req/s")
+    print(f"Ciclos de busca: {len(tempos_ciclo)}, p50 {resultados['ciclo_p50_s']:.2f}s, p99 {resultados['ciclo_p99_s']:.2f}s; "
+          f"{requisicoes} requisições, {sum(e.recusadas for e in exchanges.values())} com 503, "
+          f"{sum(e.limitadas for e in exchanges.values())} com 429")
+    print(f"Eventos: {resultados['emitidos_por_s']:,.0f}/s emitidos pelo webhook, {resultados['recebidos_por_s']:,.0f}/s recebidos pelo robô")
+    print(f"Alertas: {len(alertadas)}/{len(saltos)} saltos alertados; tick-alerta p50 {resultados['tick_alerta_p50_ms']:.1f} ms, "
+          f"p99 {resultados['tick_alerta_p99_ms']:.1f} ms; salto-alerta p50 {resultados['salto_alerta_p50_ms']:.0f} ms, "
+          f"p99 {resultados['salto_alerta_p99_ms']:.0f} ms")
+    return resultados
+
+
+async def benchmark_arbitragem(args):
+    """Custo por chamada de realizar_arbitragem (cache, banco e montagem do alerta), para alertas novos e repetidos."""
+    logging.getLogger().setLevel(logging.WARNING)
+    moedas = [f"M{i}/USDT" for i in range(args.chamadas)]
+    with tempfile.TemporaryDirectory() as diretorio:
+        notificador = NotificadorNulo()
+        banco = configurar_robo(os.path.join(diretorio, 'arbitragem.db'), {'EXCHANGE0': 0.001, 'EXCHANGE1': 0.002}, notificador)
+        oportunidades = {}
+        for moeda in moedas:
+            robo_telegram.matriz.atualizar(moeda, 'EXCHANGE0', 1.0)
+            robo_telegram.matriz.atualizar(moeda, 'EXCHANGE1', 1.05)
+            oportunidades[moeda] = robo_telegram.matriz.oportunidades(moeda)
+
+        resultados = {}
+        for rotulo in ('nova', 'repetida'):
+            tempos = []
+            for moeda in moedas:
+                inicio = time.perf_counter()
+                robo_telegram.realizar_arbitragem(banco, moeda, oportunidades[moeda])
+                tempos.append(time.perf_counter() - inicio)
+            resultados[f'{rotulo}_p50_us'] = percentil(tempos, 50) * 1e6
+            resultados[f'{rotulo}_p99_us'] = percentil(tempos, 99) * 1e6
+            print(f"Oportunidade {rotulo}: p50 {resultados[f'{rotulo}_p50_us']:.1f} µs, "
+                  f"p99 {resultados[f'{rotulo}_p99_us']:.1f} µs por chamada")
+        inicio = time.perf_counter()
+        banco.fechar()
+        resultados['gravacao_ms'] = (time.perf_counter() - inicio) * 1000
+        print(f"{notificador.alertas} alertas; gravação das {args.chamadas} mensagens pendentes em {resultados['gravacao_ms']:.1f} ms")
+    return resultados
+
+
+def salvar_resultado(caminho, comando, parametros, resultados):
+    """Acrescenta o resultado ao arquivo JSON Lines, com data, commit e parâmetros."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write(json.dumps({
+            'data': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'comando': comando, 'parametros': parametros, 'resultados': resultados
+        }) + '\n')
+
+
+def comparar_resultado(caminho, comando, parametros, resultados):
+    """Compara com o último resultado salvo do mesmo comando e parâmetros.
+
+    Métricas terminadas em _por_s são melhores quanto maiores; as demais
+    (tempos e memória), quanto menores.
+    """
+    anterior = None
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                registro = json.loads(linha)
+                if registro['comando'] == comando and registro['parametros'] == parametros:
+                    anterior = registro
+    except FileNotFoundError:
+        pass
+    if anterior is None:
+        print(f"Nenhum resultado anterior de '{comando}' com os mesmos parâmetros em {caminho}.")
+        return
+    print(f"Comparação com {anterior['data']} (commit {anterior['commit'] or '?'}):")
+    for nome, valor in resultados.items():
+        antes = anterior['resultados'].get(nome)
+        if not antes:
+            continue
+        variacao = (valor - antes) / antes * 100
+        melhor = variacao > 0 if nome.endswith('_por_s') else variacao < 0
+        print(f"  {nome}: {antes:.4g} → {valor:.4g} ({variacao:+.1f}%{', melhor' if melhor else ', pior' if variacao else ''})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--salvar', metavar='ARQUIVO', help="Acrescenta o resultado a este arquivo JSON Lines")
+    parser.add_argument('--comparar', metavar='ARQUIVO', help="Compara com o último resultado do mesmo benchmark salvo neste arquivo")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    stream = subparsers.add_parser('stream', help="Latência do modo 'stream' com um feed WebSocket local")
+    stream.add_argument('--ticks', type=int, default=20000)
+    stream.add_argument('--moedas', type=int, default=200)
+    stream.add_argument('--taxa', type=float, default=0, help="Ticks por segundo enviados pelo servidor (0 = máximo)")
+    stream.add_argument('--desconectar-a-cada', type=int, default=0, help="Derruba a conexão a cada N ticks para testar a reconexão")
+    stream.set_defaults(funcao=benchmark_stream)
+
+    coleta = subparsers.add_parser('coleta', help="Vazão e memória do coletor com threads vs asyncio contra uma exchange REST local")
+    coleta.add_argument('--moedas', type=int, default=500)
+    coleta.add_argument('--exchanges', type=int, default=4)
+    coleta.add_argument('--latencia', type=float, default=50, help="Latência de cada resposta da exchange falsa, em ms")
+    coleta.add_argument('--workers', type=int, default=None, help="Threads do caminho com ThreadPoolExecutor (padrão do Python)")
+    coleta.add_argument('--caminhos', default='threads,async')
+    coleta.set_defaults(funcao=benchmark_coleta)
+
+    shards = subparsers.add_parser('shards', help="Vazão da coleta particionada em processos coletores com exchanges locais")
+    shards.add_argument('--processos', default='1,2,4', help="Quantidades de coletores a medir, separadas por vírgula")
+    shards.add_argument('--moedas', type=int, default=400)
+    shards.add_argument('--exchanges', type=int, default=4)
+    shards.add_argument('--duracao', type=float, default=10, help="Segundos de medição para cada quantidade")
+    shards.add_argument('--aquecimento', type=float, default=2, help="Segundos descartados após o primeiro tick")
+    shards.set_defaults(funcao=benchmark_shards)
+
+    partida = subparsers.add_parser('partida', help="Tempo até o primeiro preço com e sem o cache de mercados em disco")
+    partida.add_argument('--mercados', type=int, default=3000, help="Mercados listados pela exchange local")
+    partida.add_argument('--moedas', type=int, default=200, help="Moedas listadas buscadas (e outras tantas não listadas)")
+    partida.add_argument('--exchanges', type=int, default=4)
+    partida.add_argument('--latencia', type=float, default=300, help="Latência de cada resposta da exchange local, em ms")
+    partida.set_defaults(funcao=benchmark_partida)
+
+    matriz = subparsers.add_parser('matriz', help="Custo por tick da MatrizOportunidades do robo_telegram")
+    matriz.add_argument('--moedas', type=int, default=1000)
+    matriz.add_argument('--exchanges', type=int, default=12)
+    matriz.add_argument('--ticks', type=int, default=100000)
+    matriz.set_defaults(funcao=benchmark_matriz)
+
+    ciclos = subparsers.add_parser('ciclos', help="Tempo da busca de ciclos do GrafoArbitragem por lote de preços")
+    ciclos.add_argument('--ativos', type=int, default=500)
+    ciclos.add_argument('--exchanges', type=int, default=4)
+    ciclos.add_argument('--arestas-por-lote', type=int, default=1000, help="Preços alterados entre duas buscas")
+    ciclos.add_argument('--lotes', type=int, default=50)
+    ciclos.add_argument('--comprimento', type=int, default=4, help="Máximo de pernas por ciclo")
+    ciclos.set_defaults(funcao=benchmark_ciclos)
+
+    db = subparsers.add_parser('db', help="Eventos/s do DatabaseManager contra o padrão de uma conexão por operação")
+    db.add_argument('--eventos', type=int, default=5000)
+    db.set_defaults(funcao=benchmark_db)
+
+    banco = subparsers.add_parser('banco', help="Migração, consultas de painel e manutenção sobre um banco sintético no esquema antigo")
+    banco.add_argument('--linhas', type=int, default=2000000, help="Mensagens enviadas no banco sintético")
+    banco.add_argument('--moedas', type=int, default=10, help="Moedas distintas; cada uma tem 30 pares de exchanges")
+    banco.add_argument('--dias', type=int, default=14, help="Período coberto pelas mensagens")
+    banco.set_defaults(funcao=benchmark_banco)
+
+    livro = subparsers.add_parser('livro', help="LivroPrecos contra o dicionário de dicionários por evento e em memória")
+    livro.add_argument('--moedas', type=int, default=5000)
+    livro.add_argument('--exchanges', type=int, default=4)
+    livro.add_argument('--eventos', type=int, default=500000)
+    livro.set_defaults(funcao=benchmark_livro)
+
+    telegram = subparsers.add_parser('telegram', help="Fila do NotificadorTelegram contra um Bot API local")
+    telegram.add_argument('--alertas', type=int, default=2000)
+    telegram.add_argument('--moedas', type=int, default=20)
+    telegram.add_argument('--latencia', type=float, default=20, help="Latência do Bot API falso, em ms")
+    telegram.add_argument('--limite-a-cada', type=int, default=7, help="Responde 429 a cada N requisições")
+    telegram.add_argument('--intervalo', type=float, default=0.05, help="Intervalo mínimo entre mensagens, em s")
+    telegram.set_defaults(funcao=benchmark_telegram)
+
+    completo = subparsers.add_parser('completo', help="webhook + robo_telegram de ponta a ponta com exchanges e Telegram locais")
+    completo.add_argument('--moedas', type=int, default=100)
+    completo.add_argument('--exchanges', type=int, default=4)
+    completo.add_argument('--modo', default='lote', choices=['lote', 'individual'], help="MODO_COLETA do webhook")
+    completo.add_argument('--eventos', default='lote', choices=['lote', 'individual'], help="MODO_EVENTOS do webhook")
+    completo.add_argument('--intervalo', type=float, default=1.0, help="INTERVALO_BUSCA do webhook, em s")
+    completo.add_argument('--latencia', type=float, default=20, help="Latência de cada resposta das exchanges locais, em ms")
+    completo.add_argument('--erros', type=float, default=0.02, help="Fração das requisições respondidas com 503")
+    completo.add_argument('--limite', type=int, default=0, help="Requisições por segundo por exchange antes de responder 429 (0 = sem limite)")
+    completo.add_argument('--saltos', type=float, default=5, help="Saltos de preço (alertas esperados) por segundo")
+    completo.add_argument('--duracao', type=float, default=10, help="Segundos de medição após o aquecimento")
+    completo.set_defaults(funcao=benchmark_completo)
+
+    arbitragem = subparsers.add_parser('arbitragem', help="Custo por chamada de realizar_arbitragem com banco em disco")
+    arbitragem.add_argument('--chamadas', type=int, default=5000, help="Moedas avaliadas em cada fase (nova e repetida)")
+    arbitragem.set_defaults(funcao=benchmark_arbitragem)
+
+    args = parser.parse_args()
+    resultados = asyncio.run(args.funcao(args))
+    if resultados:
+        parametros = {nome: valor for nome, valor in vars(args).items() if nome not in ('funcao', 'comando', 'salvar', 'comparar')}
+        if args.comparar:
+            comparar_resultado(args.comparar, args.comando, parametros, resultados)
+        if args.salvar:
+            salvar_resultado(args.salvar, args.comando, parametros, resultados)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
+import queue
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
+import numpy as np
 import requests
 
 # Taxas das exchanges
@@ -26,11 +31,51 @@ EXCHANGE_PAIRS = {
     "mexc": lambda symbol: symbol.upper() + "USDT"
 }
 
+# APIs com os preços de todos os pares em uma única requisição (modo varredura)
+EXCHANGE_ALL_TICKERS_APIS = {
+    "binance": "https://api.binance.com/api/v3/ticker/price",
+    "kraken": "https://api.kraken.com/0/public/Ticker",
+    "gate": "https://api.gateio.ws/api/v4/spot/tickers",
+    "mexc": "https://api.mexc.com/api/v3/ticker/price"
+}
+
+# Nomes próprios de moedas em algumas exchanges (ex.: BTC é XBT na Kraken)
+SYMBOL_ALIASES = {"XBT": "BTC", "XDG": "DOGE"}
+
+# Timeout (conexão, leitura) de cada requisição, em segundos
+REQUEST_TIMEOUT = (3, 5)
+
+# Por quantos segundos um preço buscado é reaproveitado em um novo cálculo
+PRICE_CACHE_TTL = 15
+
+# Sessão compartilhada: mantém as conexões abertas entre as buscas (keep-alive)
+session = requests.Session()
+session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=len(EXCHANGE_APIS), pool_maxsize=len(EXCHANGE_APIS)))
+
+# Worker em segundo plano: busca todas as exchanges em paralelo, fora da thread do Tk
+executor = ThreadPoolExecutor(max_workers=len(EXCHANGE_APIS))
+
+# Cache de preços: (symbol, exchange) -> (preço, momento da busca)
+price_cache = {}
+price_cache_lock = threading.Lock()
+
+# Preços que chegam do worker, consumidos pela thread do Tk: (cálculo, exchange, preço)
+results_queue = queue.Queue()
+
+# Cálculo em andamento; resultados de cálculos anteriores são ignorados
+current_request = {"id": 0}
+
+# Respostas da varredura, consumidas pela thread do Tk: (varredura, exchange, future)
+scan_queue = queue.Queue()
+
+# Varredura em andamento; respostas de varreduras anteriores são ignoradas
+current_scan = {"id": 0}
+
 def fetch_price(symbol, exchange):
     """Obtém o preço da moeda na exchange selecionada."""
     url = EXCHANGE_APIS[exchange].format(EXCHANGE_PAIRS[exchange](symbol))
     try:
-        response = requests.get(url)
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
         data = response.json()
         if exchange in ["binance", "mexc"]:
             return float(data["price"])
@@ -41,40 +86,106 @@ def fetch_price(symbol, exchange):
     except Exception:
         return None
 
+def cached_price(symbol, exchange):
+    """Preço em cache da moeda na exchange, se buscado há menos de PRICE_CACHE_TTL segundos."""
+    with price_cache_lock:
+        cached = price_cache.get((symbol, exchange))
+    if cached and time.monotonic() - cached[1] < PRICE_CACHE_TTL:
+        return cached[0]
+    return None
+
+def get_price(symbol, exchange):
+    """Preço da moeda na exchange, do cache ou da API. Roda no worker."""
+    price = cached_price(symbol, exchange)
+    if price is None:
+        price = fetch_price(symbol, exchange)
+        if price:
+            with price_cache_lock:
+                price_cache[(symbol, exchange)] = (price, time.monotonic())
+    return price
+
+def fetch_all_prices(symbol, request_id):
+    """Dispara a busca em todas as exchanges; cada preço entra em results_queue assim que chega."""
+    for exchange in EXCHANGE_APIS.keys():
+        future = executor.submit(get_price, symbol, exchange)
+        future.add_done_callback(lambda f, exchange=exchange: results_queue.put((request_id, exchange, f.result())))
+
 def calculate_arbitrage():
     """Calcula arbitragem entre exchanges selecionadas."""
-    symbol = entry_symbol.get().strip().upper()
-    amount = entry_amount.get().strip()
-    cost = entry_cost.get().strip()
+    inputs = {
+        "symbol": entry_symbol.get().strip().upper(),
+        "amount": entry_amount.get().strip(),
+        "cost": entry_cost.get().strip(),
+        "buy_exchange": buy_exchange_var.get(),
+        "sell_exchange": sell_exchange_var.get()
+    }
     manual_price = entry_manual_price.get().strip()
-    buy_exchange = buy_exchange_var.get()
-    sell_exchange = sell_exchange_var.get()
+    symbol = inputs["symbol"]
 
     if not symbol:
         messagebox.showerror("Erro", "Por favor, insira a moeda desejada.")
         return
 
-    prices = {}
+    current_request["id"] += 1
     if manual_price:
         try:
             manual_price = float(manual_price)
-            for exchange in EXCHANGE_APIS.keys():
-                prices[exchange] = manual_price
         except ValueError:
             messagebox.showerror("Erro", "Preço manual inválido.")
             return
-    else:
-        for exchange in EXCHANGE_APIS.keys():
-            price = fetch_price(symbol, exchange)
-            if price:
-                prices[exchange] = price
+        show_arbitrage(inputs, {exchange: manual_price for exchange in EXCHANGE_APIS.keys()})
+        return
+
+    prices = {exchange: cached_price(symbol, exchange) for exchange in EXCHANGE_APIS.keys()}
+    if all(prices.values()):
+        # Todos os preços ainda estão no cache: recalcula sem nenhuma requisição
+        show_arbitrage(inputs, prices)
+        return
+
+    current_request.update(inputs=inputs, prices={}, pending=len(EXCHANGE_APIS))
+    btn_calculate.config(state=tk.DISABLED)
+    label_result.config(text=f"Buscando preços de {symbol}...")
+    fetch_all_prices(symbol, current_request["id"])
+
+def process_results():
+    """Consome os preços que chegaram do worker, mostrando o andamento, e calcula quando todas as exchanges responderem."""
+    while True:
+        try:
+            request_id, exchange, price = results_queue.get_nowait()
+        except queue.Empty:
+            break
+        if request_id != current_request["id"]:
+            continue
+        current_request["pending"] -= 1
+        if price:
+            current_request["prices"][exchange] = price
+        if current_request["pending"] == 0:
+            btn_calculate.config(state=tk.NORMAL)
+            show_arbitrage(current_request["inputs"], current_request["prices"])
+        else:
+            progress = "\n".join(f"{name.upper()}: ${value:.2f}" for name, value in current_request["prices"].items())
+            label_result.config(text=f"Buscando preços de {current_request['inputs']['symbol']}...\n{progress}")
+    root.after(50, process_results)
+
+def show_arbitrage(inputs, prices):
+    """Calcula e exibe o resultado da arbitragem com os preços obtidos."""
+    symbol = inputs["symbol"]
+    amount = inputs["amount"]
+    cost = inputs["cost"]
+    buy_exchange = inputs["buy_exchange"]
+    sell_exchange = inputs["sell_exchange"]
 
     if len(prices) < 2:
+        label_result.config(text="")
         messagebox.showerror("Erro", "Não foi possível obter preços suficientes.")
         return
 
-    buy_price = prices.get(buy_exchange) if buy_exchange != "Auto" else min(prices.values())
-    sell_price = prices.get(sell_exchange) if sell_exchange != "Auto" else max(prices.values())
+    if buy_exchange == "Auto":
+        buy_exchange = min(prices, key=prices.get)
+    if sell_exchange == "Auto":
+        sell_exchange = max(prices, key=prices.get)
+    buy_price = prices.get(buy_exchange)
+    sell_price = prices.get(sell_exchange)
 
     if buy_price is None or sell_price is None or buy_price >= sell_price:
         messagebox.showerror("Erro", "Selecione exchanges válidas para compra e venda.")
@@ -113,6 +224,148 @@ def calculate_arbitrage():
         """
     )
 
+def fetch_all_tickers(exchange):
+    """Obtém os preços de todos os pares da exchange em uma requisição: {par da exchange: preço}."""
+    response = session.get(EXCHANGE_ALL_TICKERS_APIS[exchange], timeout=REQUEST_TIMEOUT)
+    data = response.json()
+    if exchange in ["binance", "mexc"]:
+        return {item["symbol"]: float(item["price"]) for item in data}
+    elif exchange == "kraken":
+        return {pair: float(ticker["c"][0]) for pair, ticker in data["result"].items()}
+    elif exchange == "gate":
+        return {item["currency_pair"]: float(item["last"]) for item in data if item.get("last")}
+
+def normalize_tickers(exchange, tickers):
+    """Converte os pares da exchange em moedas (BTCUSDT -> BTC) usando EXCHANGE_PAIRS.
+
+    Só entram os pares que EXCHANGE_PAIRS gera de volta a partir da moeda,
+    ou seja, os mesmos que o cálculo de uma moeda consultaria.
+    """
+    suffix_length = len(EXCHANGE_PAIRS[exchange](""))
+    to_pair = EXCHANGE_PAIRS[exchange]
+    prices = {}
+    for pair, price in tickers.items():
+        base = pair[:-suffix_length]
+        if price > 0 and base and to_pair(base) == pair:
+            base = base.upper()
+            prices[SYMBOL_ALIASES.get(base, base)] = price
+    return prices
+
+def scan_opportunities(prices_by_exchange, watchlist=None):
+    """Melhor compra e venda de cada moeda listada em pelo menos duas exchanges, com as taxas descontadas.
+
+    Recebe {exchange: {moeda: preço}} e calcula todas as moedas de uma vez,
+    comparando cada par de exchanges diferentes. Retorna tuplas (moeda, exchange de
+    compra, preço de compra, exchange de venda, preço de venda, spread %,
+    lucro líquido %), da mais lucrativa para a menos.
+    """
+    exchanges = list(prices_by_exchange)
+    symbols = set().union(*prices_by_exchange.values()) if exchanges else set()
+    if watchlist:
+        symbols &= set(watchlist)
+    symbols = sorted(symbols)
+    matrix = np.full((len(symbols), len(exchanges)), np.nan)
+    for column, exchange in enumerate(exchanges):
+        prices = prices_by_exchange[exchange]
+        matrix[:, column] = [prices.get(symbol, np.nan) for symbol in symbols]
+
+    listed = ~np.isnan(matrix)
+    common = listed.sum(axis=1) >= 2
+    matrix = matrix[common]
+    symbols = [symbol for symbol, keep in zip(symbols, common) if keep]
+    if not symbols:
+        return []
+
+    fees = np.array([EXCHANGE_FEES[exchange] for exchange in exchanges])
+    buy_costs = matrix * (1 + fees)
+    sell_returns = matrix * (1 - fees)
+    # Lucro de cada par (compra, venda) de exchanges diferentes: moedas × compra × venda
+    pair_profits = (sell_returns[:, None, :] - buy_costs[:, :, None]) / buy_costs[:, :, None]
+    pair_profits[:, np.eye(len(exchanges), dtype=bool)] = np.nan
+    pair_profits = np.where(np.isnan(pair_profits), -np.inf, pair_profits)
+    best_pairs = pair_profits.reshape(len(symbols), -1).argmax(axis=1)
+    buy_columns, sell_columns = np.divmod(best_pairs, len(exchanges))
+    rows = np.arange(len(symbols))
+    buy_prices = matrix[rows, buy_columns]
+    sell_prices = matrix[rows, sell_columns]
+    spreads = (sell_prices - buy_prices) / buy_prices * 100
+    net_profits = pair_profits[rows, buy_columns, sell_columns] * 100
+
+    order = np.argsort(-net_profits, kind="stable")
+    columns = [array[order].tolist() for array in (buy_columns, buy_prices, sell_columns, sell_prices, spreads, net_profits)]
+    return [
+        (symbols[i], exchanges[buy], buy_price, exchanges[sell], sell_price, spread, net_profit)
+        for i, buy, buy_price, sell, sell_price, spread, net_profit in zip(order.tolist(), *columns)
+    ]
+
+def start_scan():
+    """Baixa todos os preços de cada exchange em paralelo (uma requisição por exchange) e monta a tabela."""
+    watchlist = [symbol.strip().upper() for symbol in entry_watchlist.get().replace(",", " ").split() if symbol.strip()]
+    current_scan["id"] += 1
+    current_scan.update(watchlist=watchlist, prices={}, pending=len(EXCHANGE_ALL_TICKERS_APIS), started=time.perf_counter())
+    btn_scan.config(state=tk.DISABLED)
+    label_scan.config(text="Baixando os preços de todas as exchanges...")
+    for exchange in EXCHANGE_ALL_TICKERS_APIS.keys():
+        future = executor.submit(fetch_all_tickers, exchange)
+        future.add_done_callback(lambda f, scan_id=current_scan["id"], exchange=exchange: scan_queue.put((scan_id, exchange, f)))
+
+def process_scan_results():
+    """Consome as respostas da varredura na thread do Tk e, com todas as exchanges, calcula e exibe a tabela."""
+    while True:
+        try:
+            scan_id, exchange, future = scan_queue.get_nowait()
+        except queue.Empty:
+            break
+        if scan_id != current_scan["id"]:
+            continue
+        current_scan["pending"] -= 1
+        try:
+            current_scan["prices"][exchange] = normalize_tickers(exchange, future.result())
+        except Exception:
+            pass
+        if current_scan["pending"] == 0:
+            finish_scan()
+    root.after(50, process_scan_results)
+
+def finish_scan():
+    """Calcula as oportunidades da varredura, guarda os preços no cache e preenche a tabela."""
+    download_time = time.perf_counter() - current_scan["started"]
+    prices_by_exchange = current_scan["prices"]
+    now = time.monotonic()
+    with price_cache_lock:
+        for exchange, prices in prices_by_exchange.items():
+            price_cache.update(((symbol, exchange), (price, now)) for symbol, price in prices.items())
+
+    started = time.perf_counter()
+    opportunities = scan_opportunities(prices_by_exchange, current_scan["watchlist"])
+    compute_time = time.perf_counter() - started
+
+    tree_scan.delete(*tree_scan.get_children())
+    for symbol, buy_exchange, buy_price, sell_exchange, sell_price, spread, net_profit in opportunities:
+        tree_scan.insert("", tk.END, values=(
+            symbol, buy_exchange.upper(), f"{buy_price:.8g}", sell_exchange.upper(), f"{sell_price:.8g}",
+            f"{spread:.2f}", f"{net_profit:.2f}"
+        ))
+    btn_scan.config(state=tk.NORMAL)
+    failed = [exchange.upper() for exchange in EXCHANGE_ALL_TICKERS_APIS if exchange not in prices_by_exchange]
+    label_scan.config(
+        text=f"{len(opportunities)} moedas em comum, download em {download_time:.2f}s, cálculo em {compute_time * 1000:.0f} ms"
+        + (f" (sem resposta: {', '.join(failed)})" if failed else "")
+    )
+
+def sort_scan_table(column, reverse):
+    """Ordena a tabela da varredura pela coluna clicada; um novo clique inverte a ordem."""
+    def key(item):
+        value = tree_scan.set(item, column)
+        try:
+            return (0, float(value))
+        except ValueError:
+            return (1, value)
+    items = sorted(tree_scan.get_children(""), key=key, reverse=reverse)
+    for index, item in enumerate(items):
+        tree_scan.move(item, "", index)
+    tree_scan.heading(column, command=lambda: sort_scan_table(column, not reverse))
+
 def clear_all():
     """Limpa todos os campos e reset os seletores."""
     entry_symbol.delete(0, tk.END)
@@ -123,50 +376,80 @@ def clear_all():
     sell_exchange_var.set("Auto")
     label_result.config(text="")
 
-# Interface Gráfica
-root = tk.Tk()
-root.title("Calculadora de Arbitragem de Criptomoedas")
-root.geometry("450x550")
-
-# Seletor de Moeda
-tk.Label(root, text="Moeda (ex: BTC, ETH):").pack()
-entry_symbol = tk.Entry(root)
-entry_symbol.pack()
-
-# Seletor de Quantidade ou Custo
-tk.Label(root, text="Quantidade Comprada (deixe em branco se inserir custo):").pack()
-entry_amount = tk.Entry(root)
-entry_amount.pack()
-
-tk.Label(root, text="Custo Desejado em USDT (deixe em branco se inserir quantidade):").pack()
-entry_cost = tk.Entry(root)
-entry_cost.pack()
-
-# Seletor de Exchanges
-tk.Label(root, text="Selecionar Exchange de Compra:").pack()
-buy_exchange_var = tk.StringVar(value="Auto")
-buy_exchange_menu = ttk.Combobox(root, textvariable=buy_exchange_var, values=["Auto", "binance", "kraken", "gate", "mexc"])
-buy_exchange_menu.pack()
-
-tk.Label(root, text="Selecionar Exchange de Venda:").pack()
-sell_exchange_var = tk.StringVar(value="Auto")
-sell_exchange_menu = ttk.Combobox(root, textvariable=sell_exchange_var, values=["Auto", "binance", "kraken", "gate", "mexc"])
-sell_exchange_menu.pack()
-
-# Preço Manual
-tk.Label(root, text="Preço Manual (opcional, usa esse valor em todas as exchanges):").pack()
-entry_manual_price = tk.Entry(root)
-entry_manual_price.pack()
-
-# Botões
-btn_calculate = tk.Button(root, text="Calcular Arbitragem", command=calculate_arbitrage)
-btn_calculate.pack()
-
-btn_clear = tk.Button(root, text="Limpar Tudo", command=clear_all)
-btn_clear.pack()
-
-# Resultado
-label_result = tk.Label(root, text="", justify="left")
-label_result.pack()
-
-root.mainloop()
+if __name__ == "__main__":
+    # Interface Gráfica
+    root = tk.Tk()
+    root.title("Calculadora de Arbitragem de Criptomoedas")
+    root.geometry("700x850")
+
+    # Seletor de Moeda
+    tk.Label(root, text="Moeda (ex: BTC, ETH):").pack()
+    entry_symbol = tk.Entry(root)
+    entry_symbol.pack()
+
+    # Seletor de Quantidade ou Custo
+    tk.Label(root, text="Quantidade Comprada (deixe em branco se inserir custo):").pack()
+    entry_amount = tk.Entry(root)
+    entry_amount.pack()
+
+    tk.Label(root, text="Custo Desejado em USDT (deixe em branco se inserir quantidade):").pack()
+    entry_cost = tk.Entry(root)
+    entry_cost.pack()
+
+    # Seletor de Exchanges
+    tk.Label(root, text="Selecionar Exchange de Compra:").pack()
+    buy_exchange_var = tk.StringVar(value="Auto")
+    buy_exchange_menu = ttk.Combobox(root, textvariable=buy_exchange_var, values=["Auto", "binance", "kraken", "gate", "mexc"])
+    buy_exchange_menu.pack()
+
+    tk.Label(root, text="Selecionar Exchange de Venda:").pack()
+    sell_exchange_var = tk.StringVar(value="Auto")
+    sell_exchange_menu = ttk.Combobox(root, textvariable=sell_exchange_var, values=["Auto", "binance", "kraken", "gate", "mexc"])
+    sell_exchange_menu.pack()
+
+    # Preço Manual
+    tk.Label(root, text="Preço Manual (opcional, usa esse valor em todas as exchanges):").pack()
+    entry_manual_price = tk.Entry(root)
+    entry_manual_price.pack()
+
+    # Botões
+    btn_calculate = tk.Button(root, text="Calcular Arbitragem", command=calculate_arbitrage)
+    btn_calculate.pack()
+
+    btn_clear = tk.Button(root, text="Limpar Tudo", command=clear_all)
+    btn_clear.pack()
+
+    # Resultado
+    label_result = tk.Label(root, text="", justify="left")
+    label_result.pack()
+
+    # Varredura de várias moedas
+    ttk.Separator(root, orient="horizontal").pack(fill="x", pady=5)
+    tk.Label(root, text="Varredura: moedas separadas por vírgula (vazio = todas em comum):").pack()
+    entry_watchlist = tk.Entry(root, width=50)
+    entry_watchlist.pack()
+
+    btn_scan = tk.Button(root, text="Varrer Moedas", command=start_scan)
+    btn_scan.pack()
+
+    label_scan = tk.Label(root, text="")
+    label_scan.pack()
+
+    SCAN_COLUMNS = {
+        "symbol": "Moeda", "buy_exchange": "Compra", "buy_price": "Preço Compra", "sell_exchange": "Venda",
+        "sell_price": "Preço Venda", "spread": "Spread %", "net_profit": "Lucro Líq. %"
+    }
+    frame_scan = tk.Frame(root)
+    frame_scan.pack(fill="both", expand=True)
+    tree_scan = ttk.Treeview(frame_scan, columns=list(SCAN_COLUMNS), show="headings")
+    for column, title in SCAN_COLUMNS.items():
+        tree_scan.heading(column, text=title, command=lambda column=column: sort_scan_table(column, column != "symbol"))
+        tree_scan.column(column, width=95, anchor="e" if column in ("buy_price", "sell_price", "spread", "net_profit") else "w")
+    scrollbar_scan = ttk.Scrollbar(frame_scan, orient="vertical", command=tree_scan.yview)
+    tree_scan.configure(yscrollcommand=scrollbar_scan.set)
+    scrollbar_scan.pack(side="right", fill="y")
+    tree_scan.pack(side="left", fill="both", expand=True)
+
+    root.after(50, process_results)
+    root.after(50, process_scan_results)
+    root.mainloop()
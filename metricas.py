@@ -0,0 +1,182 @@
+"""Métricas do webhook e do robô (contadores, medidores e histogramas) no formato texto do Prometheus.
+
+Cada processo tem um `registro` global. O webhook o expõe na rota /metrics do
+Flask e o robô em um servidor HTTP próprio (servir). Os valores ficam em
+memória e são formatados só quando alguém lê a rota.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Faixas padrão dos histogramas, em segundos
+FAIXAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor))
+
+
+class Metrica:
+    """Base das métricas: um valor por combinação de rótulos, na ordem de `rotulos`."""
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.valores = {}
+        self.trava = threading.Lock()
+
+    def _rotulos(self, valores, extra=''):
+        pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(self.rotulos, valores)]
+        if extra:
+            pares.append(extra)
+        return '{' + ','.join(pares) + '}' if pares else ''
+
+    def amostras(self):
+        with self.trava:
+            return [f"{self.nome}{self._rotulos(chave)} {_numero(valor)}" for chave, valor in sorted(self.valores.items())]
+
+    def exportar(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}", *self.amostras()]
+
+
+class Contador(Metrica):
+    """Valor que só cresce (eventos, erros)."""
+    tipo = 'counter'
+
+    def incrementar(self, *rotulos, quantidade=1):
+        with self.trava:
+            self.valores[rotulos] = self.valores.get(rotulos, 0) + quantidade
+
+
+class Medidor(Metrica):
+    """Valor que sobe e desce (tamanho de fila, itens em memória).
+
+    Com `funcao`, o valor é lido na exportação: ela retorna um número ou um
+    dicionário {tupla de rótulos: número}.
+    """
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def definir(self, valor, *rotulos):
+        with self.trava:
+            self.valores[rotulos] = valor
+
+    def amostras(self):
+        if self.funcao is not None:
+            valores = self.funcao()
+            if valores is None:
+                valores = {}
+            elif not isinstance(valores, dict):
+                valores = {(): valores}
+            with self.trava:
+                self.valores = dict(valores)
+        return super().amostras()
+
+
+class Histograma(Metrica):
+    """Distribuição de valores (latências) contada em faixas fixas, com soma e total."""
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), faixas=FAIXAS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.faixas = tuple(faixas)
+
+    def observar(self, valor, *rotulos):
+        with self.trava:
+            estado = self.valores.get(rotulos)
+            if estado is None:
+                estado = self.valores[rotulos] = [[0] * (len(self.faixas) + 1), 0.0, 0]
+            estado[0][bisect.bisect_left(self.faixas, valor)] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    @contextmanager
+    def cronometrar(self, *rotulos):
+        """Observa a duração do bloco `with`, em segundos."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *rotulos)
+
+    def amostras(self):
+        linhas = []
+        with self.trava:
+            for chave, (contagens, soma, total) in sorted(self.valores.items()):
+                acumulado = 0
+                for faixa, contagem in zip([*self.faixas, float('inf')], contagens):
+                    acumulado += contagem
+                    le = 'le="' + _numero(faixa) + '"'
+                    linhas.append(f"{self.nome}_bucket{self._rotulos(chave, le)} {acumulado}")
+                linhas.append(f"{self.nome}_sum{self._rotulos(chave)} {_numero(soma)}")
+                linhas.append(f"{self.nome}_count{self._rotulos(chave)} {total}")
+        return linhas
+
+
+class Registro:
+    """Conjunto das métricas de um processo. Registrar duas vezes o mesmo nome retorna a mesma métrica."""
+    def __init__(self):
+        self.metricas = {}
+        self.trava = threading.Lock()
+
+    def _registrar(self, classe, nome, *args, **kwargs):
+        with self.trava:
+            if nome not in self.metricas:
+                self.metricas[nome] = classe(nome, *args, **kwargs)
+            return self.metricas[nome]
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome, ajuda, rotulos=(), funcao=None):
+        return self._registrar(Medidor, nome, ajuda, rotulos, funcao)
+
+    def histograma(self, nome, ajuda, rotulos=(), faixas=FAIXAS_SEGUNDOS):
+        return self._registrar(Histograma, nome, ajuda, rotulos, faixas)
+
+    def exportar(self):
+        """Todas as métricas no formato texto do Prometheus."""
+        with self.trava:
+            metricas = list(self.metricas.values())
+        return '\n'.join(linha for metrica in metricas for linha in metrica.exportar()) + '\n'
+
+
+registro = Registro()
+
+
+def servir(porta, host='localhost', registro=registro):
+    """Serve GET /metrics em uma thread própria e retorna o servidor (server.shutdown() encerra)."""
+    class Tratador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            corpo = registro.exportar().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', TIPO_CONTEUDO)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Tratador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
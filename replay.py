@@ -0,0 +1,154 @@
+"""Replay dos ticks gravados pelo webhook (GRAVAR_TICKS=1) pela lógica de arbitragem do robo_telegram.
+
+Os ticks passam por registrar_preco, verificar_moeda e realizar_arbitragem
+mais rápido que o tempo real, com o relógio do robô seguindo o timestamp de
+cada tick. O Telegram e o banco de dados são substituídos por coletores em
+memória, e no final são exibidos os alertas gerados e a vazão em ticks/s.
+
+Os ticks gravados com o topo do ticker (ticks_AAAAMMDD.topo.bin) são avaliados
+como em produção, por bid/ask e com o filtro de volume; nos arquivos antigos,
+sem topo, vale o último preço.
+
+Uso:
+    python replay.py ticks/ticks_20261017.topo.bin
+    python replay.py ticks/ticks_2026101*.bin --lucro-minimo 1.0 --mudanca-minima 0.01 --taxa KRAKEN=0.0016
+    python replay.py ticks/ticks_20261017.topo.bin --ciclos --cooldown 30
+"""
+import os
+
+# Evita que o webhook inicie a coleta real ao ser importado
+os.environ.setdefault('COLETA_AUTOMATICA', '0')
+
+import argparse
+import glob
+import logging
+import time
+from collections import Counter
+
+import numpy as np
+
+import robo_telegram
+import webhook
+
+
+class BancoNulo:
+    """Substitui o DatabaseManager: conta as gravações sem acessar o disco."""
+    def __init__(self):
+        self.mensagens = 0
+        self.oportunidades = 0
+
+    def registrar_mensagem_enviada(self, parametros):
+        self.mensagens += 1
+
+    def salvar_oportunidade(self, *dados):
+        self.oportunidades += 1
+
+
+class NotificadorNulo:
+    """Substitui o NotificadorTelegram: guarda a chave de cada alerta em vez de enviá-lo."""
+    def __init__(self):
+        self.alertas = Counter()
+
+    def enfileirar(self, moeda, texto):
+        self.alertas[moeda] += 1
+
+    def aguardar(self, timeout=None):
+        return True
+
+
+def carregar_ticks(caminhos):
+    """Junta os arquivos gravados em um único array ordenado pelo timestamp da coleta, com nomes em vez de ids.
+
+    Retorna as colunas coletado, ts, exchange, moeda, preço e topo (uma matriz
+    n × 5 com bid, ask, quantidades e volume; NaN nos arquivos sem topo).
+    """
+    partes = []
+    for caminho in caminhos:
+        registros, nomes = webhook.GravadorTicks.ler(caminho)
+        exchanges = np.array(nomes['exchange'] or [''], dtype=object)
+        moedas = np.array(nomes['moeda'] or [''], dtype=object)
+        if 'bid' in registros.dtype.names:
+            topos = np.column_stack([registros[campo] for campo in ('bid', 'ask', 'quantidade_bid', 'quantidade_ask', 'volume')])
+        else:
+            topos = np.full((len(registros), 5), np.nan)
+        partes.append((registros['coletado'], registros['ts'], exchanges[registros['exchange']],
+                       moedas[registros['moeda']], registros['preco'], topos))
+    if not partes:
+        return [np.empty(0)] * 5 + [np.empty((0, 5))]
+    colunas = [np.concatenate(coluna) for coluna in zip(*partes)]
+    ordem = np.argsort(colunas[0], kind='stable')
+    return [coluna[ordem] for coluna in colunas]
+
+
+def configurar(args):
+    """Aplica os parâmetros do backtest no robo_telegram e troca os destinos externos pelos coletores em memória."""
+    for item in args.taxa:
+        exchange, taxa = item.split('=')
+        robo_telegram.TAXAS_EXCHANGES[exchange.upper()] = float(taxa)
+    if args.lucro_minimo is not None:
+        robo_telegram.LUCRO_MINIMO_PERCENTUAL = args.lucro_minimo
+    if args.mudanca_minima is not None:
+        robo_telegram.MUDANCA_MINIMA_PERCENTUAL = args.mudanca_minima
+    banco = BancoNulo()
+    notificador = NotificadorNulo()
+    robo_telegram.db_manager = banco
+    robo_telegram.notificador = notificador
+    robo_telegram.cache_oportunidades = robo_telegram.CacheOportunidades(banco, cooldown=args.cooldown)
+    robo_telegram.cache_ciclos = robo_telegram.CacheOportunidades(None, cooldown=args.cooldown)
+    robo_telegram.matriz = robo_telegram.MatrizOportunidades(robo_telegram.TAXAS_EXCHANGES)
+    robo_telegram.grafo = robo_telegram.GrafoArbitragem(robo_telegram.TAXAS_EXCHANGES)
+    return banco, notificador
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('arquivos', nargs='+', help="Arquivos ticks_AAAAMMDD[.topo].bin (aceita curingas)")
+    parser.add_argument('--lucro-minimo', type=float, default=None, help="LUCRO_MINIMO_PERCENTUAL do backtest")
+    parser.add_argument('--mudanca-minima', type=float, default=None, help="MUDANCA_MINIMA_PERCENTUAL do backtest")
+    parser.add_argument('--taxa', action='append', default=[], metavar='EXCHANGE=TAXA', help="Sobrescreve uma taxa de TAXAS_EXCHANGES")
+    parser.add_argument('--cooldown', type=float, default=robo_telegram.COOLDOWN_ALERTA_SEGUNDOS)
+    parser.add_argument('--ciclos', action='store_true', help="Também procura ciclos no grafo a cada segundo de ticks")
+    parser.add_argument('--verbose', action='store_true', help="Mantém os logs INFO do robô (mais lento)")
+    args = parser.parse_args()
+
+    caminhos = sorted({caminho for padrao in args.arquivos for caminho in glob.glob(padrao)})
+    if not caminhos:
+        parser.error("nenhum arquivo de ticks encontrado")
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    banco, notificador = configurar(args)
+
+    inicio = time.perf_counter()
+    coletados, timestamps, exchanges, moedas, precos, topos = carregar_ticks(caminhos)
+    carga = time.perf_counter() - inicio
+
+    instante = 0.0
+    robo_telegram.relogio = lambda: instante
+    proxima_busca = 0.0
+    inicio = time.perf_counter()
+    for coletado, timestamp, exchange, moeda, preco, topo in zip(coletados.tolist(), timestamps.tolist(), exchanges, moedas,
+                                                                 precos.tolist(), topos.tolist()):
+        instante = coletado / 1000
+        # Como no evento do webhook: sem bid/ask não há topo, e os campos desconhecidos vão como None
+        topo = [None if valor != valor else valor for valor in topo] if topo[0] == topo[0] else None
+        robo_telegram.registrar_preco(exchange, moeda, preco, timestamp / 1000, topo)
+        robo_telegram.verificar_moeda(moeda)
+        if args.ciclos and instante >= proxima_busca:
+            robo_telegram.verificar_ciclos(None)
+            proxima_busca = instante + 1
+    duracao = time.perf_counter() - inicio
+
+    total = len(coletados)
+    periodo = (coletados[-1] - coletados[0]) / 1000 if total else 0
+    print(f"{total} ticks de {len(caminhos)} arquivo(s), {periodo / 3600:.2f} h de mercado, carregados em {carga:.2f}s")
+    print(f"Replay em {duracao:.2f}s: {total / (duracao or 1):,.0f} ticks/s ({periodo / (duracao or 1):,.0f}x o tempo real)")
+    print(f"Parâmetros: lucro mínimo {robo_telegram.LUCRO_MINIMO_PERCENTUAL}%, mudança mínima "
+          f"{robo_telegram.MUDANCA_MINIMA_PERCENTUAL}, cooldown {args.cooldown}s, taxas {robo_telegram.TAXAS_EXCHANGES}")
+    print(f"Alertas: {sum(notificador.alertas.values())} em {len(notificador.alertas)} moedas/rotas "
+          f"({banco.oportunidades} oportunidades registradas)")
+    for moeda, quantidade in notificador.alertas.most_common(10):
+        print(f"  {moeda}: {quantidade}")
+
+
+if __name__ == '__main__':
+    main()
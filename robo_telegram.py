@@ -1,12 +1,26 @@
 import socketio
+import atexit
+import bisect
+import threading
 import time
 import logging
+import math
 import os
 import requests
 import sqlite3
-from datetime import datetime, timedelta
+import numpy as np
+from array import array
+from collections import OrderedDict, namedtuple
+from datetime import datetime
 from dotenv import load_dotenv
 
+import metricas
+
+try:
+    import msgpack  # Opcional: necessário apenas se o webhook usar EVENTOS_MSGPACK=1
+except ImportError:
+    msgpack = None
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -23,6 +37,14 @@ WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'http://localhost:5000')
 # Configuração do Telegram
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
+# Envio ao Telegram: intervalo mínimo entre mensagens no chat (s), timeout (s),
+# tentativas em caso de erro e máximo de moedas aguardando envio
+INTERVALO_MINIMO_TELEGRAM = 1.0
+TIMEOUT_TELEGRAM = 10
+TENTATIVAS_TELEGRAM = 3
+TAMANHO_FILA_TELEGRAM = 500
 
 # Taxas das exchanges
 TAXAS_EXCHANGES = {
@@ -35,10 +57,57 @@ TAXAS_EXCHANGES = {
 # Configuração do banco de dados SQLite
 DB_PATH = "arbitragem.db"
 
+# Arquivo .npz com os últimos preços, gravado ao encerrar e lido ao iniciar (vazio desativa)
+ARQUIVO_PRECOS = os.getenv('ARQUIVO_PRECOS', '')
+
+# Intervalo, em segundos, entre as gravações em lote no banco de dados
+INTERVALO_FLUSH_DB = 1.0
+
+# Manutenção do banco: retenção (dias) das mensagens enviadas e do resumo por hora, intervalo (s)
+# entre as execuções e fração de páginas livres a partir da qual o arquivo é compactado com VACUUM
+RETENCAO_MENSAGENS_DIAS = 7
+RETENCAO_RESUMO_DIAS = 365
+INTERVALO_MANUTENCAO_DB = 3600
+FRACAO_VACUUM = 0.25
+
+# Tempo mínimo, em segundos, entre alertas do mesmo par (moeda, compra, venda)
+COOLDOWN_ALERTA_SEGUNDOS = 10
+
+# Threads que avaliam as moedas com preços novos e intervalo (s) do log de estatísticas da avaliação
+WORKERS_AVALIACAO = 4
+INTERVALO_ESTATISTICAS = 60
+
+# Porta do endpoint HTTP /metrics do robô (0 desativa)
+PORTA_METRICAS = int(os.getenv('PORTA_METRICAS', 9101))
+
+# Após este tempo, em segundos, uma oportunidade já alertada sai do cache e pode ser alertada de novo
+VALIDADE_CACHE_SEGUNDOS = 3600
+
+# Volume mínimo em 24h, na moeda de cotação, das duas exchanges de uma oportunidade; exchanges que
+# não informam o volume não são filtradas
+VOLUME_MINIMO_24H = 50000.0
+
+# Idade máxima (s) de um preço, pelo timestamp da exchange, e diferença máxima (s) entre os
+# timestamps das duas pontas de uma oportunidade; preços fora desses limites não são comparados
+IDADE_MAXIMA_PRECO = 30
+DESVIO_MAXIMO_PRECOS = 10
+
+# Ciclos de arbitragem (triangulares e com mais pernas): máximo de pernas por ciclo, se cada perna pode
+# usar uma exchange diferente (False: só ciclos dentro da mesma exchange) e moedas preferidas para iniciar a rota
+COMPRIMENTO_MAXIMO_CICLO = 4
+CICLOS_ENTRE_EXCHANGES = True
+MOEDAS_BASE_CICLOS = ('USDT', 'USD', 'USDC')
+
+# Intervalo, em segundos, entre as limpezas dos preços que passaram da idade máxima
+INTERVALO_EXPIRACAO = 5
+
+# Limites superiores (ms) das faixas do histograma de latência do feed de cada exchange
+FAIXAS_LATENCIA_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
 # Links das moedas para cada exchange
 LINKS_EXCHANGES = {
     # "BINANCE": "https://www.binance.com/en/trade/{moeda}_USDT",
-    "KRAKEN": "https://pro.kraken.com/app/trade/{moeda}-usd", 
+    "KRAKEN": "https://pro.kraken.com/app/trade/{moeda}-usd",
     "MEXC": "https://www.mexc.com/exchange/{moeda}_USDT",
     "GATE": "https://www.gate.io/trade/{moeda}_USDT"
 }
@@ -56,117 +125,1054 @@ logging.basicConfig(
 # Cliente WebSocket
 sio = socketio.Client()
 
+# Oportunidade de arbitragem entre duas exchanges: comprar no ask de uma e vender no bid da outra;
+# spread_liquido é o percentual já descontadas as taxas e as quantidades são as do topo do livro (NaN se desconhecidas)
+Oportunidade = namedtuple('Oportunidade', 'compra_exchange venda_exchange preco_compra preco_venda spread_liquido '
+                                          'quantidade_compra quantidade_venda', defaults=(math.nan, math.nan))
+
+# Resultado da execução simulada contra os livros de ofertas das duas exchanges
+AvaliacaoBook = namedtuple('AvaliacaoBook', 'quantidade vwap_compra vwap_venda lucro_liquido quantidade_maxima')
+
+# Preço de uma moeda em uma exchange com o timestamp informado pela exchange e o do recebimento (epoch s)
+PrecoRecebido = namedtuple('PrecoRecebido', 'preco timestamp recebido_em')
+
+# Aresta do grafo de conversões em uma exchange; peso = -log(taxa de conversão × (1 − fee)), lado é 'compra' ou 'venda'
+Aresta = namedtuple('Aresta', 'peso timestamp exchange simbolo lado preco')
+
+# Um passo de um ciclo de arbitragem: converter ativo_de em ativo_para na exchange, pelo par simbolo
+PassoCiclo = namedtuple('PassoCiclo', 'exchange ativo_de ativo_para lado simbolo preco')
+
+# Ciclo de conversões lucrativo; chave identifica os nós do ciclo independente do ponto de partida
+CicloArbitragem = namedtuple('CicloArbitragem', 'passos lucro_percentual chave')
+
+# Relógio da idade dos preços e do cooldown dos alertas; o replay.py o troca pelo tempo dos ticks gravados
+relogio = time.time
+
+# Protege a matriz (e o seu livro de preços) entre o callback do Socket.IO e as threads de avaliação
+trava_precos = threading.Lock()
+
+# Livros de ofertas recebidos em books_atualizados ou book_atualizado:
+# (moeda, exchange) -> (LivroOfertas dos asks, LivroOfertas dos bids, recebido em epoch s)
+books_exchanges = {}
+
+
+# Métricas expostas no endpoint /metrics do robô
+METRICA_TICKS = metricas.registro.contador('robo_ticks_total', "Preços recebidos do webhook", ('exchange',))
+METRICA_LATENCIA_FEED = metricas.registro.histograma(
+    'robo_latencia_feed_segundos', "Recebimento do preço menos o timestamp da exchange", ('exchange',),
+    [faixa / 1000 for faixa in FAIXAS_LATENCIA_MS])
+METRICA_DECISAO = metricas.registro.histograma(
+    'robo_tick_decisao_segundos', "Do recebimento do preço mais recente da moeda até o fim da sua avaliação")
+METRICA_ATRASO_FILA = metricas.registro.histograma(
+    'robo_atraso_fila_segundos', "Tempo de uma moeda na fila do pipeline até começar a ser avaliada", ('pipeline',))
+METRICA_AVALIACAO = metricas.registro.histograma(
+    'robo_avaliacao_segundos', "Duração de cada avaliação do pipeline", ('pipeline',))
+METRICA_ALERTAS = metricas.registro.contador(
+    'robo_alertas_total', "Alertas enfileirados ao Telegram", ('tipo',))
+METRICA_SUPRIMIDOS = metricas.registro.contador(
+    'robo_alertas_suprimidos_total', "Oportunidades não alertadas (repetidas, em cooldown ou sem profundidade)", ('tipo',))
+METRICA_DB = metricas.registro.histograma(
+    'robo_db_gravacao_segundos', "Duração de cada transação de gravação das escritas pendentes")
+METRICA_DB_ERROS = metricas.registro.contador('robo_db_erros_total', "Gravações no banco que falharam")
+METRICA_DB_MANUTENCAO = metricas.registro.histograma(
+    'robo_db_manutencao_segundos', "Duração de cada etapa da manutenção do banco", ('etapa',))
+METRICA_TELEGRAM = metricas.registro.histograma(
+    'robo_telegram_envio_segundos', "Duração de cada requisição sendMessage ao Telegram")
+METRICA_TELEGRAM_RESULTADOS = metricas.registro.contador(
+    'robo_telegram_requisicoes_total', "Requisições ao Telegram pelo resultado", ('resultado',))
+
 
 class DatabaseManager:
-    """Gerenciador de operações no banco de dados SQLite."""
-    def __init__(self, db_path):
+    """Gerenciador de operações no banco de dados SQLite.
+
+    Mantém uma única conexão em modo WAL. As escritas ficam pendentes em memória
+    e são gravadas juntas, em uma transação, a cada `intervalo_flush` segundos;
+    as leituras já consideram as escritas pendentes. Cada moeda e par de
+    exchanges tem no máximo uma mensagem por data_hora (o minuto do alerta).
+
+    Na mesma transação, toda mensagem enviada, inclusive as que repetem o minuto
+    de uma já guardada, soma no resumo por hora (oportunidades_por_hora:
+    alertas, soma e máximo do spread e soma do lucro por moeda e par de
+    exchanges), consultado pela view
+    media_oportunidades_por_hora. Em mensagens_enviadas os números são REAL e
+    data_hora é epoch s; bancos no esquema antigo (tudo TEXT) são migrados em
+    inicializar_tabelas. A manutenção periódica (iniciar_manutencao) aplica a
+    retenção, atualiza as estatísticas do planejador e compacta o arquivo.
+    """
+    VERSAO_ESQUEMA = 2
+    SQL_MENSAGENS = '''
+    CREATE TABLE {}mensagens_enviadas (
+        moeda TEXT NOT NULL,
+        compra_exchange TEXT NOT NULL,
+        venda_exchange TEXT NOT NULL,
+        preco_compra REAL,
+        preco_venda REAL,
+        diferenca_percentual REAL,
+        quantidade REAL,
+        lucro_liquido REAL,
+        data_hora REAL NOT NULL,
+        UNIQUE (moeda, compra_exchange, venda_exchange, data_hora)
+    )
+    '''
+
+    def __init__(self, db_path, intervalo_flush=INTERVALO_FLUSH_DB):
         self.db_path = db_path
+        self.intervalo_flush = intervalo_flush
+        self.conexao = None
+        self.trava = threading.RLock()
+        self.oportunidades_pendentes = {}
+        self.mensagens_pendentes = {}
+        self.resumos_pendentes = {}
+        self.thread_flush = None
+        self.thread_manutencao = None
+        # Segurada pelo VACUUM, que roda em outra conexão; os flushes não esperam por ela
+        self.compactacao = threading.Lock()
 
     def conectar(self):
-        return sqlite3.connect(self.db_path)
+        """Retorna a conexão persistente, abrindo-a na primeira chamada."""
+        with self.trava:
+            if self.conexao is None:
+                self.conexao = sqlite3.connect(self.db_path, check_same_thread=False)
+                self.conexao.execute("PRAGMA journal_mode=WAL")
+                self.conexao.execute("PRAGMA synchronous=NORMAL")
+            return self.conexao
 
     def inicializar_tabelas(self):
-        """Cria as tabelas no banco de dados, se não existirem."""
-        with self.conectar() as conexao:
-            cursor = conexao.cursor()
-            # Tabela para oportunidades
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS oportunidades (
-                moeda TEXT PRIMARY KEY,
-                compra_exchange TEXT,
-                venda_exchange TEXT,
-                preco_compra REAL,
-                preco_venda REAL,
-                lucro_liquido REAL,
-                timestamp TEXT
-            )
+        """Cria as tabelas, índices e views no banco de dados, migrando o esquema antigo se preciso."""
+        with self.trava:
+            conexao = self.conectar()
+            with conexao:
+                cursor = conexao.cursor()
+                # Tabela para oportunidades
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS oportunidades (
+                    moeda TEXT PRIMARY KEY,
+                    compra_exchange TEXT,
+                    venda_exchange TEXT,
+                    preco_compra REAL,
+                    preco_venda REAL,
+                    lucro_liquido REAL,
+                    timestamp TEXT
+                )
+                ''')
+                # Rotas de ciclos gravadas por versões anteriores não são moedas e não devem aquecer o cache
+                cursor.execute("DELETE FROM oportunidades WHERE moeda LIKE '% → %'")
+                # Resumo por hora (início da hora em epoch s) das mensagens enviadas
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS oportunidades_por_hora (
+                    hora INTEGER NOT NULL,
+                    moeda TEXT NOT NULL,
+                    compra_exchange TEXT NOT NULL,
+                    venda_exchange TEXT NOT NULL,
+                    alertas INTEGER NOT NULL,
+                    soma_spread REAL NOT NULL,
+                    maior_spread REAL NOT NULL,
+                    soma_lucro REAL NOT NULL,
+                    PRIMARY KEY (hora, moeda, compra_exchange, venda_exchange)
+                ) WITHOUT ROWID
+                ''')
+                cursor.execute('''
+                CREATE VIEW IF NOT EXISTS media_oportunidades_por_hora AS
+                SELECT hora, moeda, compra_exchange, venda_exchange, alertas,
+                       soma_spread / alertas AS spread_medio, maior_spread, soma_lucro / alertas AS lucro_medio
+                FROM oportunidades_por_hora
+                ''')
+            versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+            antiga = conexao.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name IN ('mensagens_enviadas', 'mensagens_enviadas_v1')"
+            ).fetchone()
+            migrar = antiga and versao < 2
+            if migrar:
+                self._migrar_v2(conexao)
+            with conexao:
+                # Tabela para mensagens enviadas
+                conexao.execute(self.SQL_MENSAGENS.format('IF NOT EXISTS '))
+                # Índice para a limpeza por data; o do UNIQUE atende as consultas por moeda/par
+                conexao.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_data ON mensagens_enviadas (data_hora)")
+                conexao.execute(f"PRAGMA user_version = {self.VERSAO_ESQUEMA}")
+            if migrar:
+                # Devolve o espaço da tabela antiga e gera as estatísticas dos novos índices
+                inicio = time.perf_counter()
+                conexao.execute("VACUUM")
+                conexao.execute("ANALYZE")
+                log_info(f"Banco compactado e analisado em {time.perf_counter() - inicio:.1f}s.")
+
+    def _migrar_v2(self, conexao):
+        """Converte mensagens_enviadas do esquema 1 (tudo TEXT, UNIQUE em todas as colunas) para colunas tipadas.
+
+        data_hora ('AAAA-MM-DD HH:MM[...]' no horário local) vira epoch s;
+        linhas com data ilegível e repetições da mesma moeda, par e minuto são
+        descartadas da tabela. O resumo por hora é preenchido com o histórico,
+        contando também as repetições, como registrar_mensagem_enviada.
+
+        Tudo, inclusive o user_version, roda em uma única transação explícita (o
+        módulo sqlite3 confirmaria cada DDL na hora): uma migração interrompida
+        não deixa nada pela metade. Uma mensagens_enviadas_v1 deixada pela versão
+        anterior desta migração, que não era atômica, volta a ser a tabela original.
+        """
+        inicio = time.perf_counter()
+        isolamento, conexao.isolation_level = conexao.isolation_level, None
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            if conexao.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'mensagens_enviadas_v1'").fetchone():
+                log_warning("Retomando uma migração interrompida: mensagens_enviadas_v1 volta a ser a tabela original.")
+                conexao.execute("DROP TABLE IF EXISTS mensagens_enviadas")
+                conexao.execute("ALTER TABLE mensagens_enviadas_v1 RENAME TO mensagens_enviadas")
+            total = conexao.execute("SELECT COUNT(*) FROM mensagens_enviadas").fetchone()[0]
+            log_info(f"Migrando {total} mensagens enviadas para o esquema {self.VERSAO_ESQUEMA} (colunas tipadas)...")
+            conexao.execute("DROP INDEX IF EXISTS idx_mensagens_par_data")
+            conexao.execute("DROP INDEX IF EXISTS idx_mensagens_data")
+            conexao.execute("ALTER TABLE mensagens_enviadas RENAME TO mensagens_enviadas_v1")
+            conexao.execute(self.SQL_MENSAGENS.format(''))
+            conexao.execute('''
+            INSERT OR IGNORE INTO mensagens_enviadas
+            SELECT moeda, compra_exchange, venda_exchange, CAST(preco_compra AS REAL), CAST(preco_venda AS REAL),
+                   CAST(diferenca_percentual AS REAL), CAST(quantidade AS REAL), CAST(lucro_liquido AS REAL),
+                   CAST(strftime('%s', data_hora, 'utc') AS REAL)
+            FROM mensagens_enviadas_v1
+            WHERE moeda IS NOT NULL AND strftime('%s', data_hora, 'utc') IS NOT NULL
             ''')
-            # Tabela para mensagens enviadas
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mensagens_enviadas (
-                moeda TEXT,
-                compra_exchange TEXT,
-                venda_exchange TEXT,
-                preco_compra TEXT,
-                preco_venda TEXT,
-                diferenca_percentual TEXT,
-                quantidade TEXT,
-                lucro_liquido TEXT,
-                data_hora TEXT,
-                UNIQUE(moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, diferenca_percentual, quantidade, lucro_liquido, data_hora)
+            migradas = conexao.execute("SELECT changes()").fetchone()[0]
+            conexao.execute('''
+            INSERT OR REPLACE INTO oportunidades_por_hora
+            SELECT CAST(data_hora / 3600 AS INTEGER) * 3600, moeda, compra_exchange, venda_exchange,
+                   COUNT(*), TOTAL(spread), MAX(COALESCE(spread, 0)), TOTAL(lucro)
+            FROM (
+                SELECT moeda, compra_exchange, venda_exchange, CAST(diferenca_percentual AS REAL) AS spread,
+                       CAST(lucro_liquido AS REAL) AS lucro, CAST(strftime('%s', data_hora, 'utc') AS REAL) AS data_hora
+                FROM mensagens_enviadas_v1
+                WHERE moeda IS NOT NULL
             )
+            WHERE data_hora IS NOT NULL
+            GROUP BY 1, 2, 3, 4
             ''')
-            conexao.commit()
-
-    def obter_ultima_oportunidade(self, moeda):
-        """Retorna a última oportunidade registrada para a moeda."""
-        with self.conectar() as conexao:
-            cursor = conexao.cursor()
-            cursor.execute("SELECT * FROM oportunidades WHERE moeda = ?", (moeda,))
-            resultado = cursor.fetchone()
-            if resultado:
-                return resultado
-            return None
+            conexao.execute("DROP TABLE mensagens_enviadas_v1")
+            conexao.execute("CREATE INDEX idx_mensagens_data ON mensagens_enviadas (data_hora)")
+            conexao.execute(f"PRAGMA user_version = {self.VERSAO_ESQUEMA}")
+            conexao.execute("COMMIT")
+        except BaseException:
+            if conexao.in_transaction:
+                conexao.execute("ROLLBACK")
+            raise
+        finally:
+            conexao.isolation_level = isolamento
+        log_info(f"Migração concluída em {time.perf_counter() - inicio:.1f}s: {migradas} mensagens mantidas, "
+                 f"{total - migradas} descartadas (data ilegível ou repetidas no mesmo minuto).")
+
+    def listar_oportunidades(self):
+        """Retorna todas as oportunidades registradas, incluindo as pendentes."""
+        with self.trava:
+            linhas = {linha[0]: linha for linha in self.conectar().execute("SELECT * FROM oportunidades")}
+            linhas.update(self.oportunidades_pendentes)
+            return list(linhas.values())
 
     def salvar_oportunidade(self, moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, lucro_liquido):
-        """Salva ou atualiza uma oportunidade no banco de dados."""
-        with self.conectar() as conexao:
-            cursor = conexao.cursor()
-            cursor.execute('''
-            INSERT INTO oportunidades (moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, lucro_liquido, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(moeda) DO UPDATE SET
-                compra_exchange = excluded.compra_exchange,
-                venda_exchange = excluded.venda_exchange,
-                preco_compra = excluded.preco_compra,
-                preco_venda = excluded.preco_venda,
-                lucro_liquido = excluded.lucro_liquido,
-                timestamp = excluded.timestamp
-            ''', (moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, lucro_liquido, datetime.now().isoformat()))
-            conexao.commit()
-
-    def verificar_mensagem_enviada(self, parametros):
-        """Verifica se uma mensagem com os mesmos parâmetros já foi enviada."""
-        with self.conectar() as conexao:
-            cursor = conexao.cursor()
-            cursor.execute('''
-            SELECT * FROM mensagens_enviadas WHERE
-                moeda = ? AND
-                compra_exchange = ? AND
-                venda_exchange = ? AND
-                preco_compra = ? AND
-                preco_venda = ? AND
-                diferenca_percentual = ? AND
-                quantidade = ? AND
-                lucro_liquido = ? AND
-                data_hora = ?
-            ''', parametros)
-            return cursor.fetchone() is not None
+        """Salva ou atualiza uma oportunidade no banco de dados (no próximo flush)."""
+        with self.trava:
+            self.oportunidades_pendentes[moeda] = (
+                moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, lucro_liquido, datetime.now().isoformat()
+            )
+            self._agendar_flush()
 
     def registrar_mensagem_enviada(self, parametros):
-        """Registra uma mensagem como enviada no banco de dados."""
-        with self.conectar() as conexao:
-            cursor = conexao.cursor()
-            try:
-                cursor.execute('''
-                INSERT INTO mensagens_enviadas (
+        """Registra uma mensagem como enviada no banco de dados (no próximo flush).
+
+        `parametros` é (moeda, compra, venda, preço de compra, preço de venda,
+        diferença percentual, quantidade, lucro líquido, data_hora em epoch s).
+        Na tabela vale a primeira mensagem de cada moeda, par e data_hora (as
+        repetidas são ignoradas aqui ou, se a primeira já foi gravada, pelo
+        UNIQUE), mas todas contam no resumo por hora.
+        """
+        moeda, compra, venda, _, _, spread, _, lucro, data_hora = parametros
+        with self.trava:
+            self.mensagens_pendentes.setdefault((moeda, compra, venda, data_hora), tuple(parametros))
+            resumo = self.resumos_pendentes.setdefault((int(data_hora // 3600) * 3600, moeda, compra, venda), [0, 0.0, spread, 0.0])
+            resumo[0] += 1
+            resumo[1] += spread
+            resumo[2] = max(resumo[2], spread)
+            resumo[3] += lucro
+            self._agendar_flush()
+
+    def descarregar(self, esperar=False):
+        """Grava todas as escritas pendentes, e o resumo por hora das mensagens, em uma única transação.
+
+        Durante um VACUUM não grava nada, e as escritas seguem pendentes para o
+        próximo flush, a menos que `esperar` seja True.
+        """
+        if not self.compactacao.acquire(blocking=esperar):
+            return
+        try:
+            self._descarregar()
+        finally:
+            self.compactacao.release()
+
+    def _descarregar(self):
+        with self.trava:
+            if not self.oportunidades_pendentes and not self.mensagens_pendentes:
+                return
+            with METRICA_DB.cronometrar(), self.conectar() as conexao:
+                conexao.executemany('''
+                INSERT OR IGNORE INTO mensagens_enviadas (
                     moeda, compra_exchange, venda_exchange, preco_compra, preco_venda,
                     diferenca_percentual, quantidade, lucro_liquido, data_hora
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', parametros)
-                conexao.commit()
-            except sqlite3.IntegrityError:
-                # Ignora tentativas de inserir duplicatas
-                pass
-
-    def limpar_mensagens_antigas(self, dias=7):
-        """Remove mensagens enviadas há mais de `dias` dias."""
-        with self.conectar() as conexao:
-            cursor = conexao.cursor()
-            cursor.execute('''
-            DELETE FROM mensagens_enviadas WHERE data_hora < ?
-            ''', (datetime.now() - timedelta(days=dias),))
-            conexao.commit()
+                ''', list(self.mensagens_pendentes.values()))
+                conexao.executemany('''
+                INSERT INTO oportunidades_por_hora VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hora, moeda, compra_exchange, venda_exchange) DO UPDATE SET
+                    alertas = alertas + excluded.alertas,
+                    soma_spread = soma_spread + excluded.soma_spread,
+                    maior_spread = max(maior_spread, excluded.maior_spread),
+                    soma_lucro = soma_lucro + excluded.soma_lucro
+                ''', [(*chave, *valores) for chave, valores in self.resumos_pendentes.items()])
+                conexao.executemany('''
+                INSERT INTO oportunidades (moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, lucro_liquido, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(moeda) DO UPDATE SET
+                    compra_exchange = excluded.compra_exchange,
+                    venda_exchange = excluded.venda_exchange,
+                    preco_compra = excluded.preco_compra,
+                    preco_venda = excluded.preco_venda,
+                    lucro_liquido = excluded.lucro_liquido,
+                    timestamp = excluded.timestamp
+                ''', list(self.oportunidades_pendentes.values()))
+            self.mensagens_pendentes.clear()
+            self.resumos_pendentes.clear()
+            self.oportunidades_pendentes.clear()
+
+    def _agendar_flush(self):
+        if self.thread_flush is None:
+            self.thread_flush = threading.Thread(target=self._descarregar_periodicamente, daemon=True)
+            self.thread_flush.start()
+            atexit.register(self.descarregar, esperar=True)
+
+    def _descarregar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo_flush)
+            try:
+                self.descarregar()
+            except sqlite3.Error as e:
+                METRICA_DB_ERROS.incrementar()
+                log_error(f"Erro ao gravar no banco de dados: {e}")
+
+    def limpar_mensagens_antigas(self, dias=RETENCAO_MENSAGENS_DIAS, dias_resumo=RETENCAO_RESUMO_DIAS, lote=10000):
+        """Remove mensagens enviadas há mais de `dias` dias e resumos por hora com mais de `dias_resumo` dias.
+
+        As mensagens são apagadas em transações de até `lote` linhas, liberando a
+        trava entre elas para o flush não esperar a limpeza inteira. Retorna
+        (mensagens, resumos) removidos.
+        """
+        limite = time.time() - dias * 86400
+        mensagens = 0
+        while True:
+            with self.trava, self.conectar() as conexao:
+                apagadas = conexao.execute('''
+                DELETE FROM mensagens_enviadas WHERE rowid IN (
+                    SELECT rowid FROM mensagens_enviadas WHERE data_hora < ? LIMIT ?
+                )
+                ''', (limite, lote)).rowcount
+            mensagens += apagadas
+            if apagadas < lote:
+                break
+        with self.trava, self.conectar() as conexao:
+            resumos = conexao.execute(
+                "DELETE FROM oportunidades_por_hora WHERE hora < ?", (time.time() - dias_resumo * 86400,)).rowcount
+        return mensagens, resumos
+
+    def manter(self, fracao_vacuum=FRACAO_VACUUM):
+        """Uma rodada de manutenção: retenção, PRAGMA optimize (ANALYZE do que mudou) e VACUUM.
+
+        O VACUUM só roda quando as páginas livres ou as mensagens removidas nesta
+        rodada passam de `fracao_vacuum`: páginas meio vazias não entram no
+        freelist, então só ele não basta.
+        """
+        inicio = time.perf_counter()
+        with METRICA_DB_MANUTENCAO.cronometrar('retencao'):
+            mensagens, resumos = self.limpar_mensagens_antigas()
+        with METRICA_DB_MANUTENCAO.cronometrar('optimize'), self.trava:
+            self.conectar().execute("PRAGMA optimize")
+        with self.trava:
+            conexao = self.conectar()
+            paginas = conexao.execute("PRAGMA page_count").fetchone()[0]
+            livres = conexao.execute("PRAGMA freelist_count").fetchone()[0]
+            restantes = conexao.execute("SELECT COUNT(*) FROM mensagens_enviadas").fetchone()[0]
+        compactado = (paginas and livres / paginas >= fracao_vacuum) or mensagens > fracao_vacuum * (mensagens + restantes)
+        if compactado:
+            # Conexão própria e sem a trava: as leituras do robô seguem durante o VACUUM (WAL)
+            with self.compactacao, METRICA_DB_MANUTENCAO.cronometrar('vacuum'):
+                conexao = sqlite3.connect(self.db_path)
+                try:
+                    conexao.execute("VACUUM")
+                    # No modo WAL o VACUUM passa pelo -wal; o checkpoint devolve esse espaço
+                    conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                finally:
+                    conexao.close()
+        log_info(f"Manutenção do banco em {time.perf_counter() - inicio:.1f}s: {mensagens} mensagens e {resumos} "
+                 f"resumos por hora removidos, {restantes} mensagens restantes, {livres}/{paginas} páginas livres"
+                 + (", compactado." if compactado else "."))
+
+    def iniciar_manutencao(self, intervalo=INTERVALO_MANUTENCAO_DB):
+        """Roda manter() em segundo plano a cada `intervalo` segundos."""
+        def executar():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    self.manter()
+                except sqlite3.Error as e:
+                    METRICA_DB_ERROS.incrementar()
+                    log_error(f"Erro na manutenção do banco de dados: {e}")
+
+        if self.thread_manutencao is None:
+            self.thread_manutencao = threading.Thread(target=executar, daemon=True)
+            self.thread_manutencao.start()
+
+    def resumo_por_hora(self, desde, moeda=None):
+        """Alertas, spread médio e máximo e lucro médio por hora e par de exchanges desde `desde` (epoch s).
+
+        Inclui as mensagens pendentes, exceto durante um VACUUM, quando elas só entram no próximo flush.
+        """
+        self.descarregar()
+        with self.trava:
+            sql = "SELECT * FROM media_oportunidades_por_hora WHERE hora >= ?"
+            parametros = [int(desde // 3600) * 3600]
+            if moeda is not None:
+                sql += " AND moeda = ?"
+                parametros.append(moeda)
+            return self.conectar().execute(sql + " ORDER BY hora, moeda", parametros).fetchall()
+
+    def fechar(self):
+        """Grava as escritas pendentes, esperando um VACUUM em andamento, e fecha a conexão."""
+        with self.compactacao, self.trava:
+            self._descarregar()
+            if self.conexao is not None:
+                self.conexao.close()
+                self.conexao = None
+
+
+class CacheOportunidades:
+    """Última oportunidade alertada por (moeda, compra, venda), mantida em memória.
+
+    Decide sem acessar o disco se uma oportunidade deve ser alertada. É aquecido
+    a partir da tabela oportunidades e os alertas registrados são gravados pelo
+    DatabaseManager em segundo plano; sem `db_manager` (os ciclos de arbitragem,
+    cujas rotas não são moedas) fica só em memória. Entradas mais antigas que
+    `validade` ou além de `capacidade` (as menos recentes) são descartadas.
+    """
+    def __init__(self, db_manager, cooldown=COOLDOWN_ALERTA_SEGUNDOS, validade=VALIDADE_CACHE_SEGUNDOS, capacidade=10000):
+        self.db_manager = db_manager
+        self.cooldown = cooldown
+        self.validade = validade
+        self.capacidade = capacidade
+        self.entradas = OrderedDict()
+        self.trava = threading.Lock()
+
+    def aquecer(self):
+        """Carrega as oportunidades ainda válidas registradas no banco de dados."""
+        agora = relogio()
+        with self.trava:
+            for moeda, compra, venda, preco_compra, preco_venda, lucro_liquido, timestamp in self.db_manager.listar_oportunidades():
+                momento = datetime.fromisoformat(timestamp).timestamp()
+                if agora - momento < self.validade:
+                    self.entradas[(moeda, compra, venda)] = (preco_compra, preco_venda, lucro_liquido, momento)
+            self.entradas = OrderedDict(sorted(self.entradas.items(), key=lambda item: item[1][3]))
+        log_info(f"Cache de oportunidades aquecido com {len(self.entradas)} registros.")
+
+    def motivo_supressao(self, moeda, compra, venda, preco_compra, preco_venda, lucro_liquido):
+        """Retorna o motivo para não alertar a oportunidade, ou None se ela deve ser alertada."""
+        chave = (moeda, compra, venda)
+        agora = relogio()
+        with self.trava:
+            entrada = self.entradas.get(chave)
+            if entrada is None:
+                return None
+            ultima_compra, ultima_venda, ultimo_lucro, momento = entrada
+            if agora - momento >= self.validade:
+                del self.entradas[chave]
+                return None
+        if agora - momento < self.cooldown:
+            return f"alertada há {agora - momento:.0f}s (cooldown de {self.cooldown}s)"
+        if (abs(preco_compra - ultima_compra) / ultima_compra < MUDANCA_MINIMA_PERCENTUAL and
+            abs(preco_venda - ultima_venda) / ultima_venda < MUDANCA_MINIMA_PERCENTUAL and
+            abs(lucro_liquido - ultimo_lucro) < MUDANCA_MINIMA_LUCRO):
+            return "não mudou significativamente"
+        return None
+
+    def registrar(self, moeda, compra, venda, preco_compra, preco_venda, lucro_liquido):
+        """Registra a oportunidade alertada em memória e agenda sua gravação no banco."""
+        chave = (moeda, compra, venda)
+        with self.trava:
+            self.entradas.pop(chave, None)
+            self.entradas[chave] = (preco_compra, preco_venda, lucro_liquido, relogio())
+            while len(self.entradas) > self.capacidade:
+                self.entradas.popitem(last=False)
+        if self.db_manager is not None:
+            self.db_manager.salvar_oportunidade(moeda, compra, venda, preco_compra, preco_venda, lucro_liquido)
+
+
+class LivroPrecos:
+    """Último preço e topo do ticker de cada moeda em cada exchange, em arrays tipados indexados por linha (moeda) e coluna (exchange).
+
+    É o único lugar onde o robô guarda os preços: a MatrizOportunidades lê estes
+    mesmos arrays, como visões NumPy sem cópia. Moedas e exchanges recebem um
+    índice inteiro na primeira vez em que aparecem. Preço, bid, ask, quantidades
+    no topo, volume 24h, timestamp da exchange e recebimento (epoch s) ficam em
+    `array('d')` de `capacidade` linhas × uma coluna por exchange, com NaN nas
+    posições vazias; as linhas crescem 1,5× quando acabam. Por linha são
+    mantidos a quantidade de exchanges com preço, o recebimento mais recente e
+    as colunas do menor ask e do maior bid: a atualização é O(1) e a linha só é
+    varrida quando um deles piora ou sai. snapshot()/restaurar() e
+    salvar()/carregar() (.npz) permitem reiniciar o robô com os preços da execução anterior.
+    """
+    __slots__ = ('moedas', 'indice_moeda', 'exchanges', 'indice_exchange', 'capacidade', 'colunas',
+                 'precos', 'bids', 'asks', 'quantidades_bid', 'quantidades_ask', 'volumes', 'timestamps', 'recebidos',
+                 'quantidades', 'ultimos', 'menores_asks', 'maiores_bids')
+
+    CAMPOS = ('precos', 'bids', 'asks', 'quantidades_bid', 'quantidades_ask', 'volumes', 'timestamps', 'recebidos')
+
+    def __init__(self, capacidade=16):
+        self.moedas = []
+        self.indice_moeda = {}
+        self.exchanges = []
+        self.indice_exchange = {}
+        self.capacidade = capacidade
+        self.colunas = 0
+        for nome in self.CAMPOS:
+            setattr(self, nome, array('d'))
+        self.quantidades = array('i', [0]) * capacidade
+        self.ultimos = array('d', [-math.inf]) * capacidade
+        self.menores_asks = array('i', [-1]) * capacidade
+        self.maiores_bids = array('i', [-1]) * capacidade
+
+    def __len__(self):
+        return len(self.moedas)
+
+    def _redimensionar(self, capacidade, colunas):
+        # Arrays sempre novos: redimensionar no lugar falharia com uma visão NumPy ainda viva
+        for nome in self.CAMPOS:
+            antigo = getattr(self, nome)
+            if colunas == self.colunas:
+                novo = array('d', antigo)
+                novo.extend(array('d', [math.nan]) * ((capacidade - self.capacidade) * colunas))
+            else:
+                novo = array('d', [math.nan]) * (capacidade * colunas)
+                for linha in range(len(self.moedas)):
+                    novo[linha * colunas:linha * colunas + self.colunas] = antigo[linha * self.colunas:(linha + 1) * self.colunas]
+            setattr(self, nome, novo)
+        extra = capacidade - self.capacidade
+        self.quantidades.extend(array('i', [0]) * extra)
+        self.ultimos.extend(array('d', [-math.inf]) * extra)
+        self.menores_asks.extend(array('i', [-1]) * extra)
+        self.maiores_bids.extend(array('i', [-1]) * extra)
+        self.capacidade = capacidade
+        self.colunas = colunas
+
+    def _linha(self, moeda):
+        linha = len(self.moedas)
+        if linha == self.capacidade:
+            self._redimensionar(max(16, self.capacidade * 3 // 2), self.colunas)
+        self.moedas.append(moeda)
+        self.indice_moeda[moeda] = linha
+        return linha
+
+    def _coluna(self, exchange):
+        coluna = len(self.exchanges)
+        self._redimensionar(self.capacidade, self.colunas + 1)
+        self.exchanges.append(exchange)
+        self.indice_exchange[exchange] = coluna
+        return coluna
+
+    def _varrer(self, linha):
+        """Recalcula o menor ask, o maior bid e o recebimento mais recente da linha."""
+        base = linha * self.colunas
+        menor = maior = -1
+        ultimo = -math.inf
+        for coluna in range(len(self.exchanges)):
+            ask = self.asks[base + coluna]
+            if ask != ask:
+                continue
+            if menor < 0 or ask < self.asks[base + menor]:
+                menor = coluna
+            if maior < 0 or self.bids[base + coluna] > self.bids[base + maior]:
+                maior = coluna
+            ultimo = max(ultimo, self.recebidos[base + coluna])
+        self.menores_asks[linha] = menor
+        self.maiores_bids[linha] = maior
+        self.ultimos[linha] = ultimo
+
+    def atualizar(self, moeda, exchange, preco, timestamp, recebido_em, topo=None):
+        """Registra o preço da moeda na exchange, cotado em `timestamp` e recebido em `recebido_em` (epoch s). Retorna a linha.
+
+        `topo` é (bid, ask, quantidade no bid, quantidade no ask, volume 24h),
+        como enviado pelo webhook; valores desconhecidos podem vir como None. Sem
+        bid e ask (exchanges que não os informam), vale o último preço para os dois.
+        """
+        linha = self.indice_moeda.get(moeda)
+        if linha is None:
+            linha = self._linha(moeda)
+        coluna = self.indice_exchange.get(exchange)
+        if coluna is None:
+            coluna = self._coluna(exchange)
+        bid, ask, quantidade_bid, quantidade_ask, volume = topo if topo and topo[0] and topo[1] else (preco, preco, None, None, None)
+        base = linha * self.colunas
+        posicao = base + coluna
+        ask_anterior = self.asks[posicao]
+        bid_anterior = self.bids[posicao]
+        if ask_anterior != ask_anterior:
+            self.quantidades[linha] += 1
+        self.precos[posicao] = preco
+        self.bids[posicao] = bid
+        self.asks[posicao] = ask
+        self.quantidades_bid[posicao] = math.nan if quantidade_bid is None else quantidade_bid
+        self.quantidades_ask[posicao] = math.nan if quantidade_ask is None else quantidade_ask
+        self.volumes[posicao] = math.nan if volume is None else volume
+        self.timestamps[posicao] = timestamp
+        self.recebidos[posicao] = recebido_em
+        if recebido_em > self.ultimos[linha]:
+            self.ultimos[linha] = recebido_em
+
+        varrer = False
+        menor = self.menores_asks[linha]
+        if menor < 0 or ask < self.asks[base + menor]:
+            self.menores_asks[linha] = coluna
+        elif menor == coluna and ask > ask_anterior:
+            varrer = True
+        maior = self.maiores_bids[linha]
+        if maior < 0 or bid > self.bids[base + maior]:
+            self.maiores_bids[linha] = coluna
+        elif maior == coluna and bid < bid_anterior:
+            varrer = True
+        if varrer:
+            self._varrer(linha)
+        return linha
+
+    def remover(self, moeda, exchange):
+        """Descarta o preço da moeda na exchange. Retorna se havia preço."""
+        linha = self.indice_moeda.get(moeda)
+        coluna = self.indice_exchange.get(exchange)
+        if linha is None or coluna is None:
+            return False
+        posicao = linha * self.colunas + coluna
+        if self.asks[posicao] != self.asks[posicao]:
+            return False
+        for nome in self.CAMPOS:
+            getattr(self, nome)[posicao] = math.nan
+        self.quantidades[linha] -= 1
+        self._varrer(linha)
+        return True
+
+    def campo(self, nome):
+        """Visão NumPy moedas × exchanges, sem cópia, de um dos CAMPOS. Vale até a próxima moeda ou exchange nova."""
+        return np.frombuffer(getattr(self, nome), dtype=np.float64).reshape(self.capacidade, self.colunas)[:len(self.moedas)]
+
+    def campo_linha(self, nome, linha):
+        """Visão NumPy, sem cópia, de um dos CAMPOS na linha (moeda) informada."""
+        return np.frombuffer(getattr(self, nome), dtype=np.float64, count=self.colunas, offset=linha * self.colunas * 8)
+
+    def quantidade(self, moeda):
+        """Número de exchanges com preço para a moeda."""
+        linha = self.indice_moeda.get(moeda)
+        return 0 if linha is None else self.quantidades[linha]
+
+    def recebido_em(self, moeda):
+        """Momento (epoch s) do preço recebido mais recentemente para a moeda, ou None."""
+        linha = self.indice_moeda.get(moeda)
+        if linha is None or not self.quantidades[linha]:
+            return None
+        return self.ultimos[linha]
+
+    def melhores(self, moeda):
+        """((exchange, ask) com o menor ask, (exchange, bid) com o maior bid) da moeda, ou None sem preços."""
+        linha = self.indice_moeda.get(moeda)
+        if linha is None or not self.quantidades[linha]:
+            return None
+        base = linha * self.colunas
+        menor, maior = self.menores_asks[linha], self.maiores_bids[linha]
+        return (self.exchanges[menor], self.asks[base + menor]), (self.exchanges[maior], self.bids[base + maior])
+
+    def spread_bruto(self, moeda):
+        """Percentual entre o maior bid e o menor ask da moeda, sem taxas; None com menos de duas exchanges.
+
+        Comprar no ask e vender no bid, com taxas, nunca rende mais do que isso:
+        nenhuma oportunidade da moeda tem spread líquido maior.
+        """
+        linha = self.indice_moeda.get(moeda)
+        if linha is None or self.quantidades[linha] < 2:
+            return None
+        base = linha * self.colunas
+        return (self.bids[base + self.maiores_bids[linha]] / self.asks[base + self.menores_asks[linha]] - 1) * 100
+
+    def itens(self):
+        """Gera (moeda, exchange, preço, timestamp, bid, ask) de todos os preços guardados."""
+        for linha, moeda in enumerate(self.moedas):
+            base = linha * self.colunas
+            for coluna, exchange in enumerate(self.exchanges):
+                posicao = base + coluna
+                if self.asks[posicao] == self.asks[posicao]:
+                    yield (moeda, exchange, self.precos[posicao], self.timestamps[posicao],
+                           self.bids[posicao], self.asks[posicao])
+
+    def snapshot(self):
+        """Cópia do estado: nomes das moedas e exchanges e uma matriz moedas × exchanges por campo (precos, bids, ...)."""
+        estado = {'moedas': list(self.moedas), 'exchanges': list(self.exchanges)}
+        for nome in self.CAMPOS:
+            estado[nome] = self.campo(nome).copy()
+        return estado
+
+    @classmethod
+    def restaurar(cls, estado):
+        """Cria um livro com os preços de um snapshot().
+
+        Snapshots antigos podem não ter o topo: sem bids e asks vale o último
+        preço, e quantidades e volume ficam desconhecidos.
+        """
+        livro = cls(max(16, len(estado['moedas'])))
+        precos = np.asarray(estado['precos'], dtype=float)
+        desconhecidos = np.full_like(precos, np.nan)
+        topo = np.stack([np.asarray(estado.get(nome, padrao), dtype=float) for nome, padrao in (
+            ('bids', precos), ('asks', precos), ('quantidades_bid', desconhecidos), ('quantidades_ask', desconhecidos),
+            ('volumes', desconhecidos))], axis=-1)
+        linhas, colunas = np.nonzero(~np.isnan(precos))
+        for linha, coluna in zip(linhas.tolist(), colunas.tolist()):
+            livro.atualizar(str(estado['moedas'][linha]), str(estado['exchanges'][coluna]), float(precos[linha, coluna]),
+                            float(estado['timestamps'][linha][coluna]), float(estado['recebidos'][linha][coluna]),
+                            topo[linha, coluna].tolist())
+        return livro
+
+    def salvar(self, caminho):
+        """Grava o snapshot em um arquivo .npz (escrita atômica)."""
+        estado = self.snapshot()
+        estado['moedas'] = np.array(estado['moedas'], dtype=str)
+        estado['exchanges'] = np.array(estado['exchanges'], dtype=str)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'wb') as arquivo:
+            np.savez(arquivo, **estado)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Lê um arquivo gravado por salvar()."""
+        with np.load(caminho) as dados:
+            return cls.restaurar({nome: dados[nome] for nome in dados.files})
+
+
+class MatrizOportunidades:
+    """Spread líquido de todos os pares (compra, venda) de cada moeda, sobre os preços de um LivroPrecos.
+
+    Para cada moeda é mantida a matriz exchanges × exchanges do spread percentual
+    líquido executável de comprar no ask da linha e vender no bid da coluna, já
+    descontadas as taxas de TAXAS_EXCHANGES. Os preços, o topo do livro e os
+    timestamps ficam só no `livro`, com as mesmas linhas e colunas; uma
+    atualização de preço marca só a linha da moeda, que é recalculada na próxima consulta.
+
+    Só são comparados pares em que os dois preços têm no máximo `idade_maxima`
+    segundos, foram cotados com no máximo `desvio_maximo` segundos de diferença
+    entre si e as duas exchanges têm ao menos `volume_minimo` de volume (ou não o informam).
+    """
+    def __init__(self, taxas, livro=None, idade_maxima=IDADE_MAXIMA_PRECO, desvio_maximo=DESVIO_MAXIMO_PRECOS,
+                 volume_minimo=VOLUME_MINIMO_24H):
+        self.taxas_por_exchange = taxas
+        self.livro = LivroPrecos() if livro is None else livro
+        self.idade_maxima = idade_maxima
+        self.desvio_maximo = desvio_maximo
+        self.volume_minimo = volume_minimo
+        self.taxas = np.empty(0)
+        self.spreads = np.empty((0, 0, 0))
+        self.sujas = set()
+
+    def trocar_livro(self, livro):
+        """Passa a usar outro livro (ex.: restaurado de um arquivo); todos os spreads são recalculados."""
+        self.livro = livro
+        self.taxas = np.empty(0)
+        self.sujas.clear()
+
+    def _acompanhar_livro(self):
+        """Ajusta as taxas e os spreads às moedas e exchanges que apareceram no livro."""
+        exchanges = len(self.livro.exchanges)
+        if len(self.taxas) != exchanges:
+            self.taxas = np.array([self.taxas_por_exchange.get(exchange, 0) for exchange in self.livro.exchanges], dtype=float)
+            self.spreads = np.full((self.livro.capacidade, exchanges, exchanges), np.nan)
+            self.sujas.update(range(len(self.livro)))
+        elif len(self.spreads) < len(self.livro):
+            extra = np.full((self.livro.capacidade - len(self.spreads), exchanges, exchanges), np.nan)
+            self.spreads = np.concatenate([self.spreads, extra])
+
+    def atualizar(self, moeda, exchange, preco, timestamp=None, topo=None, recebido_em=None):
+        """Registra no livro o preço de uma moeda em uma exchange, cotado em `timestamp` (epoch s, padrão agora).
+
+        `topo` é (bid, ask, quantidade no bid, quantidade no ask, volume 24h),
+        como enviado pelo webhook; valores desconhecidos podem vir como None.
+        """
+        recebido_em = relogio() if recebido_em is None else recebido_em
+        self.sujas.add(self.livro.atualizar(moeda, exchange, preco, recebido_em if timestamp is None else timestamp,
+                                            recebido_em, topo))
+
+    def expirar(self, agora=None):
+        """Descarta do livro os preços mais velhos que idade_maxima. Retorna os pares (moeda, exchange) descartados."""
+        agora = relogio() if agora is None else agora
+        linhas, colunas = np.nonzero(agora - self.livro.campo('timestamps') > self.idade_maxima)
+        expirados = [(self.livro.moedas[l], self.livro.exchanges[c]) for l, c in zip(linhas.tolist(), colunas.tolist())]
+        for moeda, exchange in expirados:
+            self.livro.remover(moeda, exchange)
+        self.sujas.update(linhas.tolist())
+        return expirados
+
+    def _alinhados(self, timestamps, volumes, agora):
+        """Máscara (compra, venda) dos pares com os dois preços frescos, cotados em momentos próximos e com liquidez."""
+        validos = (agora - timestamps <= self.idade_maxima) & ~(volumes < self.volume_minimo)
+        desvio = np.abs(timestamps[..., :, np.newaxis] - timestamps[..., np.newaxis, :])
+        return validos[..., :, np.newaxis] & validos[..., np.newaxis, :] & (desvio <= self.desvio_maximo)
+
+    def _recalcular(self, linha):
+        custo = self.livro.campo_linha('asks', linha) * (1 + self.taxas)
+        receita = self.livro.campo_linha('bids', linha) * (1 - self.taxas)
+        spreads = (receita[np.newaxis, :] / custo[:, np.newaxis] - 1) * 100
+        np.fill_diagonal(spreads, np.nan)
+        self.spreads[linha] = spreads
+        self.sujas.discard(linha)
+
+    def oportunidades(self, moeda, minimo=LUCRO_MINIMO_PERCENTUAL, maximo=LUCRO_MAXIMO_PERCENTUAL, agora=None):
+        """Retorna as oportunidades da moeda com spread líquido em [minimo, maximo), da melhor para a pior."""
+        linha = self.livro.indice_moeda.get(moeda)
+        if linha is None:
+            return []
+        self._acompanhar_livro()
+        if linha in self.sujas:
+            self._recalcular(linha)
+        spreads = self.spreads[linha]
+        alinhados = self._alinhados(self.livro.campo_linha('timestamps', linha), self.livro.campo_linha('volumes', linha),
+                                    relogio() if agora is None else agora)
+        compras, vendas = np.nonzero((spreads >= minimo) & (spreads < maximo) & alinhados)
+        ordem = np.argsort(-spreads[compras, vendas])
+        return [self._oportunidade(linha, c, v, spreads[c, v]) for c, v in zip(compras[ordem].tolist(), vendas[ordem].tolist())]
+
+    def _oportunidade(self, linha, compra, venda, spread):
+        livro = self.livro
+        base = linha * livro.colunas
+        return Oportunidade(livro.exchanges[compra], livro.exchanges[venda], livro.asks[base + compra],
+                            livro.bids[base + venda], float(spread), livro.quantidades_ask[base + compra],
+                            livro.quantidades_bid[base + venda])
+
+    def ranking(self, minimo=LUCRO_MINIMO_PERCENTUAL, maximo=LUCRO_MAXIMO_PERCENTUAL, limite=None, agora=None):
+        """Retorna (moeda, Oportunidade) de todas as moedas acima do mínimo, da melhor para a pior."""
+        self._acompanhar_livro()
+        for linha in list(self.sujas):
+            self._recalcular(linha)
+        spreads = self.spreads[:len(self.livro)]
+        alinhados = self._alinhados(self.livro.campo('timestamps'), self.livro.campo('volumes'),
+                                    relogio() if agora is None else agora)
+        linhas, compras, vendas = np.nonzero((spreads >= minimo) & (spreads < maximo) & alinhados)
+        ordem = np.argsort(-spreads[linhas, compras, vendas])[:limite]
+        return [
+            (self.livro.moedas[l], self._oportunidade(l, c, v, spreads[l, c, v]))
+            for l, c, v in zip(linhas[ordem].tolist(), compras[ordem].tolist(), vendas[ordem].tolist())
+        ]
+
+
+class GrafoArbitragem:
+    """Grafo de conversões entre ativos para achar ciclos de arbitragem com três ou mais pernas.
+
+    O preço de BASE/QUOTE em uma exchange cria as arestas BASE→QUOTE (venda, taxa
+    = preço) e QUOTE→BASE (compra, taxa = 1/preço), com peso -log(taxa × (1 − fee))
+    e o fee de TAXAS_EXCHANGES. Um ciclo de peso total negativo termina com mais
+    do que começou. Com `entre_exchanges` cada ativo é um único nó e cada perna
+    usa a exchange de melhor taxa (como na arbitragem simples, supõe saldo em
+    todas); sem ele os nós são (exchange, ativo) e só há ciclos dentro de uma exchange.
+
+    Só uma aresta cujo peso mudou pode criar um ciclo negativo novo, então cada
+    busca parte apenas dos nós de chegada das arestas tocadas desde a anterior:
+    um Bellman-Ford de várias origens limitado a `comprimento_maximo` rodadas,
+    relaxando a cada rodada só os nós que melhoraram na anterior (SPFA). Os
+    ciclos aparecem na árvore de predecessores. A busca usa pesos reduzidos
+    peso + potencial(origem) - potencial(destino), com o potencial de cada ativo
+    = log do seu valor no primeiro preço visto: o peso de um ciclo não muda, mas
+    as arestas sem distorção ficam perto de zero e as várias origens não se
+    escondem umas às outras. Voltar direto ao nó anterior não
+    é permitido, pois esse ciclo de duas pernas é o que MatrizOportunidades já
+    avalia. Arestas mais velhas que `idade_maxima` são ignoradas e as pernas de
+    um ciclo devem ter sido cotadas com no máximo `desvio_maximo` segundos de diferença.
+    """
+    def __init__(self, taxas, comprimento_maximo=COMPRIMENTO_MAXIMO_CICLO, entre_exchanges=CICLOS_ENTRE_EXCHANGES,
+                 idade_maxima=IDADE_MAXIMA_PRECO, desvio_maximo=DESVIO_MAXIMO_PRECOS):
+        self.taxas = taxas
+        self.comprimento_maximo = comprimento_maximo
+        self.entre_exchanges = entre_exchanges
+        self.idade_maxima = idade_maxima
+        self.desvio_maximo = desvio_maximo
+        self.ativos = []
+        self.potenciais = []
+        self.indice = {}
+        self.arestas = []
+        self.tocados = set()
+        self.trava = threading.Lock()
+
+    def _no(self, exchange, ativo):
+        chave = ativo if self.entre_exchanges else (exchange, ativo)
+        no = self.indice.get(chave)
+        if no is None:
+            no = len(self.ativos)
+            self.ativos.append(ativo)
+            self.potenciais.append(None)
+            self.indice[chave] = no
+            self.arestas.append({})
+        return no
+
+    def _definir(self, origem, destino, aresta):
+        por_exchange = self.arestas[origem].setdefault(destino, {})
+        anterior = por_exchange.get(aresta.exchange)
+        por_exchange[aresta.exchange] = aresta
+        if anterior is None or anterior.peso != aresta.peso:
+            self.tocados.add(destino)
+
+    def atualizar(self, exchange, simbolo, preco, timestamp=None):
+        """Atualiza as arestas do par BASE/QUOTE em uma exchange com o preço cotado em `timestamp` (epoch s)."""
+        base, _, quote = simbolo.split(':')[0].partition('/')
+        if not quote or not preco or preco <= 0:
+            return
+        timestamp = relogio() if timestamp is None else timestamp
+        fee = math.log(1 - self.taxas.get(exchange, 0))
+        no_base = self._no(exchange, base)
+        no_quote = self._no(exchange, quote)
+        if self.potenciais[no_quote] is None:
+            self.potenciais[no_quote] = 0.0 if self.potenciais[no_base] is None else self.potenciais[no_base] - math.log(preco)
+        if self.potenciais[no_base] is None:
+            self.potenciais[no_base] = self.potenciais[no_quote] + math.log(preco)
+        self._definir(no_base, no_quote, Aresta(-math.log(preco) - fee, timestamp, exchange, simbolo, 'venda', preco))
+        self._definir(no_quote, no_base, Aresta(math.log(preco) - fee, timestamp, exchange, simbolo, 'compra', preco))
+
+    def _melhor(self, por_exchange, agora):
+        melhor = None
+        for aresta in por_exchange.values():
+            if agora - aresta.timestamp <= self.idade_maxima and (melhor is None or aresta.peso < melhor.peso):
+                melhor = aresta
+        return melhor
+
+    def ciclos(self, minimo=LUCRO_MINIMO_PERCENTUAL, maximo=LUCRO_MAXIMO_PERCENTUAL, agora=None):
+        """Procura ciclos com lucro em [minimo, maximo) a partir das arestas tocadas, do melhor para o pior."""
+        agora = relogio() if agora is None else agora
+        tocados, self.tocados = self.tocados, set()
+        potenciais = self.potenciais
+        distancias = dict.fromkeys(tocados, 0.0)
+        anteriores = {}
+        fronteira = tocados
+        encontrados = {}
+        for _ in range(self.comprimento_maximo):
+            melhorados = set()
+            for no in fronteira:
+                distancia = distancias[no] + potenciais[no]
+                volta = anteriores[no][0] if no in anteriores else None
+                for vizinho, por_exchange in self.arestas[no].items():
+                    if vizinho == volta or (aresta := self._melhor(por_exchange, agora)) is None:
+                        continue
+                    nova = distancia + aresta.peso - potenciais[vizinho]
+                    if nova < distancias.get(vizinho, math.inf) - 1e-12:
+                        distancias[vizinho] = nova
+                        anteriores[vizinho] = (no, aresta)
+                        melhorados.add(vizinho)
+            for no in melhorados:
+                ciclo = self._ciclo(no, anteriores)
+                if ciclo is not None and minimo <= ciclo.lucro_percentual < maximo:
+                    encontrados.setdefault(ciclo.chave, ciclo)
+            if not melhorados:
+                break
+            fronteira = melhorados
+        return sorted(encontrados.values(), key=lambda ciclo: -ciclo.lucro_percentual)
+
+    def _ciclo(self, no, anteriores):
+        """Segue os predecessores a partir de `no`; retorna o ciclo negativo encontrado, ou None."""
+        vistos = {}
+        caminho = []
+        while no in anteriores and no not in vistos and len(caminho) <= self.comprimento_maximo * 2:
+            vistos[no] = len(caminho)
+            caminho.append(no)
+            no = anteriores[no][0]
+        if no not in vistos:
+            return None
+        nos = caminho[vistos[no]:][::-1]
+        if not 3 <= len(nos) <= self.comprimento_maximo:
+            return None
+        arestas = [anteriores[destino][1] for destino in nos[1:] + nos[:1]]
+        peso = sum(aresta.peso for aresta in arestas)
+        momentos = [aresta.timestamp for aresta in arestas]
+        if peso >= -1e-12 or max(momentos) - min(momentos) > self.desvio_maximo:
+            return None
+        menor = nos.index(min(nos))
+        inicio = next((i for i, n in enumerate(nos) if self.ativos[n] in MOEDAS_BASE_CICLOS), menor)
+        chave = tuple(nos[menor:] + nos[:menor])
+        nos, arestas = nos[inicio:] + nos[:inicio], arestas[inicio:] + arestas[:inicio]
+        passos = [
+            PassoCiclo(aresta.exchange, self.ativos[origem], self.ativos[destino], aresta.lado, aresta.simbolo, aresta.preco)
+            for origem, destino, aresta in zip(nos, nos[1:] + nos[:1], arestas)
+        ]
+        return CicloArbitragem(passos, (math.exp(-peso) - 1) * 100, chave)
+
+
+class LivroOfertas:
+    """Um lado do livro de ofertas com a quantidade e o valor acumulados até cada nível."""
+    def __init__(self, niveis):
+        niveis = np.asarray(niveis, dtype=float).reshape(-1, 2)
+        niveis = niveis[niveis[:, 1] > 0]
+        self.quantidade_acumulada = np.concatenate(([0.0], np.cumsum(niveis[:, 1])))
+        self.valor_acumulado = np.concatenate(([0.0], np.cumsum(niveis[:, 0] * niveis[:, 1])))
+
+    @property
+    def quantidade_total(self):
+        return self.quantidade_acumulada[-1]
+
+    def valor(self, quantidades):
+        """Valor de executar `quantidades` contra o livro (np.interp faz a busca binária nos acumulados)."""
+        return np.interp(quantidades, self.quantidade_acumulada, self.valor_acumulado)
+
+    def quantidade_por_valor(self, valores):
+        """Quantidade obtida gastando `valores` no livro."""
+        return np.interp(valores, self.valor_acumulado, self.quantidade_acumulada)
+
+
+def avaliar_profundidade(asks_compra, bids_venda, taxa_compra, taxa_venda, saldo=SALDO_INICIAL_USD):
+    """Encontra a quantidade que maximiza o lucro líquido comprando nos asks e vendendo nos bids.
+
+    Custo e receita são lineares por partes e o lucro é côncavo, então o máximo
+    está em um ponto de quebra (quantidade acumulada de algum nível de um dos
+    livros). A quantidade alertada é a ótima limitada pelo saldo disponível.
+    Retorna None se nenhuma quantidade dá lucro.
+    """
+    limite = min(asks_compra.quantidade_total, bids_venda.quantidade_total)
+    if limite <= 0:
+        return None
+    candidatas = np.union1d(asks_compra.quantidade_acumulada, bids_venda.quantidade_acumulada)
+    candidatas = np.append(candidatas[candidatas < limite], limite)
+    lucros = bids_venda.valor(candidatas) * (1 - taxa_venda) - asks_compra.valor(candidatas) * (1 + taxa_compra)
+    melhor = int(np.argmax(lucros))
+    if lucros[melhor] <= 0:
+        return None
+    quantidade_maxima = float(candidatas[melhor])
+    quantidade = min(quantidade_maxima, float(asks_compra.quantidade_por_valor(saldo / (1 + taxa_compra))))
+    custo = float(asks_compra.valor(quantidade))
+    receita = float(bids_venda.valor(quantidade))
+    lucro_liquido = receita * (1 - taxa_venda) - custo * (1 + taxa_compra)
+    return AvaliacaoBook(quantidade, custo / quantidade, receita / quantidade, lucro_liquido, quantidade_maxima)
+
+
+def avaliar_oportunidades_book(moeda, oportunidades):
+    """Avalia contra os livros de ofertas os pares que têm livro nas duas pontas.
+
+    Retorna (Oportunidade, AvaliacaoBook) do par de maior lucro executável, ou
+    None se nenhum par com livros é lucrativo.
+    """
+    melhor = None
+    for oportunidade in oportunidades:
+        livro_compra = books_exchanges.get((moeda, oportunidade.compra_exchange))
+        livro_venda = books_exchanges.get((moeda, oportunidade.venda_exchange))
+        if not livro_compra or not livro_venda:
+            continue
+        avaliacao = avaliar_profundidade(
+            livro_compra[0], livro_venda[1],
+            TAXAS_EXCHANGES.get(oportunidade.compra_exchange.upper(), 0),
+            TAXAS_EXCHANGES.get(oportunidade.venda_exchange.upper(), 0)
+        )
+        if avaliacao and (melhor is None or avaliacao.lucro_liquido > melhor[1].lucro_liquido):
+            melhor = (oportunidade, avaliacao)
+    return melhor
 
 
 def log_info(message):
@@ -184,8 +1190,118 @@ def log_error(message):
     logging.error(message)
 
 
+def log_debug(message):
+    """Centraliza logs de depuração (por tick, desligados no nível INFO)."""
+    logging.debug(message)
+
+
+class NotificadorTelegram:
+    """Fila de mensagens ao Telegram drenada por uma thread própria.
+
+    O processamento de preços só enfileira; a thread envia usando uma sessão
+    HTTP reaproveitada, respeitando o intervalo mínimo entre mensagens do chat
+    e o `retry_after` das respostas 429. Alertas de uma moeda que ainda está na
+    fila são agrupados em uma única mensagem com o estado mais recente. Se mais
+    de `capacidade` moedas aguardam envio, a mais antiga é descartada.
+    """
+    def __init__(self, api_url, token, chat_id, intervalo_minimo=INTERVALO_MINIMO_TELEGRAM,
+                 capacidade=TAMANHO_FILA_TELEGRAM, timeout=TIMEOUT_TELEGRAM, tentativas=TENTATIVAS_TELEGRAM):
+        self.url = f"{api_url}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.intervalo_minimo = intervalo_minimo
+        self.capacidade = capacidade
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.sessao = requests.Session()
+        self.pendentes = OrderedDict()
+        self.condicao = threading.Condition()
+        self.enviando = False
+        self.thread = None
+        self.ultimo_envio = 0.0
+        self.enviadas = 0
+        self.agrupadas = 0
+        self.descartadas = 0
+
+    def enfileirar(self, moeda, texto):
+        """Coloca a mensagem da moeda na fila, substituindo a que ainda não foi enviada."""
+        with self.condicao:
+            if moeda in self.pendentes:
+                self.pendentes[moeda][0] = texto
+                self.pendentes[moeda][1] += 1
+                self.agrupadas += 1
+            else:
+                if len(self.pendentes) >= self.capacidade:
+                    descartada, _ = self.pendentes.popitem(last=False)
+                    self.descartadas += 1
+                    log_warning(f"Fila do Telegram cheia, alerta de {descartada} descartado.")
+                self.pendentes[moeda] = [texto, 0]
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._drenar, daemon=True)
+                self.thread.start()
+            self.condicao.notify_all()
+
+    def aguardar(self, timeout=None):
+        """Espera a fila esvaziar. Retorna False se o tempo acabou antes."""
+        with self.condicao:
+            return self.condicao.wait_for(lambda: not self.pendentes and not self.enviando, timeout)
+
+    def _drenar(self):
+        while True:
+            with self.condicao:
+                self.condicao.wait_for(lambda: self.pendentes)
+                moeda, (texto, agrupados) = self.pendentes.popitem(last=False)
+                self.enviando = True
+            if agrupados:
+                texto += f"\n\n_({agrupados} alerta(s) anterior(es) de {moeda} agrupado(s) nesta mensagem)_"
+            self._enviar(texto)
+            with self.condicao:
+                self.enviando = False
+                self.condicao.notify_all()
+
+    def _enviar(self, texto):
+        payload = {
+            "chat_id": self.chat_id,
+            "text": texto,
+            "parse_mode": "Markdown",
+            "disable_web_page_preview": False
+        }
+        tentativa = 0
+        while tentativa < self.tentativas:
+            espera = self.intervalo_minimo - (time.monotonic() - self.ultimo_envio)
+            if espera > 0:
+                time.sleep(espera)
+            self.ultimo_envio = time.monotonic()
+            try:
+                with METRICA_TELEGRAM.cronometrar():
+                    response = self.sessao.post(self.url, json=payload, timeout=self.timeout)
+                METRICA_TELEGRAM_RESULTADOS.incrementar(str(response.status_code))
+                if response.status_code == 429:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                    log_warning(f"Limite do Telegram atingido, aguardando {retry_after}s.")
+                    time.sleep(retry_after)
+                    continue
+                response.raise_for_status()
+                self.enviadas += 1
+                return True
+            except requests.exceptions.HTTPError as e:
+                if response.status_code < 500:
+                    log_error(f"Erro ao enviar mensagem: {e}")
+                    return False
+                tentativa += 1
+                log_error(f"Erro ao enviar mensagem (tentativa {tentativa}/{self.tentativas}): {e}")
+            except requests.exceptions.RequestException as e:
+                METRICA_TELEGRAM_RESULTADOS.incrementar(type(e).__name__)
+                tentativa += 1
+                log_error(f"Erro ao enviar mensagem (tentativa {tentativa}/{self.tentativas}): {e}")
+            time.sleep(min(30, 2 ** tentativa))
+        return False
+
+
+notificador = NotificadorTelegram(TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+
+
 def enviar_mensagem_telegram(mensagem, moeda, melhor_compra, melhor_venda):
-    """Envia uma mensagem ao Telegram com links das moedas nas exchanges."""
+    """Enfileira uma mensagem ao Telegram com links das moedas nas exchanges."""
     # Obter os links das moedas nas exchanges
     link_compra = LINKS_EXCHANGES.get(melhor_compra.upper(), "").format(moeda=moeda.split("/")[0])
     link_venda = LINKS_EXCHANGES.get(melhor_venda.upper(), "").format(moeda=moeda.split("/")[0])
@@ -197,18 +1313,7 @@ def enviar_mensagem_telegram(mensagem, moeda, melhor_compra, melhor_venda):
         f"🔗 [Vender na {melhor_venda}]({link_venda})"
     )
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": mensagem_com_links,
-        "parse_mode": "Markdown",
-        "disable_web_page_preview": False
-    }
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        log_error(f"Erro ao enviar mensagem: {e}")
+    notificador.enfileirar(moeda, mensagem_com_links)
 
 
 def calcular_lucro_liquido(quantidade, preco_compra, preco_venda, taxa_compra, taxa_venda):
@@ -218,56 +1323,55 @@ def calcular_lucro_liquido(quantidade, preco_compra, preco_venda, taxa_compra, t
     return receita_total - custo_total
 
 
-def realizar_arbitragem(db_manager, moeda, precos):
-    """Verifica a melhor arbitragem e usa banco de dados para filtrar mensagens repetidas."""
-    log_info(f"Analisando arbitragem para {moeda}...")
-    if not precos:
-        log_warning(f"Nenhum preço disponível para {moeda}.")
-        return
+def realizar_arbitragem(db_manager, moeda, oportunidades):
+    """Alerta a melhor oportunidade da moeda e usa banco de dados para filtrar mensagens repetidas.
 
-    try:
-        melhor_compra = min(precos, key=precos.get)
-        melhor_venda = max(precos, key=precos.get)
-    except ValueError as e:
-        log_error(f"Erro ao determinar melhor compra/venda: {e}")
+    `oportunidades` vem de MatrizOportunidades.oportunidades: todos os pares
+    (compra no ask, venda no bid) com spread líquido acima de LUCRO_MINIMO_PERCENTUAL
+    e liquidez acima de VOLUME_MINIMO_24H, do melhor para o pior.
+    """
+    log_debug(f"Analisando arbitragem para {moeda}...")
+    if not oportunidades:
+        log_debug(f"Sem arbitragem viável para {moeda} acima de {LUCRO_MINIMO_PERCENTUAL}%")
         return
 
-    preco_compra = precos[melhor_compra]
-    preco_venda = precos[melhor_venda]
-
-    if preco_compra >= preco_venda:
-        log_info(f"Sem arbitragem viável para {moeda}")
-        return
+    avaliacao = None
+    melhor = oportunidades[0]
+    if (moeda, melhor.compra_exchange) in books_exchanges and (moeda, melhor.venda_exchange) in books_exchanges:
+        escolhida = avaliar_oportunidades_book(moeda, oportunidades)
+        if escolhida is None:
+            METRICA_SUPRIMIDOS.incrementar('simples')
+            log_debug(f"Oportunidade para {moeda} não é executável com a profundidade atual dos livros, ignorando.")
+            return
+        melhor, avaliacao = escolhida
 
-    taxa_compra = TAXAS_EXCHANGES.get(melhor_compra.upper(), 0)
-    taxa_venda = TAXAS_EXCHANGES.get(melhor_venda.upper(), 0)
-    quantidade = SALDO_INICIAL_USD / preco_compra
-    lucro_liquido = calcular_lucro_liquido(quantidade, preco_compra, preco_venda, taxa_compra, taxa_venda)
+    melhor_compra, melhor_venda, preco_compra, preco_venda = melhor[:4]
+    if avaliacao:
+        quantidade = avaliacao.quantidade
+        lucro_liquido = avaliacao.lucro_liquido
+    else:
+        taxa_compra = TAXAS_EXCHANGES.get(melhor_compra.upper(), 0)
+        taxa_venda = TAXAS_EXCHANGES.get(melhor_venda.upper(), 0)
+        # Sem livro de ofertas, só a quantidade no topo (ask da compra, bid da venda) sai a esses preços
+        quantidade = min([SALDO_INICIAL_USD / preco_compra,
+                          *(q for q in (melhor.quantidade_compra, melhor.quantidade_venda) if q > 0)])
+        lucro_liquido = calcular_lucro_liquido(quantidade, preco_compra, preco_venda, taxa_compra, taxa_venda)
     diferenca_percentual = float(((preco_venda - preco_compra) / preco_compra) * 100)
 
-    if diferenca_percentual < float(LUCRO_MINIMO_PERCENTUAL) or diferenca_percentual >= float(LUCRO_MAXIMO_PERCENTUAL):
-        log_info(f"Oportunidade para {moeda} com lucro de {diferenca_percentual:.2f}% é menor que {LUCRO_MINIMO_PERCENTUAL}%, ignorando.")
+    motivo = cache_oportunidades.motivo_supressao(moeda, melhor_compra, melhor_venda, preco_compra, preco_venda, lucro_liquido)
+    if motivo:
+        METRICA_SUPRIMIDOS.incrementar('simples')
+        log_debug(f"Oportunidade para {moeda} ({melhor_compra} → {melhor_venda}) {motivo}, ignorando.")
         return
 
-    ultima_oportunidade = db_manager.obter_ultima_oportunidade(moeda)
-    if ultima_oportunidade:
-        _, _, _, ultima_compra, ultima_venda, ultimo_lucro, _ = ultima_oportunidade
-        if (abs(preco_compra - ultima_compra) / ultima_compra < MUDANCA_MINIMA_PERCENTUAL and
-            abs(preco_venda - ultima_venda) / ultima_venda < MUDANCA_MINIMA_PERCENTUAL and
-            abs(lucro_liquido - ultimo_lucro) < MUDANCA_MINIMA_LUCRO):
-            log_info(f"Oportunidade para {moeda} não mudou significativamente, ignorando.")
-            return
-
-    data_hora_atual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')[:-3]  # Formato: YYYY-MM-DD HH:MM:SS.sss
+    # Minuto atual: a mesma oportunidade é registrada no máximo uma vez por minuto
+    agora = datetime.now().replace(second=0, microsecond=0)
+    data_hora_atual = agora.strftime('%Y-%m-%d %H:%M')
     parametros = (
         moeda, melhor_compra, melhor_venda, preco_compra, preco_venda,
-        diferenca_percentual, quantidade, lucro_liquido, data_hora_atual
+        diferenca_percentual, quantidade, lucro_liquido, agora.timestamp()
     )
 
-    if db_manager.verificar_mensagem_enviada(parametros):
-        log_info(f"Mensagem para {moeda} já foi enviada anteriormente, ignorando.")
-        return
-
     mensagem = (
         f"🚀 *Oportunidade de Arbitragem!* 🚀\n\n"
         f"*Moeda:* `{moeda}`\n"
@@ -278,25 +1382,392 @@ def realizar_arbitragem(db_manager, moeda, precos):
         f"💸 *Lucro Líquido:* `${lucro_liquido:.2f}`\n"
         f"📅 *Data/Hora:* `{data_hora_atual}`"
     )
+    if avaliacao:
+        mensagem += (
+            f"\n\n📚 *VWAP Compra/Venda:* `${avaliacao.vwap_compra:.6f}` / `${avaliacao.vwap_venda:.6f}`\n"
+            f"📏 *Tamanho Máximo Lucrativo:* `{avaliacao.quantidade_maxima:.6f}`"
+        )
+    outras = [o for o in oportunidades if o is not melhor][:3]
+    if outras:
+        mensagem += "\n\n🔀 *Outras rotas:*\n" + "\n".join(
+            f"`{o.compra_exchange} → {o.venda_exchange}: {o.spread_liquido:.2f}%`" for o in outras
+        )
 
     log_info(f"Enviando nova oportunidade para {moeda}")
+    METRICA_ALERTAS.incrementar('simples')
     enviar_mensagem_telegram(mensagem, moeda, melhor_compra, melhor_venda)
     db_manager.registrar_mensagem_enviada(parametros)
-    db_manager.salvar_oportunidade(moeda, melhor_compra, melhor_venda, preco_compra, preco_venda, lucro_liquido)
+    cache_oportunidades.registrar(moeda, melhor_compra, melhor_venda, preco_compra, preco_venda, lucro_liquido)
+
+
+def descrever_passo(passo):
+    """Texto de um passo de ciclo para o alerta do Telegram."""
+    if passo.lado == 'compra':
+        return f"Comprar {passo.ativo_para} ({passo.simbolo}) na {passo.exchange} a {passo.preco:.8g}"
+    return f"Vender {passo.ativo_de} ({passo.simbolo}) na {passo.exchange} a {passo.preco:.8g}"
+
+
+def realizar_arbitragem_ciclo(ciclo):
+    """Alerta um ciclo de arbitragem, filtrando repetições pelo cache_ciclos (em memória, fora do banco).
+
+    A rota faz o papel da moeda no cache, as exchanges da primeira e da última
+    perna os de compra e venda, e os "preços" são o saldo inicial e o final.
+    """
+    rota = " → ".join([passo.ativo_de for passo in ciclo.passos] + [ciclo.passos[0].ativo_de])
+    inicio, fim = ciclo.passos[0].exchange, ciclo.passos[-1].exchange
+    saldo_final = SALDO_INICIAL_USD * (1 + ciclo.lucro_percentual / 100)
+    lucro_liquido = saldo_final - SALDO_INICIAL_USD
+
+    motivo = cache_ciclos.motivo_supressao(rota, inicio, fim, SALDO_INICIAL_USD, saldo_final, lucro_liquido)
+    if motivo:
+        METRICA_SUPRIMIDOS.incrementar('ciclo')
+        log_debug(f"Ciclo {rota} ({inicio}) {motivo}, ignorando.")
+        return
+
+    data_hora_atual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    mensagem = (
+        f"🔺 *Ciclo de Arbitragem!* 🔺\n\n"
+        f"*Rota:* `{rota}`\n"
+        + "\n".join(f"{i}. `{descrever_passo(passo)}`" for i, passo in enumerate(ciclo.passos, 1))
+        + f"\n\n📊 *Lucro do Ciclo:* `{ciclo.lucro_percentual:.2f}%`\n"
+        f"💸 *Lucro Líquido:* `${lucro_liquido:.2f}` (com `${SALDO_INICIAL_USD:.2f}`)\n"
+        f"📅 *Data/Hora:* `{data_hora_atual}`"
+    )
+    log_info(f"Enviando novo ciclo {rota} ({ciclo.lucro_percentual:.2f}%)")
+    METRICA_ALERTAS.incrementar('ciclo')
+    notificador.enfileirar(f"ciclo {rota}", mensagem)
+    cache_ciclos.registrar(rota, inicio, fim, SALDO_INICIAL_USD, saldo_final, lucro_liquido)
+
+
+class HistogramaLatencia:
+    """Contagem de latências em faixas fixas de FAIXAS_LATENCIA_MS, com percentis aproximados pela faixa."""
+    def __init__(self, faixas=FAIXAS_LATENCIA_MS):
+        self.faixas = tuple(faixas)
+        self.contagens = [0] * (len(self.faixas) + 1)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, latencia_ms):
+        self.contagens[bisect.bisect_left(self.faixas, latencia_ms)] += 1
+        self.total += 1
+        self.soma += latencia_ms
+        self.maximo = max(self.maximo, latencia_ms)
+
+    def percentil(self, p):
+        """Limite superior da faixa que contém o percentil p (0 a 100); o máximo observado na última faixa."""
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for faixa, contagem in zip(self.faixas, self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return float(faixa)
+        return self.maximo
+
+
+class MonitorFeeds:
+    """Latência do feed de cada exchange: momento do recebimento menos o timestamp informado pela exchange."""
+    def __init__(self):
+        self.histogramas = {}
+        self.trava = threading.Lock()
+
+    def registrar(self, exchange, timestamp, recebido_em):
+        latencia_ms = max(0.0, (recebido_em - timestamp) * 1000)
+        METRICA_LATENCIA_FEED.observar(latencia_ms / 1000, exchange)
+        with self.trava:
+            if exchange not in self.histogramas:
+                self.histogramas[exchange] = HistogramaLatencia()
+            self.histogramas[exchange].registrar(latencia_ms)
+
+    def resumo(self):
+        """Por exchange: ticks, latência média, p50, p90, p99 e máxima (ms) e as contagens de cada faixa."""
+        with self.trava:
+            return {
+                exchange: {
+                    'ticks': h.total,
+                    'media_ms': h.soma / (h.total or 1),
+                    'p50_ms': h.percentil(50),
+                    'p90_ms': h.percentil(90),
+                    'p99_ms': h.percentil(99),
+                    'maximo_ms': h.maximo,
+                    'faixas': dict(zip([*h.faixas, float('inf')], h.contagens)),
+                }
+                for exchange, h in self.histogramas.items()
+            }
+
+    def registrar_log(self):
+        for exchange, r in sorted(self.resumo().items()):
+            log_info(
+                f"Feed {exchange}: {r['ticks']} ticks, latência média {r['media_ms']:.0f} ms, "
+                f"p50 ≤{r['p50_ms']:.0f} ms, p90 ≤{r['p90_ms']:.0f} ms, p99 ≤{r['p99_ms']:.0f} ms, máx. {r['maximo_ms']:.0f} ms"
+            )
+
+
+monitor_feeds = MonitorFeeds()
+
+
+class PipelineAvaliacao:
+    """Avalia as moedas fora da thread do Socket.IO, sempre com os preços mais recentes.
+
+    O callback só atualiza os preços e marca a moeda como pendente; `workers`
+    threads avaliam cada moeda pendente uma única vez. Eventos que chegam para
+    uma moeda já pendente são agrupados, e os ticks intermediários nunca são
+    avaliados. Uma moeda nunca é avaliada por duas threads ao mesmo tempo.
+    """
+    def __init__(self, avaliar, workers=WORKERS_AVALIACAO, nome="Avaliação"):
+        self.avaliar = avaliar
+        self.nome = nome
+        self.workers = workers
+        self.pendentes = OrderedDict()
+        self.em_avaliacao = set()
+        self.condicao = threading.Condition()
+        self.threads = []
+        self.eventos = 0
+        self.agrupados = 0
+        self.avaliacoes = 0
+        self.atraso_total = 0.0
+        self.atraso_maximo = 0.0
+        self.tempo_avaliacao_total = 0.0
+        self.tempo_avaliacao_maximo = 0.0
+
+    def marcar(self, moeda):
+        """Marca a moeda para avaliação com os preços que estiverem valendo quando ela for avaliada."""
+        with self.condicao:
+            self.eventos += 1
+            if moeda in self.pendentes:
+                self.agrupados += 1
+                return
+            self.pendentes[moeda] = time.perf_counter()
+            if not self.threads:
+                self._iniciar()
+            self.condicao.notify()
+
+    def _iniciar(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._trabalhar, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        threading.Thread(target=self._registrar_estatisticas, daemon=True).start()
+
+    def _proxima(self):
+        for moeda in self.pendentes:
+            if moeda not in self.em_avaliacao:
+                return moeda
+        return None
+
+    def _trabalhar(self):
+        while True:
+            with self.condicao:
+                self.condicao.wait_for(lambda: self._proxima() is not None)
+                moeda = self._proxima()
+                marcada_em = self.pendentes.pop(moeda)
+                self.em_avaliacao.add(moeda)
+            inicio = time.perf_counter()
+            try:
+                self.avaliar(moeda)
+            except Exception as e:
+                log_error(f"Erro ao avaliar {moeda}: {e}")
+            fim = time.perf_counter()
+            METRICA_ATRASO_FILA.observar(inicio - marcada_em, self.nome)
+            METRICA_AVALIACAO.observar(fim - inicio, self.nome)
+            with self.condicao:
+                self.em_avaliacao.discard(moeda)
+                self.avaliacoes += 1
+                self.atraso_total += inicio - marcada_em
+                self.atraso_maximo = max(self.atraso_maximo, inicio - marcada_em)
+                self.tempo_avaliacao_total += fim - inicio
+                self.tempo_avaliacao_maximo = max(self.tempo_avaliacao_maximo, fim - inicio)
+                self.condicao.notify_all()
+
+    def estatisticas(self):
+        """Eventos recebidos e agrupados, tamanho da fila, atraso na fila e tempo de avaliação (ms)."""
+        with self.condicao:
+            avaliacoes = self.avaliacoes or 1
+            return {
+                'eventos': self.eventos,
+                'agrupados': self.agrupados,
+                'avaliacoes': self.avaliacoes,
+                'fila': len(self.pendentes),
+                'atraso_medio_ms': self.atraso_total / avaliacoes * 1000,
+                'atraso_maximo_ms': self.atraso_maximo * 1000,
+                'avaliacao_media_ms': self.tempo_avaliacao_total / avaliacoes * 1000,
+                'avaliacao_maxima_ms': self.tempo_avaliacao_maximo * 1000,
+            }
+
+    def _registrar_estatisticas(self):
+        while True:
+            time.sleep(INTERVALO_ESTATISTICAS)
+            e = self.estatisticas()
+            log_info(
+                f"{self.nome}: {e['eventos']} eventos, {e['agrupados']} agrupados, {e['avaliacoes']} avaliações, "
+                f"fila {e['fila']}, atraso médio {e['atraso_medio_ms']:.1f} ms (máx. {e['atraso_maximo_ms']:.1f} ms), "
+                f"avaliação média {e['avaliacao_media_ms']:.2f} ms (máx. {e['avaliacao_maxima_ms']:.2f} ms)"
+            )
+
+
+def atualizar_preco(exchange, moeda, preco, timestamp=None, topo=None):
+    """Atualiza o preço de uma moeda em uma exchange, cotado em `timestamp` (epoch s), e a marca para avaliação."""
+    registrar_preco(exchange, moeda, preco, timestamp, topo)
+    pipeline.marcar(moeda)
+    pipeline_ciclos.marcar('ciclos')
+
+
+def registrar_preco(exchange, moeda, preco, timestamp=None, topo=None):
+    """Guarda o preço e o topo do ticker no livro de preços da matriz e no grafo, sem disparar avaliações.
+
+    `topo` é [bid, ask, quantidade no bid, quantidade no ask, volume 24h], ou None
+    se a exchange não informa bid e ask.
+    """
+    recebido_em = relogio()
+    timestamp = timestamp or recebido_em
+    METRICA_TICKS.incrementar(exchange)
+    monitor_feeds.registrar(exchange, timestamp, recebido_em)
+    with trava_precos:
+        matriz.atualizar(moeda, exchange, preco, timestamp, topo, recebido_em)
+    with grafo.trava:
+        grafo.atualizar(exchange, moeda, preco, timestamp)
+
+
+def expirar_precos():
+    """Remove do livro de preços, e dos livros de ofertas, os que passaram de IDADE_MAXIMA_PRECO."""
+    with trava_precos:
+        expirados = matriz.expirar()
+    limite = relogio() - matriz.idade_maxima
+    books_expirados = 0
+    for chave, book in list(books_exchanges.items()):
+        # Um livro novo da mesma moeda e exchange pode ter chegado desde a cópia
+        if book[2] < limite and books_exchanges.get(chave) is book:
+            del books_exchanges[chave]
+            books_expirados += 1
+    if books_expirados:
+        log_warning(f"{books_expirados} livros de ofertas expirados sem atualização")
+    if expirados:
+        por_exchange = {}
+        for _, exchange in expirados:
+            por_exchange[exchange] = por_exchange.get(exchange, 0) + 1
+        log_warning("Preços expirados sem atualização: " + ", ".join(f"{e} {n}" for e, n in sorted(por_exchange.items())))
+
+
+def restaurar_precos(caminho):
+    """Recarrega o livro de preços gravado na execução anterior na matriz e repõe os preços no grafo; os velhos expiram."""
+    if not os.path.exists(caminho):
+        return
+    try:
+        restaurado = LivroPrecos.carregar(caminho)
+    except (OSError, ValueError, KeyError) as e:
+        log_warning(f"Não foi possível ler os preços salvos em {caminho}: {e}")
+        return
+    with trava_precos:
+        matriz.trocar_livro(restaurado)
+        with grafo.trava:
+            for moeda, exchange, preco, timestamp, _, _ in restaurado.itens():
+                grafo.atualizar(exchange, moeda, preco, timestamp)
+    expirar_precos()
+    log_info(f"{sum(map(restaurado.quantidade, restaurado.moedas))} preços restaurados de {caminho}")
+
+
+def manter_precos():
+    """Expira os preços velhos a cada INTERVALO_EXPIRACAO e registra a latência dos feeds a cada INTERVALO_ESTATISTICAS."""
+    proximo_log = time.monotonic() + INTERVALO_ESTATISTICAS
+    while True:
+        time.sleep(INTERVALO_EXPIRACAO)
+        expirar_precos()
+        if time.monotonic() >= proximo_log:
+            monitor_feeds.registrar_log()
+            proximo_log += INTERVALO_ESTATISTICAS
+
+
+def verificar_moeda(moeda):
+    """Verifica oportunidades de arbitragem para a moeda, se houver preços de ao menos duas exchanges.
+
+    Se nem o spread bruto entre o maior e o menor preço chega ao lucro mínimo,
+    a matriz não é consultada.
+    """
+    with trava_precos:
+        spread = matriz.livro.spread_bruto(moeda)
+        if spread is None:
+            return
+        recebido_em = matriz.livro.recebido_em(moeda)
+        oportunidades = []
+        if spread >= LUCRO_MINIMO_PERCENTUAL:
+            oportunidades = matriz.oportunidades(moeda, LUCRO_MINIMO_PERCENTUAL, LUCRO_MAXIMO_PERCENTUAL)
+    realizar_arbitragem(db_manager, moeda, oportunidades)
+    METRICA_DECISAO.observar(relogio() - recebido_em)
+
+
+def verificar_ciclos(_):
+    """Procura ciclos de arbitragem passando pelas arestas do grafo alteradas desde a última busca."""
+    with grafo.trava:
+        ciclos = grafo.ciclos(LUCRO_MINIMO_PERCENTUAL, LUCRO_MAXIMO_PERCENTUAL)
+    for ciclo in ciclos:
+        realizar_arbitragem_ciclo(ciclo)
+
+
+pipeline = PipelineAvaliacao(verificar_moeda)
+
+# Uma única chave: eventos que chegam durante uma busca são todos atendidos pela próxima
+pipeline_ciclos = PipelineAvaliacao(verificar_ciclos, workers=1, nome="Busca de ciclos")
+
+metricas.registro.medidor(
+    'robo_fila_avaliacao', "Chaves aguardando avaliação em cada pipeline", ('pipeline',),
+    funcao=lambda: {(p.nome,): len(p.pendentes) for p in (pipeline, pipeline_ciclos)})
+metricas.registro.medidor(
+    'robo_fila_telegram', "Alertas aguardando envio ao Telegram", funcao=lambda: len(notificador.pendentes))
+
+
+def timestamp_evento(dados):
+    """Timestamp da exchange (epoch s) de um preco_atualizado: 'ts' em epoch ms ou, em webhooks antigos, 'timestamp' ISO."""
+    if dados.get('ts'):
+        return dados['ts'] / 1000
+    if dados.get('timestamp'):
+        try:
+            return datetime.fromisoformat(dados['timestamp']).timestamp()
+        except ValueError:
+            pass
+    return None
 
 
 @sio.on('preco_atualizado')
 def processar_arbitragem_evento(dados):
-    """Atualiza os preços e verifica oportunidades de arbitragem."""
-    global precos_exchanges
-    exchange = dados['exchange']
-    moeda = dados['moeda']
-    preco = dados['preco']
-    if moeda not in precos_exchanges:
-        precos_exchanges[moeda] = {}
-    precos_exchanges[moeda][exchange] = preco
-    if len(precos_exchanges[moeda]) >= 2:
-        realizar_arbitragem(db_manager, moeda, precos_exchanges[moeda])
+    """Atualiza os preços; a verificação de oportunidades fica com o pipeline de avaliação."""
+    atualizar_preco(dados['exchange'], dados['moeda'], dados['preco'], timestamp_evento(dados), dados.get('topo'))
+
+
+@sio.on('book_atualizado')
+def processar_book_evento(dados):
+    """Guarda os acumulados do livro de ofertas usados para dimensionar as oportunidades da moeda."""
+    books_exchanges[(dados['moeda'], dados['exchange'])] = (LivroOfertas(dados['asks']), LivroOfertas(dados['bids']), relogio())
+
+
+@sio.on('books_atualizados')
+def processar_lote_books_evento(dados):
+    """Processa um lote de livros de ofertas ({"t": epoch_ms, "b": [[exchange, moeda, bids, asks], ...]}), em JSON ou msgpack."""
+    if isinstance(dados, (bytes, bytearray)):
+        if msgpack is None:
+            log_error("Lote de livros de ofertas em msgpack recebido, mas o pacote msgpack não está instalado.")
+            return
+        dados = msgpack.unpackb(dados)
+    recebido_em = relogio()
+    for exchange, moeda, bids, asks in dados['b']:
+        books_exchanges[(moeda, exchange)] = (LivroOfertas(asks), LivroOfertas(bids), recebido_em)
+
+
+@sio.on('precos_atualizados')
+def processar_lote_evento(dados):
+    """Processa um lote de mudanças de preço ({"t": epoch_ms, "p": [[exchange, moeda, preco, ts, *topo], ...]}).
+
+    O lote pode vir em JSON ou msgpack. Sem o `ts` da exchange (webhooks antigos),
+    vale o `t` do lote; sem os cinco campos do topo, vale o último preço.
+    Cada moeda alterada é verificada uma única vez.
+    """
+    if isinstance(dados, (bytes, bytearray)):
+        if msgpack is None:
+            log_error("Lote de preços em msgpack recebido, mas o pacote msgpack não está instalado.")
+            return
+        dados = msgpack.unpackb(dados)
+    for exchange, moeda, preco, *extra in dados['p']:
+        timestamp = extra[0] if extra and extra[0] else dados['t']
+        atualizar_preco(exchange, moeda, preco, timestamp / 1000, extra[1:6] if len(extra) >= 6 else None)
 
 
 def conectar_websocket():
@@ -321,5 +1792,19 @@ if __name__ == "__main__":
     db_manager = DatabaseManager(DB_PATH)
     db_manager.inicializar_tabelas()
     db_manager.limpar_mensagens_antigas()  # Limpa mensagens antigas ao iniciar
-    precos_exchanges = {}
-    conectar_websocket()
\ No newline at end of file
+    db_manager.iniciar_manutencao()
+    cache_oportunidades = CacheOportunidades(db_manager)
+    cache_oportunidades.aquecer()
+    cache_ciclos = CacheOportunidades(None)
+    matriz = MatrizOportunidades(TAXAS_EXCHANGES)
+    grafo = GrafoArbitragem(TAXAS_EXCHANGES)
+    if ARQUIVO_PRECOS:
+        restaurar_precos(ARQUIVO_PRECOS)
+        atexit.register(lambda: matriz.livro.salvar(ARQUIVO_PRECOS))
+    threading.Thread(target=manter_precos, daemon=True).start()
+    if PORTA_METRICAS:
+        metricas.servir(PORTA_METRICAS)
+        log_info(f"Métricas em http://localhost:{PORTA_METRICAS}/metrics")
+    conectar_websocket()
+    notificador.aguardar(timeout=30)
+    db_manager.fechar()
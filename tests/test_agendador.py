@@ -0,0 +1,41 @@
+import time
+from types import SimpleNamespace
+
+import ccxt
+import pytest
+
+import webhook
+
+
+def criar_agendador():
+    agendador = webhook.AgendadorRequisicoes({'binance': SimpleNamespace(rateLimit=1, enableRateLimit=True)}, max_workers=2)
+    circuito = agendador.circuitos['binance']
+    circuito.limite_falhas, circuito.tempo_aberto = 1, 0.05
+    return agendador, circuito
+
+
+def abrir_circuito(agendador, circuito):
+    def falhar():
+        raise ccxt.NetworkError("fora do ar")
+    with pytest.raises(ccxt.NetworkError):
+        agendador.agendar('binance', 'falha', falhar).result(timeout=5)
+    assert circuito.falhas >= circuito.limite_falhas
+    time.sleep(circuito.tempo_aberto)
+
+
+@pytest.mark.parametrize('erro, fecha', [(ccxt.BadRequest, True), (ValueError, False)])
+def test_chamada_de_teste_com_erro_nao_deixa_o_circuito_preso(monkeypatch, erro, fecha):
+    monkeypatch.setattr(webhook, 'MAX_TENTATIVAS', 1)
+    agendador, circuito = criar_agendador()
+    abrir_circuito(agendador, circuito)
+
+    def recusar():
+        raise erro("teste")
+    with pytest.raises(erro):
+        agendador.agendar('binance', 'teste', recusar).result(timeout=5)
+    assert not circuito.em_teste
+    assert (circuito.falhas == 0) == fecha
+
+    time.sleep(circuito.tempo_aberto)
+    assert agendador.agendar('binance', 'depois', lambda: 'ok').result(timeout=5) == 'ok'
+    assert circuito.falhas == 0
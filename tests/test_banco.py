@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+import robo_telegram
+
+ESQUEMA_V1 = '''
+CREATE TABLE mensagens_enviadas (
+    moeda TEXT,
+    compra_exchange TEXT,
+    venda_exchange TEXT,
+    preco_compra TEXT,
+    preco_venda TEXT,
+    diferenca_percentual TEXT,
+    quantidade TEXT,
+    lucro_liquido TEXT,
+    data_hora TEXT,
+    UNIQUE(moeda, compra_exchange, venda_exchange, preco_compra, preco_venda, diferenca_percentual, quantidade, lucro_liquido, data_hora)
+)
+'''
+
+
+@pytest.fixture
+def banco_v1(tmp_path):
+    caminho = str(tmp_path / "arbitragem.db")
+    with sqlite3.connect(caminho) as conexao:
+        conexao.execute(ESQUEMA_V1)
+        conexao.executemany("INSERT INTO mensagens_enviadas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (f"M{i}/USDT", "KRAKEN", "GATE", "1.0", "1.02", "2.0", "10", "0.2", f"2026-10-{1 + i // 1440:02d} {i // 60 % 24:02d}:{i % 60:02d}")
+            for i in range(5000)
+        ])
+    conexao.close()
+    return caminho
+
+
+def estado(caminho):
+    with sqlite3.connect(caminho) as conexao:
+        tabelas = {nome for nome, in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+        tipo = conexao.execute("SELECT type FROM pragma_table_info('mensagens_enviadas') WHERE name = 'data_hora'").fetchone()
+        linhas = conexao.execute("SELECT COUNT(*) FROM mensagens_enviadas").fetchone()[0]
+    conexao.close()
+    return tabelas, versao, tipo[0], linhas
+
+
+def test_migracao_interrompida_nao_altera_o_banco(banco_v1):
+    banco = robo_telegram.DatabaseManager(banco_v1)
+    # Aborta a migração no meio da cópia, como um processo encerrado durante o INSERT ... SELECT
+    banco.conectar().set_progress_handler(lambda: 1, 50000)
+    with pytest.raises(sqlite3.OperationalError):
+        banco.inicializar_tabelas()
+    banco.conexao.close()
+
+    tabelas, versao, tipo, linhas = estado(banco_v1)
+    assert 'mensagens_enviadas_v1' not in tabelas
+    assert (versao, tipo, linhas) == (0, 'TEXT', 5000)
+
+    banco = robo_telegram.DatabaseManager(banco_v1)
+    banco.inicializar_tabelas()
+    banco.fechar()
+    assert estado(banco_v1)[1:] == (2, 'REAL', 5000)
+
+
+def test_migracao_retoma_a_tabela_v1_deixada_pela_versao_anterior(banco_v1):
+    # Estado deixado pela migração antiga, que confirmava cada DDL antes da cópia
+    with sqlite3.connect(banco_v1) as conexao:
+        conexao.execute("ALTER TABLE mensagens_enviadas RENAME TO mensagens_enviadas_v1")
+        conexao.execute(robo_telegram.DatabaseManager.SQL_MENSAGENS.format(''))
+    conexao.close()
+
+    banco = robo_telegram.DatabaseManager(banco_v1)
+    banco.inicializar_tabelas()
+    banco.fechar()
+
+    tabelas, versao, tipo, linhas = estado(banco_v1)
+    assert 'mensagens_enviadas_v1' not in tabelas
+    assert (versao, tipo, linhas) == (2, 'REAL', 5000)
+
+
+def test_resumo_conta_todas_as_mensagens_enviadas(tmp_path):
+    banco = robo_telegram.DatabaseManager(str(tmp_path / "arbitragem.db"))
+    banco.inicializar_tabelas()
+    # Dois alertas do mesmo par no mesmo minuto: a tabela guarda um, o resumo conta os dois
+    for spread in (2.0, 3.0):
+        banco.registrar_mensagem_enviada(("A/USDT", "KRAKEN", "GATE", 1.0, 1.0 + spread / 100, spread, 10.0, spread / 10, 1800000060.0))
+    banco.descarregar(esperar=True)
+
+    conexao = banco.conectar()
+    assert conexao.execute("SELECT COUNT(*) FROM mensagens_enviadas").fetchone()[0] == 1
+    assert conexao.execute("SELECT alertas, soma_spread, maior_spread FROM oportunidades_por_hora").fetchall() == [(2, 5.0, 3.0)]
+    banco.fechar()
+
+
+def test_migracao_conta_as_repeticoes_no_resumo(banco_v1):
+    with sqlite3.connect(banco_v1) as conexao:
+        conexao.execute("INSERT INTO mensagens_enviadas VALUES ('M0/USDT', 'KRAKEN', 'GATE', '1.0', '1.03', '3.0', '10', '0.3', '2026-10-01 00:00')")
+    conexao.close()
+
+    banco = robo_telegram.DatabaseManager(banco_v1)
+    banco.inicializar_tabelas()
+    alertas, mensagens = banco.conectar().execute("SELECT TOTAL(alertas), (SELECT COUNT(*) FROM mensagens_enviadas) FROM oportunidades_por_hora").fetchone()
+    banco.fechar()
+    assert (alertas, mensagens) == (5001, 5000)
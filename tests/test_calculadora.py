@@ -0,0 +1,38 @@
+import pytest
+
+import calculadora
+
+
+def test_varredura_nunca_compra_e_vende_na_mesma_exchange():
+    # Sem taxas, a Binance seria a melhor compra (menor custo) e também a melhor venda
+    resultado = calculadora.scan_opportunities({"kraken": {"A": 100.0}, "binance": {"A": 100.05}})
+
+    assert len(resultado) == 1
+    moeda, compra, preco_compra, venda, preco_venda, spread, lucro = resultado[0]
+    assert (moeda, compra, venda) == ("A", "kraken", "binance")
+    assert (preco_compra, preco_venda) == (100.0, 100.05)
+    assert spread == pytest.approx(0.05)
+    assert lucro < 0
+
+
+def test_varredura_escolhe_o_melhor_par_entre_exchanges_diferentes():
+    precos = {
+        "kraken": {"A": 100.0, "B": 2.0},
+        "binance": {"A": 101.0, "C": 1.0},
+        "gate": {"A": 99.0, "B": 2.1, "C": 1.1},
+        "mexc": {"D": 5.0},
+    }
+
+    resultado = calculadora.scan_opportunities(precos)
+
+    assert [linha[0] for linha in resultado] == ["C", "B", "A"]  # D está em uma só exchange
+    assert [(linha[1], linha[3]) for linha in resultado] == [("binance", "gate"), ("kraken", "gate"), ("gate", "binance")]
+    assert all(linha[1] != linha[3] for linha in resultado)
+    lucro_esperado = (101.0 * (1 - 0.001) - 99.0 * (1 + 0.002)) / (99.0 * (1 + 0.002)) * 100
+    assert resultado[2][6] == pytest.approx(lucro_esperado)
+
+
+def test_varredura_respeita_a_watchlist():
+    precos = {"kraken": {"A": 100.0, "B": 2.0}, "gate": {"A": 101.0, "B": 2.2}}
+
+    assert [linha[0] for linha in calculadora.scan_opportunities(precos, watchlist=["A"])] == ["A"]
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from replay import NotificadorNulo
+import robo_telegram
+
+CICLO = robo_telegram.CicloArbitragem((
+    robo_telegram.PassoCiclo('KRAKEN', 'USDT', 'BTC', 'compra', 'BTC/USDT', 60000.0),
+    robo_telegram.PassoCiclo('KRAKEN', 'BTC', 'ETH', 'compra', 'ETH/BTC', 0.05),
+    robo_telegram.PassoCiclo('KRAKEN', 'ETH', 'USDT', 'venda', 'ETH/USDT', 3100.0),
+), 1.5, None)
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    banco = robo_telegram.DatabaseManager(str(tmp_path / "arbitragem.db"))
+    banco.inicializar_tabelas()
+    notificador = NotificadorNulo()
+    monkeypatch.setattr(robo_telegram, 'db_manager', banco, raising=False)
+    monkeypatch.setattr(robo_telegram, 'notificador', notificador)
+    monkeypatch.setattr(robo_telegram, 'cache_oportunidades', robo_telegram.CacheOportunidades(banco), raising=False)
+    monkeypatch.setattr(robo_telegram, 'cache_ciclos', robo_telegram.CacheOportunidades(None), raising=False)
+    yield banco, notificador
+    banco.fechar()
+
+
+def test_ciclo_repetido_respeita_o_cooldown_sem_gravar_no_banco(banco):
+    banco, notificador = banco
+
+    robo_telegram.realizar_arbitragem_ciclo(CICLO)
+    robo_telegram.realizar_arbitragem_ciclo(CICLO)
+    banco.descarregar(esperar=True)
+
+    assert notificador.alertas == {"ciclo USDT → BTC → ETH → USDT": 1}
+    assert banco.listar_oportunidades() == []
+
+
+def test_rotas_gravadas_antes_sao_removidas_da_tabela_de_oportunidades(tmp_path):
+    caminho = str(tmp_path / "arbitragem.db")
+    robo_telegram.DatabaseManager(caminho).inicializar_tabelas()
+    with sqlite3.connect(caminho) as conexao:
+        conexao.executemany("INSERT INTO oportunidades VALUES (?, 'KRAKEN', 'KRAKEN', 1000, 1015, 15, '2026-10-17T00:00:00')",
+                            [("USDT → BTC → ETH → USDT",), ("BTC/USDT",)])
+    conexao.close()
+
+    banco = robo_telegram.DatabaseManager(caminho)
+    banco.inicializar_tabelas()
+
+    assert [linha[0] for linha in banco.listar_oportunidades()] == ["BTC/USDT"]
+    banco.fechar()
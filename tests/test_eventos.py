@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+
+import pytest
+import socketio
+
+from benchmark import porta_livre
+import robo_telegram
+import webhook
+
+
+@pytest.fixture(scope='module')
+def servidor():
+    porta = porta_livre()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    threading.Thread(target=webhook.socketio.run, args=(webhook.app,), daemon=True,
+                     kwargs={'host': '127.0.0.1', 'port': porta, 'allow_unsafe_werkzeug': True}).start()
+    url = f"http://127.0.0.1:{porta}"
+    for _ in range(100):
+        try:
+            robo_telegram.sio.connect(url)
+            break
+        except socketio.exceptions.ConnectionError:
+            time.sleep(0.05)
+    yield url
+    robo_telegram.sio.disconnect()
+
+
+def esperar(condicao, timeout=10):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite
+        time.sleep(0.05)
+
+
+def test_rajada_de_livros_chega_ao_robo_sem_derrubar_o_long_polling(servidor, monkeypatch):
+    monkeypatch.setattr(webhook, 'PROFUNDIDADE_BOOK', 2)
+    monkeypatch.setattr(robo_telegram, 'books_exchanges', {})
+    desconexoes = []
+    robo_telegram.sio.on('disconnect', lambda *args: desconexoes.append(args))
+
+    for i in range(100):
+        webhook.emitir_book('kraken', f"R{i}/USDT", {'bids': [[1.0, 5.0], [0.9, 5.0]], 'asks': [[1.1, 5.0], [1.2, 5.0]]})
+    esperar(lambda: len(robo_telegram.books_exchanges) == 100)
+
+    asks, bids, _ = robo_telegram.books_exchanges[("R0/USDT", "KRAKEN")]
+    assert asks.valor_acumulado.tolist() == pytest.approx([0.0, 5.5, 11.5])
+    assert bids.quantidade_total == 10.0
+    assert robo_telegram.sio.connected and not desconexoes
+
+
+def test_snapshot_envia_todos_os_livros_em_um_unico_evento(servidor):
+    for i in range(50):
+        webhook.publicador.publicar_book('gate', f"S{i}/USDT", [[1.0, 1.0]], [[1.1, 1.0]])
+    webhook.publicador.descarregar()  # O lote dessas mudanças não deve se confundir com o snapshot
+    eventos = []
+    cliente = socketio.Client()
+    cliente.on('books_atualizados', eventos.append)
+    cliente.on('book_atualizado', eventos.append)
+    cliente.connect(servidor)
+    try:
+        esperar(lambda: eventos)
+        time.sleep(0.5)
+    finally:
+        cliente.disconnect()
+
+    assert len(eventos) == 1
+    assert {moeda for exchange, moeda, *_ in eventos[0]['b'] if exchange == 'GATE'} == {f"S{i}/USDT" for i in range(50)}
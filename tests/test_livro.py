@@ -0,0 +1,90 @@
+import math
+
+import numpy as np
+import pytest
+
+import robo_telegram
+
+
+@pytest.fixture
+def matriz():
+    return robo_telegram.MatrizOportunidades({'KRAKEN': 0.0, 'GATE': 0.0, 'MEXC': 0.0}, idade_maxima=30, desvio_maximo=5,
+                                             volume_minimo=0)
+
+
+def test_matriz_le_os_precos_do_proprio_livro(matriz):
+    matriz.atualizar("A/USDT", 'KRAKEN', 100.0, 1000.0, (99.9, 100.0, 2.0, 3.0, 5e6), recebido_em=1000.0)
+    matriz.atualizar("A/USDT", 'GATE', 103.0, 1000.0, (103.0, 103.1, 4.0, 1.0, 5e6), recebido_em=1000.0)
+
+    livro = matriz.livro
+    assert livro.quantidade("A/USDT") == 2
+    assert livro.spread_bruto("A/USDT") == pytest.approx(3.0)
+    [oportunidade] = matriz.oportunidades("A/USDT", minimo=1, maximo=10, agora=1000.0)
+    assert (oportunidade.compra_exchange, oportunidade.venda_exchange) == ('KRAKEN', 'GATE')
+    assert (oportunidade.preco_compra, oportunidade.preco_venda) == (100.0, 103.0)
+    assert (oportunidade.quantidade_compra, oportunidade.quantidade_venda) == (3.0, 4.0)
+
+
+def test_livro_cresce_em_linhas_e_colunas_sem_perder_precos(matriz):
+    moedas = [f"M{i}/USDT" for i in range(100)]
+    for i, moeda in enumerate(moedas):
+        matriz.atualizar(moeda, 'KRAKEN', 1.0 + i, 1000.0, recebido_em=1000.0)
+    # Uma exchange nova depois de muitas moedas redimensiona todas as colunas
+    for i, moeda in enumerate(moedas):
+        matriz.atualizar(moeda, 'GATE', 1.1 * (1.0 + i), 1000.0, recebido_em=1000.0)
+
+    livro = matriz.livro
+    assert livro.capacidade < 2 * len(moedas)
+    assert livro.campo('asks').shape == (100, 2)
+    assert livro.campo('asks')[:, 0].tolist() == [1.0 + i for i in range(100)]
+    assert len(matriz.ranking(minimo=5, maximo=20, agora=1000.0)) == 100
+
+
+def test_expirar_descarta_do_livro(matriz):
+    matriz.atualizar("A/USDT", 'KRAKEN', 100.0, 1000.0, recebido_em=1000.0)
+    matriz.atualizar("A/USDT", 'GATE', 102.0, 1020.0, recebido_em=1020.0)
+
+    assert matriz.expirar(agora=1040.0) == [("A/USDT", 'KRAKEN')]
+    assert matriz.livro.quantidade("A/USDT") == 1
+    assert matriz.livro.melhores("A/USDT") == (('GATE', 102.0), ('GATE', 102.0))
+    assert matriz.oportunidades("A/USDT", minimo=-100, maximo=100, agora=1040.0) == []
+
+
+def test_snapshot_restaura_preco_e_topo(matriz, tmp_path):
+    matriz.atualizar("A/USDT", 'KRAKEN', 100.0, 1000.0, (99.9, 100.0, 2.0, 3.0, None), recebido_em=1001.0)
+    matriz.atualizar("B/USDT", 'GATE', 5.0, 1000.0, recebido_em=1001.0)
+    caminho = str(tmp_path / "precos.npz")
+    matriz.livro.salvar(caminho)
+
+    livro = robo_telegram.LivroPrecos.carregar(caminho)
+
+    assert sorted(livro.itens()) == sorted(matriz.livro.itens())
+    linha, coluna = livro.indice_moeda["A/USDT"], livro.indice_exchange['KRAKEN']
+    assert livro.campo('quantidades_ask')[linha, coluna] == 3.0
+    assert math.isnan(livro.campo('volumes')[linha, coluna])
+
+
+def test_snapshot_antigo_sem_topo_usa_o_ultimo_preco():
+    estado = {'moedas': ["A/USDT"], 'exchanges': ['KRAKEN'], 'precos': np.array([[10.0]]),
+              'timestamps': np.array([[1000.0]]), 'recebidos': np.array([[1000.0]])}
+
+    livro = robo_telegram.LivroPrecos.restaurar(estado)
+
+    assert livro.melhores("A/USDT") == (('KRAKEN', 10.0), ('KRAKEN', 10.0))
+    assert math.isnan(livro.campo('quantidades_bid')[0, 0])
+
+
+def test_expirar_precos_descarta_livros_de_ofertas_velhos(matriz, monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(robo_telegram, 'relogio', lambda: agora[0])
+    monkeypatch.setattr(robo_telegram, 'matriz', matriz, raising=False)
+    monkeypatch.setattr(robo_telegram, 'books_exchanges', {})
+    livro = {'bids': [[99.9, 1.0]], 'asks': [[100.0, 1.0]]}
+    robo_telegram.processar_book_evento({'exchange': 'KRAKEN', 'moeda': "A/USDT", **livro})
+    agora[0] = 1020.0
+    robo_telegram.processar_lote_books_evento({'t': 1020000, 'b': [['GATE', "A/USDT", livro['bids'], livro['asks']]]})
+
+    agora[0] = 1040.0
+    robo_telegram.expirar_precos()
+
+    assert list(robo_telegram.books_exchanges) == [("A/USDT", 'GATE')]
@@ -0,0 +1,81 @@
+import time
+
+from benchmark import TelegramFalso
+import robo_telegram
+
+
+def criar_notificador(telegram, **opcoes):
+    opcoes.setdefault('intervalo_minimo', 0)
+    return robo_telegram.NotificadorTelegram(telegram.iniciar(), 'TOKEN', 'CHAT', **opcoes)
+
+
+def enfileirar_juntos(notificador, alertas):
+    # Segurar a condição impede a thread de envio de tirar da fila antes de todos os alertas chegarem
+    with notificador.condicao:
+        for moeda, texto in alertas:
+            notificador.enfileirar(moeda, texto)
+
+
+def test_429_espera_o_retry_after_e_reenvia_a_mensagem():
+    telegram = TelegramFalso(limite_a_cada=2, retry_after=1)
+    notificador = criar_notificador(telegram)
+
+    enfileirar_juntos(notificador, [("A/USDT", "Alerta A"), ("B/USDT", "Alerta B")])
+    assert notificador.aguardar(timeout=10)
+
+    assert [texto for _, texto in telegram.mensagens] == ["Alerta A", "Alerta B"]
+    assert telegram.recusadas == 1
+    assert telegram.mensagens[1][0] - telegram.mensagens[0][0] >= 1
+    assert notificador.enviadas == 2
+
+
+def test_alertas_da_mesma_moeda_na_fila_viram_uma_mensagem_com_o_estado_mais_recente():
+    telegram = TelegramFalso()
+    notificador = criar_notificador(telegram)
+
+    enfileirar_juntos(notificador, [("A/USDT", "A 1"), ("B/USDT", "B 1"), ("A/USDT", "A 2"), ("A/USDT", "A 3")])
+    assert notificador.aguardar(timeout=10)
+
+    textos = [texto for _, texto in telegram.mensagens]
+    assert len(textos) == 2
+    assert textos[0].startswith("A 3\n\n")
+    assert "2 alerta(s) anterior(es) de A/USDT agrupado(s)" in textos[0]
+    assert textos[1] == "B 1"
+    assert notificador.agrupadas == 2
+
+
+def test_mensagens_saem_na_ordem_de_chegada_respeitando_o_intervalo_minimo():
+    telegram = TelegramFalso()
+    notificador = criar_notificador(telegram, intervalo_minimo=0.05)
+    moedas = [f"M{i}/USDT" for i in range(5)]
+
+    enfileirar_juntos(notificador, [(moeda, moeda) for moeda in moedas])
+    assert notificador.aguardar(timeout=10)
+
+    assert [texto for _, texto in telegram.mensagens] == moedas
+    intervalos = [b[0] - a[0] for a, b in zip(telegram.mensagens, telegram.mensagens[1:])]
+    assert min(intervalos) >= 0.04
+
+
+def test_fila_cheia_descarta_a_moeda_mais_antiga():
+    telegram = TelegramFalso()
+    notificador = criar_notificador(telegram, capacidade=2)
+
+    enfileirar_juntos(notificador, [("A/USDT", "A"), ("B/USDT", "B"), ("C/USDT", "C")])
+    assert notificador.aguardar(timeout=10)
+
+    assert [texto for _, texto in telegram.mensagens] == ["B", "C"]
+    assert notificador.descartadas == 1
+
+
+def test_enfileirar_nao_espera_o_telegram():
+    telegram = TelegramFalso(latencia=0.5)
+    notificador = criar_notificador(telegram)
+
+    inicio = time.perf_counter()
+    for i in range(100):
+        notificador.enfileirar(f"M{i % 10}/USDT", f"Alerta {i}")
+    assert time.perf_counter() - inicio < 0.1
+    assert notificador.aguardar(timeout=30)
+    assert notificador.enviadas + notificador.agrupadas == 100
+    assert notificador.enviadas == len(telegram.mensagens)
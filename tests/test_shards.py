@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import benchmark
+import webhook
+
+MOEDAS = [f"M{i}/USDT" for i in range(40)]
+EXCHANGES = [f"exchange{i}" for i in range(2)]
+
+
+def test_cada_par_cabe_a_um_unico_shard(monkeypatch):
+    for total in (1, 2, 3, 4):
+        for exchange in EXCHANGES:
+            partes = []
+            for indice in range(total):
+                monkeypatch.setattr(webhook, 'SHARD', (indice, total))
+                partes.append(webhook.moedas_do_shard(exchange, MOEDAS))
+            assert sorted(moeda for parte in partes for moeda in parte) == sorted(MOEDAS)
+            assert all(partes)
+
+
+def test_particao_nao_depende_do_processo():
+    # crc32 é fixo; o hash() de strings mudaria a cada processo com PYTHONHASHSEED aleatório
+    assert webhook.indice_shard('binance', 'BTC/USDT', 4) == webhook.indice_shard('binance', 'BTC/USDT', 4)
+    assert webhook.indice_shard('binance', 'BTC/USDT', 4) == 2
+
+
+def receber_ticks(total, duracao):
+    """Sobe `total` coletores contra exchanges locais e retorna os ticks recebidos depois do aquecimento."""
+    recebidos = []
+    trava = threading.Lock()
+
+    def emitir(exchange_name, moeda, *dados):
+        with trava:
+            recebidos.append((time.perf_counter(), exchange_name, moeda))
+
+    lancador = webhook.LancadorShards(total, benchmark.coletor_falso, (MOEDAS, EXCHANGES), emitir=emitir)
+    lancador.iniciar()
+    try:
+        limite = time.monotonic() + 30
+        while len({(exchange, moeda) for _, exchange, moeda in recebidos}) < len(MOEDAS) * len(EXCHANGES):
+            assert time.monotonic() < limite, "nem todos os pares chegaram ao servidor"
+            time.sleep(0.1)
+        inicio = time.perf_counter()
+        time.sleep(duracao)
+    finally:
+        lancador.parar()
+    with trava:
+        return recebidos, inicio
+
+
+def test_coletores_entregam_todos_os_pares_ao_servidor():
+    recebidos, _ = receber_ticks(2, 0)
+
+    pares = Counter((exchange, moeda) for _, exchange, moeda in recebidos)
+    assert set(pares) == {(exchange, moeda) for exchange in EXCHANGES for moeda in MOEDAS}
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="o ganho com processos coletores precisa de núcleos livres")
+def test_vazao_cresce_com_os_coletores():
+    vazoes = []
+    for total in (1, 2):
+        recebidos, inicio = receber_ticks(total, 3)
+        vazoes.append(sum(1 for instante, *_ in recebidos if inicio <= instante < inicio + 3) / 3)
+
+    assert vazoes[1] >= 1.3 * vazoes[0]
+
+
+def test_lote_emite_so_as_moedas_pedidas():
+    emitidas = []
+
+    class ExchangeFalsa:
+        def fetch_tickers(self, moedas):
+            # Como algumas exchanges, ignora o filtro e devolve o mercado inteiro
+            return {moeda: {'last': 1.0} for moeda in ["BTC/USDT", "ETH/USDT", "XYZ/USDT"]}
+
+    webhook.buscar_lote_exchange('mexc', ExchangeFalsa(), ["BTC/USDT", "ETH/USDT"],
+                                 emitir=lambda exchange_name, moeda, *dados: emitidas.append(moeda))
+
+    assert emitidas == ["BTC/USDT", "ETH/USDT"]
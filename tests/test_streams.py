@@ -0,0 +1,47 @@
+import asyncio
+
+import ccxt
+
+import webhook
+
+
+class ExchangeFalsa:
+    """Cliente ccxt.pro sem watchTickers cuja assinatura de A/USDT cai na primeira leitura."""
+    has = {'watchTickers': False}
+
+    def __init__(self, clientes):
+        self.fechada = False
+        self.leituras_depois_de_fechar = 0
+        clientes.append(self)
+
+    async def load_markets(self):
+        pass
+
+    async def watch_ticker(self, moeda):
+        if self.fechada:
+            self.leituras_depois_de_fechar += 1
+        await asyncio.sleep(0.01)
+        if moeda == "A/USDT":
+            raise ccxt.NetworkError("conexão perdida")
+        return {'last': 1.0}
+
+    async def close(self):
+        self.fechada = True
+
+
+def test_queda_de_uma_moeda_cancela_as_outras_antes_de_reconectar(monkeypatch):
+    clientes = []
+    monkeypatch.setattr(webhook, 'criar_cliente_stream', lambda exchange_name: ExchangeFalsa(clientes))
+    monkeypatch.setattr(webhook.cache_mercados, 'moedas_suportadas', lambda exchange_name, exchange, moedas: moedas)
+
+    async def rodar():
+        tarefa = asyncio.ensure_future(webhook.assistir_exchange('kraken', ["A/USDT", "B/USDT", "C/USDT"], lambda *dados: None))
+        # A reconexão espera 1s; nesse meio tempo as outras assinaturas teriam continuado no cliente fechado
+        await asyncio.sleep(0.5)
+        tarefa.cancel()
+        await asyncio.gather(tarefa, return_exceptions=True)
+
+    asyncio.run(rodar())
+
+    assert clientes[0].fechada
+    assert clientes[0].leituras_depois_de_fechar == 0
@@ -1,14 +1,33 @@
-from flask import Flask
-from flask_socketio import SocketIO
+from flask import Flask, Response
+from flask_socketio import SocketIO, emit
 from datetime import datetime
 import ccxt
+import aiohttp
+import asyncio
+import atexit
+import numpy as np
 import threading
 import time
 import logging
 import os
 import concurrent.futures
+import heapq
+import itertools
+import json
+import multiprocessing
+import random
+import zlib
+from collections import deque
+from collections.abc import Mapping
 from dotenv import load_dotenv
 
+import metricas
+
+try:
+    import msgpack  # Opcional: pip install msgpack, para EVENTOS_MSGPACK=1
+except ImportError:
+    msgpack = None
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -25,58 +44,1196 @@ logging.basicConfig(
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")  # Permitir conexões de qualquer origem
 
+# Momento em que o módulo foi carregado, base do tempo até o primeiro preço emitido
+INICIO_WEBHOOK = time.monotonic()
+
+# Cache em disco dos mercados de cada exchange (resultado do load_markets) e sua validade, em segundos
+DIRETORIO_CACHE_MERCADOS = os.getenv('DIRETORIO_CACHE_MERCADOS', 'cache_mercados')
+VALIDADE_CACHE_MERCADOS = int(os.getenv('VALIDADE_CACHE_MERCADOS', 24 * 3600))
+
+
+# Métricas expostas em /metrics
+METRICA_BUSCA = metricas.registro.histograma(
+    'webhook_busca_segundos', "Duração das chamadas às exchanges (com sucesso ou não)", ('exchange', 'tarefa'))
+METRICA_ERROS = metricas.registro.contador(
+    'webhook_erros_busca_total', "Chamadas às exchanges que falharam, pelo tipo de erro", ('exchange', 'erro'))
+METRICA_EMITIDOS = metricas.registro.contador(
+    'webhook_precos_emitidos_total', "Preços publicados aos clientes (só mudanças e confirmações)", ('exchange',))
+METRICA_CICLO = metricas.registro.histograma(
+    'webhook_ciclo_busca_segundos', "Duração de cada ciclo de busca de todas as moedas", ('modo',))
+METRICA_CIRCUITOS = metricas.registro.contador(
+    'webhook_circuitos_abertos_total', "Vezes que o circuito de uma exchange abriu", ('exchange',))
+metricas.registro.medidor(
+    'webhook_tempo_primeiro_preco_segundos', "Segundos entre o carregamento do webhook e o primeiro preço emitido",
+    funcao=lambda: tempo_primeiro_preco)
+
+
+class ExchangesSobDemanda(Mapping):
+    """Dicionário de clientes ccxt em que cada cliente só é criado no primeiro acesso.
+
+    O cliente já nasce com os mercados do cache em disco, quando válidos, e não
+    precisa baixá-los antes da primeira busca.
+    """
+    def __init__(self, fabricas):
+        self.fabricas = fabricas
+        self.clientes = {}
+        self.trava = threading.Lock()
+
+    def __getitem__(self, nome):
+        cliente = self.clientes.get(nome)
+        if cliente is None:
+            with self.trava:
+                if nome not in self.clientes:
+                    cliente = self.fabricas[nome]()
+                    cache_mercados.aplicar(nome, cliente)
+                    self.clientes[nome] = cliente
+                cliente = self.clientes[nome]
+        return cliente
+
+    def __iter__(self):
+        return iter(self.fabricas)
+
+    def __len__(self):
+        return len(self.fabricas)
+
+
 # Configuração das exchanges
-EXCHANGES = {
-    "binance": ccxt.binance({'apiKey': os.getenv('BINANCE_API_KEY'), 'secret': os.getenv('BINANCE_SECRET')}),
-    "kraken": ccxt.kraken({'apiKey': os.getenv('KRAKEN_API_KEY'), 'secret': os.getenv('KRAKEN_SECRET')}),
-    "gate": ccxt.gateio(),
-    "mexc": ccxt.mexc()
-}
+EXCHANGES = ExchangesSobDemanda({
+    "binance": lambda: ccxt.binance({'apiKey': os.getenv('BINANCE_API_KEY'), 'secret': os.getenv('BINANCE_SECRET')}),
+    "kraken": lambda: ccxt.kraken({'apiKey': os.getenv('KRAKEN_API_KEY'), 'secret': os.getenv('KRAKEN_SECRET')}),
+    "gate": lambda: ccxt.gate(),
+    "mexc": lambda: ccxt.mexc()
+})
 
 
 # Lista de moedas para monitorar
-MOEDAS = os.getenv('MOEDAS', "").split(',')
+MOEDAS = [moeda.strip() for moeda in os.getenv('MOEDAS', "").split(',') if moeda.strip()]
 
 # Intervalo de busca em segundos
 INTERVALO_BUSCA = int(os.getenv('INTERVALO_BUSCA', 5))
 
-def buscar_preco_exchange(exchange_name, exchange, moeda):
-    """Busca o preço de uma moeda em uma exchange específica."""
-    for tentativa in range(3):  # Tenta buscar o preço até 3 vezes
+# Modo de coleta: 'lote' (um fetch_tickers por exchange), 'individual' (um fetch_ticker por moeda),
+# 'async' (todos os fetch_ticker simultâneos em asyncio) ou 'stream' (assinatura WebSocket, sem polling)
+MODO_COLETA = os.getenv('MODO_COLETA', 'lote')
+
+# Modo 'stream': URL de um feed WebSocket genérico (ex.: servidor local de testes) no lugar do ccxt.pro
+STREAM_URL = os.getenv('STREAM_URL')
+
+# Espera máxima, em segundos, entre tentativas de reconexão do stream
+STREAM_ESPERA_MAXIMA = int(os.getenv('STREAM_ESPERA_MAXIMA', 60))
+
+# Máximo de moedas por chamada quando a exchange não aceita a lista completa
+TAMANHO_LOTE = int(os.getenv('TAMANHO_LOTE', 50))
+
+# Tamanho de lote aprendido para cada exchange que recusou a lista completa
+TAMANHOS_LOTE = {}
+
+# Tentativas por requisição e backoff exponencial (s) entre elas
+MAX_TENTATIVAS = int(os.getenv('MAX_TENTATIVAS', 3))
+BACKOFF_BASE = float(os.getenv('BACKOFF_BASE', 1))
+BACKOFF_MAXIMO = float(os.getenv('BACKOFF_MAXIMO', 30))
+
+# Modo 'async': máximo de requisições simultâneas no total e por exchange
+CONCORRENCIA_MAXIMA = int(os.getenv('CONCORRENCIA_MAXIMA', 2000))
+CONCORRENCIA_POR_EXCHANGE = int(os.getenv('CONCORRENCIA_POR_EXCHANGE', 200))
+
+# Níveis do livro de ofertas enviados por moeda em books_atualizados (book_atualizado no modo 'individual'; 0 desativa)
+PROFUNDIDADE_BOOK = int(os.getenv('PROFUNDIDADE_BOOK', 0))
+
+# Eventos: 'lote' (um precos_atualizados por janela) ou 'individual' (um preco_atualizado por mudança).
+# Um cliente em long-polling (sem websocket-client) recebe de uma vez todos os eventos acumulados entre
+# duas requisições e recusa respostas com mais de 16; no modo 'individual' um ciclo de busca passa disso
+MODO_EVENTOS = os.getenv('MODO_EVENTOS', 'lote')
+
+# Modo de eventos 'lote': janela, em segundos, em que as mudanças são agrupadas e codificação msgpack
+JANELA_EVENTOS = float(os.getenv('JANELA_EVENTOS', 0.25))
+EVENTOS_MSGPACK = os.getenv('EVENTOS_MSGPACK', '0') == '1'
+
+# Falhas consecutivas que suspendem uma exchange e por quantos segundos ela fica suspensa
+CIRCUITO_LIMITE_FALHAS = int(os.getenv('CIRCUITO_LIMITE_FALHAS', 5))
+CIRCUITO_TEMPO_ABERTO = int(os.getenv('CIRCUITO_TEMPO_ABERTO', 60))
+
+# Um preço inalterado é reenviado após este tempo, em segundos, para o consumidor saber que ele continua válido
+CONFIRMACAO_PRECO = float(os.getenv('CONFIRMACAO_PRECO', 10))
+
+# Coleta em SHARDS processos coletores (> 1 ativa), cada um com uma partição de MOEDAS × EXCHANGES;
+# o processo principal fica só com o servidor Socket.IO e publica o que os coletores enviam
+SHARDS = int(os.getenv('SHARDS', 1))
+
+# Partição (índice, total) coletada por este processo; (0, 1) coleta tudo
+SHARD = (0, 1)
+
+# Gravação dos ticks publicados para o replay.py (GRAVAR_TICKS=1), um arquivo por dia em DIRETORIO_TICKS
+GRAVAR_TICKS = os.getenv('GRAVAR_TICKS', '0') == '1'
+DIRETORIO_TICKS = os.getenv('DIRETORIO_TICKS', 'ticks')
+
+# Registro de um tick gravado: timestamp da exchange e da coleta (epoch ms), ids da exchange e da moeda, preço
+# e topo do ticker (bid, ask, quantidades no bid e no ask, volume 24h; NaN se a exchange não informa)
+REGISTRO_TICK = np.dtype([('ts', '<i8'), ('coletado', '<i8'), ('exchange', '<u2'), ('moeda', '<u4'), ('preco', '<f8'),
+                          ('bid', '<f8'), ('ask', '<f8'), ('quantidade_bid', '<f8'), ('quantidade_ask', '<f8'), ('volume', '<f8')])
+
+# Registro dos arquivos ticks_AAAAMMDD.bin gravados antes do topo, ainda lidos pelo replay
+REGISTRO_TICK_SEM_TOPO = np.dtype([('ts', '<i8'), ('coletado', '<i8'), ('exchange', '<u2'), ('moeda', '<u4'), ('preco', '<f8')])
+
+
+class CacheMercados:
+    """Mercados de cada exchange salvos em disco e válidos por `validade` segundos.
+
+    Evita baixar a lista completa de mercados (load_markets) a cada partida.
+    Também mantém, por exchange, o índice de quais moedas ela lista, para que
+    pares (exchange, moeda) inexistentes nunca sejam agendados; o índice é
+    refeito quando os mercados são recarregados.
+    """
+    def __init__(self, diretorio, validade):
+        self.diretorio = diretorio
+        self.validade = validade
+        self.indices = {}
+        self.trava = threading.Lock()
+
+    def _caminho(self, exchange_name):
+        return os.path.join(self.diretorio, f"mercados_{exchange_name}.json")
+
+    def aplicar(self, exchange_name, exchange):
+        """Carrega no cliente os mercados do cache, se existirem e ainda valerem. Retorna se carregou."""
         try:
-            ticker = exchange.fetch_ticker(moeda)
-            preco = ticker.get('last')
-            if preco:
-                logging.info(f"{exchange_name.upper()} - {moeda}: {preco:.6f}")
-                socketio.emit('preco_atualizado', {
-                    'exchange': exchange_name.upper(),
-                    'moeda': moeda,
-                    'preco': preco,
-                    'timestamp': datetime.now().isoformat()
-                })
-            return
+            with open(self._caminho(exchange_name), encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError):
+            return False
+        idade = time.time() - dados['salvo_em']
+        if idade > self.validade:
+            return False
+        exchange.set_markets(dados['mercados'], dados.get('moedas') or None)
+        logging.info(f"{exchange_name.upper()}: {len(dados['mercados'])} mercados carregados do cache ({idade / 3600:.1f}h).")
+        return True
+
+    def carregar(self, exchange_name, exchange):
+        """Baixa os mercados da exchange e atualiza o cache em disco."""
+        exchange.load_markets(reload=True)
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            temporario = self._caminho(exchange_name) + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                json.dump({'salvo_em': time.time(), 'mercados': list(exchange.markets.values()), 'moedas': exchange.currencies}, arquivo)
+            os.replace(temporario, self._caminho(exchange_name))
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Não foi possível salvar o cache de mercados de {exchange_name.upper()}: {e}")
+        logging.info(f"{exchange_name.upper()}: {len(exchange.markets)} mercados baixados.")
+
+    def moedas_suportadas(self, exchange_name, exchange, moedas):
+        """Moedas da lista que a exchange lista. As ausentes são avisadas uma única vez."""
+        with self.trava:
+            mercados, suporte = self.indices.get(exchange_name, (None, None))
+            if mercados is not exchange.markets:
+                suporte = {}
+                self.indices[exchange_name] = (exchange.markets, suporte)
+            novas = [moeda for moeda in moedas if moeda not in suporte]
+            for moeda in novas:
+                suporte[moeda] = moeda in exchange.markets
+        ausentes = [moeda for moeda in novas if not suporte[moeda]]
+        if ausentes:
+            exemplos = ', '.join(ausentes[:10]) + (', ...' if len(ausentes) > 10 else '')
+            logging.warning(f"{exchange_name.upper()} não lista {len(ausentes)} moeda(s), que não serão buscadas: {exemplos}")
+        return [moeda for moeda in moedas if suporte[moeda]]
+
+
+cache_mercados = CacheMercados(DIRETORIO_CACHE_MERCADOS, VALIDADE_CACHE_MERCADOS)
+
+
+class PublicadorEventos:
+    """Mantém o último preço de cada (exchange, moeda) e publica somente as mudanças.
+
+    Cada preço leva o timestamp informado pela exchange (epoch ms, ou o momento
+    da coleta se ela não informar). Um preço que não mudou é reenviado a cada
+    `confirmacao` segundos, para que o consumidor não o considere velho.
+
+    Junto do preço vai o topo do ticker (ver topo_ticker), quando a exchange o
+    informa: uma mudança de bid ou ask também é publicada, e quantidades e
+    volume seguem com a publicação seguinte.
+
+    No modo de eventos 'lote' as mudanças são acumuladas (a mais recente de cada
+    par vence) e enviadas a cada JANELA_EVENTOS segundos em um único evento
+    `precos_atualizados` no formato compacto {"t": epoch_ms, "p": [[exchange, moeda, preco, ts, *topo], ...]},
+    codificado em msgpack se EVENTOS_MSGPACK=1. Os livros de ofertas alterados
+    vão na mesma janela em um único `books_atualizados`
+    ({"t": epoch_ms, "b": [[exchange, moeda, bids, asks], ...]}).
+    """
+    def __init__(self, modo, janela, usar_msgpack, confirmacao=CONFIRMACAO_PRECO):
+        if usar_msgpack and msgpack is None:
+            logging.warning("EVENTOS_MSGPACK=1 mas o pacote msgpack não está instalado, usando JSON.")
+        self.modo = modo
+        self.janela = janela
+        self.usar_msgpack = usar_msgpack and msgpack is not None
+        self.confirmacao = confirmacao
+        self.ultimos_precos = {}
+        self.ultimos_books = {}
+        self.alterados = {}
+        self.books_alterados = {}
+        self.trava = threading.Lock()
+        self.thread = None
+
+    def publicar(self, exchange_name, moeda, preco, timestamp=None, topo=None):
+        """Registra o preço e o publica se mudou ou se a confirmação venceu. Retorna se publicou."""
+        chave = (exchange_name.upper(), moeda)
+        agora = time.monotonic()
+        timestamp = timestamp or int(time.time() * 1000)
+        topo = tuple(topo) if topo else ()
+        with self.trava:
+            anterior = self.ultimos_precos.get(chave)
+            if anterior and anterior[0] == preco and anterior[3][:2] == topo[:2] and agora - anterior[2] < self.confirmacao:
+                return False
+            self.ultimos_precos[chave] = (preco, timestamp, agora, topo)
+            if self.modo == 'lote':
+                self.alterados[chave] = (preco, timestamp, topo)
+                self._iniciar_thread()
+                return True
+        socketio.emit('preco_atualizado', self.evento_preco(chave, preco, timestamp, topo))
+        return True
+
+    def _iniciar_thread(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._publicar_periodicamente, daemon=True)
+            self.thread.start()
+
+    def evento_preco(self, chave, preco, timestamp, topo):
+        evento = {'exchange': chave[0], 'moeda': chave[1], 'preco': preco, 'ts': timestamp,
+                  'timestamp': datetime.now().isoformat()}
+        if topo:
+            evento['topo'] = list(topo)
+        return evento
+
+    def publicar_book(self, exchange_name, moeda, bids, asks):
+        """Publica o topo do livro de ofertas se mudou. Retorna se houve mudança."""
+        chave = (exchange_name.upper(), moeda)
+        with self.trava:
+            if self.ultimos_books.get(chave) == (bids, asks):
+                return False
+            self.ultimos_books[chave] = (bids, asks)
+            if self.modo == 'lote':
+                self.books_alterados[chave] = (bids, asks)
+                self._iniciar_thread()
+                return True
+        socketio.emit('book_atualizado', self.evento_book(chave, bids, asks))
+        return True
+
+    def evento_book(self, chave, bids, asks):
+        return {'exchange': chave[0], 'moeda': chave[1], 'bids': bids, 'asks': asks, 'timestamp': datetime.now().isoformat()}
+
+    def quadro(self, precos):
+        """Monta o evento compacto precos_atualizados para os preços informados."""
+        quadro = {
+            't': int(time.time() * 1000),
+            'p': [[exchange, moeda, preco, timestamp, *topo] for (exchange, moeda), (preco, timestamp, topo) in precos.items()]
+        }
+        return msgpack.packb(quadro) if self.usar_msgpack else quadro
+
+    def quadro_books(self, books):
+        """Monta o evento books_atualizados para os livros de ofertas informados."""
+        quadro = {
+            't': int(time.time() * 1000),
+            'b': [[exchange, moeda, bids, asks] for (exchange, moeda), (bids, asks) in books.items()]
+        }
+        return msgpack.packb(quadro) if self.usar_msgpack else quadro
+
+    def descarregar(self):
+        """Publica de uma vez as mudanças acumuladas desde o último envio."""
+        with self.trava:
+            alterados, self.alterados = self.alterados, {}
+            books, self.books_alterados = self.books_alterados, {}
+        if books:
+            socketio.emit('books_atualizados', self.quadro_books(books))
+        if alterados:
+            socketio.emit('precos_atualizados', self.quadro(alterados))
+
+    def enviar_snapshot(self):
+        """Envia ao cliente que acabou de conectar os últimos preços e livros de ofertas conhecidos.
+
+        Em qualquer modo de eventos, os livros vão em um único books_atualizados e
+        os preços em um único precos_atualizados: um evento por item estouraria o
+        limite de pacotes de um cliente em long-polling.
+        """
+        with self.trava:
+            precos = {chave: (preco, timestamp, topo) for chave, (preco, timestamp, _, topo) in self.ultimos_precos.items()}
+            books = dict(self.ultimos_books)
+        if books:
+            emit('books_atualizados', self.quadro_books(books))
+        if precos:
+            emit('precos_atualizados', self.quadro(precos))
+
+    def _publicar_periodicamente(self):
+        while True:
+            time.sleep(self.janela)
+            self.descarregar()
+
+
+publicador = PublicadorEventos(MODO_EVENTOS, JANELA_EVENTOS, EVENTOS_MSGPACK)
+
+
+class GravadorTicks:
+    """Grava os ticks publicados em registros binários de largura fixa (REGISTRO_TICK), um arquivo por dia.
+
+    ticks_AAAAMMDD.topo.bin guarda os registros e ticks_AAAAMMDD.topo.nomes os nomes das
+    exchanges e moedas na ordem dos ids usados nos registros, uma linha
+    "tipo<TAB>nome" por nome novo. Os ticks se acumulam em memória e são
+    gravados em lote a cada `intervalo` segundos por uma thread própria.
+    """
+    def __init__(self, diretorio, intervalo=1.0):
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.dia = None
+        self.ids = {}
+        self.pendentes = []
+        self.nomes_pendentes = []
+        self.trava = threading.Lock()
+        self.thread = None
+
+    def gravar(self, exchange_name, moeda, preco, timestamp, topo=None, coletado=None):
+        coletado = coletado or int(time.time() * 1000)
+        topo = [np.nan if valor is None else valor for valor in topo] if topo else [np.nan] * 5
+        dia = datetime.fromtimestamp(coletado / 1000).strftime('%Y%m%d')
+        with self.trava:
+            if dia != self.dia:
+                self._descarregar()
+                self._abrir(dia)
+            self.pendentes.append((timestamp, coletado, self._id('exchange', exchange_name), self._id('moeda', moeda), preco, *topo))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._gravar_periodicamente, daemon=True)
+                self.thread.start()
+                atexit.register(self.descarregar)
+
+    def _caminho(self, dia, extensao):
+        return os.path.join(self.diretorio, f"ticks_{dia}.topo.{extensao}")
+
+    def _abrir(self, dia):
+        """Passa para o arquivo do dia, retomando os ids já gravados nele se o webhook foi reiniciado."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        self.dia = dia
+        self.ids = {'exchange': {}, 'moeda': {}}
+        if os.path.exists(self._caminho(dia, 'nomes')):
+            for tipo, nomes in GravadorTicks.ler_nomes(self._caminho(dia, 'nomes')).items():
+                self.ids[tipo] = {nome: i for i, nome in enumerate(nomes)}
+
+    def _id(self, tipo, nome):
+        ids = self.ids[tipo]
+        if nome not in ids:
+            ids[nome] = len(ids)
+            self.nomes_pendentes.append(f"{tipo}\t{nome}\n")
+        return ids[nome]
+
+    def _descarregar(self):
+        if self.nomes_pendentes:
+            with open(self._caminho(self.dia, 'nomes'), 'a', encoding='utf-8') as arquivo:
+                arquivo.writelines(self.nomes_pendentes)
+            self.nomes_pendentes = []
+        if self.pendentes:
+            with open(self._caminho(self.dia, 'bin'), 'ab') as arquivo:
+                np.array(self.pendentes, dtype=REGISTRO_TICK).tofile(arquivo)
+            self.pendentes = []
+
+    def descarregar(self):
+        """Grava no disco os ticks acumulados."""
+        with self.trava:
+            try:
+                self._descarregar()
+            except OSError as e:
+                logging.error(f"Erro ao gravar ticks em {self.diretorio}: {e}")
+
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo)
+            self.descarregar()
+
+    @staticmethod
+    def ler_nomes(caminho):
+        """Lê um arquivo .nomes: {'exchange': [nomes por id], 'moeda': [nomes por id]}."""
+        nomes = {'exchange': [], 'moeda': []}
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                tipo, nome = linha.rstrip('\n').split('\t', 1)
+                nomes[tipo].append(nome)
+        return nomes
+
+    @staticmethod
+    def ler(caminho):
+        """Abre um arquivo .bin gravado (memory-mapped). Retorna (registros, nomes).
+
+        Arquivos .topo.bin usam REGISTRO_TICK; os antigos, sem topo, REGISTRO_TICK_SEM_TOPO.
+        """
+        tipo = REGISTRO_TICK if caminho.endswith('.topo.bin') else REGISTRO_TICK_SEM_TOPO
+        registros = np.memmap(caminho, dtype=tipo, mode='r') if os.path.getsize(caminho) else np.empty(0, tipo)
+        return registros, GravadorTicks.ler_nomes(caminho[:-len('.bin')] + '.nomes')
+
+
+gravador_ticks = GravadorTicks(DIRETORIO_TICKS) if GRAVAR_TICKS else None
+
+# Segundos entre o carregamento do módulo e o primeiro preço emitido (None até lá)
+tempo_primeiro_preco = None
+
+
+def topo_ticker(ticker):
+    """(bid, ask, quantidade no bid, quantidade no ask, volume 24h na moeda de cotação) de um ticker ccxt.
+
+    None se a exchange não informa bid e ask; quantidades e volume que ela não
+    informa ficam None (o volume é estimado por baseVolume × last se faltar quoteVolume).
+    """
+    bid, ask = ticker.get('bid'), ticker.get('ask')
+    if not bid or not ask:
+        return None
+    volume = ticker.get('quoteVolume')
+    if volume is None and ticker.get('baseVolume') is not None and ticker.get('last'):
+        volume = ticker['baseVolume'] * ticker['last']
+    return (bid, ask, ticker.get('bidVolume'), ticker.get('askVolume'), volume)
+
+
+def emitir_preco(exchange_name, moeda, preco, timestamp=None, topo=None):
+    """Envia o preço (com o timestamp da exchange, em epoch ms) e o topo do ticker para os clientes conectados, se mudaram."""
+    timestamp = timestamp or int(time.time() * 1000)
+    global tempo_primeiro_preco
+    if publicador.publicar(exchange_name, moeda, preco, timestamp, topo):
+        if tempo_primeiro_preco is None:
+            tempo_primeiro_preco = time.monotonic() - INICIO_WEBHOOK
+            logging.info(f"Primeiro preço emitido {tempo_primeiro_preco:.2f}s após o carregamento do webhook.")
+        METRICA_EMITIDOS.incrementar(exchange_name)
+        if gravador_ticks:
+            gravador_ticks.gravar(exchange_name.upper(), moeda, preco, timestamp, topo)
+        logging.debug(f"{exchange_name.upper()} - {moeda}: {preco:.6f}")
+
+
+def indice_shard(exchange_name, moeda, total):
+    """Partição do par (exchange, moeda), estável entre processos (o hash() do Python não é)."""
+    return zlib.crc32(f"{exchange_name}:{moeda}".encode()) % total
+
+
+def moedas_do_shard(exchange_name, moedas):
+    """Moedas da lista que cabem a este processo na exchange informada."""
+    indice, total = SHARD
+    if total == 1:
+        return moedas
+    return [moeda for moeda in moedas if indice_shard(exchange_name, moeda, total) == indice]
+
+
+def emitir_book(exchange_name, moeda, book):
+    """Envia os PROFUNDIDADE_BOOK melhores níveis [preço, quantidade] de cada lado do livro, se mudaram."""
+    bids = [[nivel[0], nivel[1]] for nivel in book['bids'][:PROFUNDIDADE_BOOK]]
+    asks = [[nivel[0], nivel[1]] for nivel in book['asks'][:PROFUNDIDADE_BOOK]]
+    if publicador.publicar_book(exchange_name, moeda, bids, asks):
+        logging.debug(f"{exchange_name.upper()} - {moeda}: livro com {len(bids)} bids e {len(asks)} asks")
+
+
+class TokenBucket:
+    """Limitador de taxa: libera `taxa` requisições por segundo, acumulando até `capacidade`."""
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.fichas = capacidade
+        self.atualizado_em = time.monotonic()
+        self.trava = threading.Lock()
+
+    @classmethod
+    def para_exchange(cls, exchange):
+        """Dimensiona o bucket pelo rateLimit (ms entre requisições) do cliente ccxt."""
+        taxa = 1000 / exchange.rateLimit
+        return cls(taxa, max(1.0, taxa))
+
+    def consumir(self, fichas=1):
+        """Consome fichas se houver. Retorna 0 em caso de sucesso ou os segundos até haver fichas."""
+        with self.trava:
+            agora = time.monotonic()
+            self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado_em) * self.taxa)
+            self.atualizado_em = agora
+            if self.fichas >= fichas:
+                self.fichas -= fichas
+                return 0.0
+            return (fichas - self.fichas) / self.taxa
+
+    def reservar(self, fichas=1):
+        """Reserva fichas mesmo sem saldo e retorna os segundos até a vez de quem reservou.
+
+        O saldo fica negativo e cada reserva entra na fila depois das anteriores,
+        então quem espera dorme uma única vez, em vez de todos acordarem e
+        disputarem a mesma ficha.
+        """
+        with self.trava:
+            agora = time.monotonic()
+            self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado_em) * self.taxa)
+            self.atualizado_em = agora
+            self.fichas -= fichas
+            return max(0.0, -self.fichas / self.taxa)
+
+
+class CircuitBreaker:
+    """Suspende as chamadas a uma exchange após falhas consecutivas.
+
+    Depois de `tempo_aberto` segundos libera uma única chamada de teste: se ela
+    funcionar o circuito fecha, se falhar volta a abrir. Toda chamada liberada
+    precisa terminar em registrar_sucesso ou registrar_falha, senão o teste
+    nunca acaba e a exchange fica suspensa.
+    """
+    def __init__(self, nome, limite_falhas, tempo_aberto):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self.em_teste = False
+        self.trava = threading.Lock()
+
+    def permite(self):
+        """Indica se uma chamada pode ser feita agora."""
+        with self.trava:
+            if self.falhas < self.limite_falhas:
+                return True
+            if time.monotonic() >= self.aberto_ate and not self.em_teste:
+                self.em_teste = True
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        with self.trava:
+            if self.falhas >= self.limite_falhas:
+                logging.info(f"Circuito de {self.nome.upper()} fechado, chamadas retomadas.")
+            self.falhas = 0
+            self.em_teste = False
+
+    def registrar_falha(self):
+        with self.trava:
+            self.falhas += 1
+            self.em_teste = False
+            if self.falhas >= self.limite_falhas:
+                METRICA_CIRCUITOS.incrementar(self.nome)
+                self.aberto_ate = time.monotonic() + self.tempo_aberto
+                logging.warning(f"Circuito de {self.nome.upper()} aberto por {self.tempo_aberto}s após {self.falhas} falhas.")
+
+
+class TarefaAgendada:
+    """Requisição pendente no agendador."""
+    def __init__(self, exchange_name, chave, funcao, args):
+        self.exchange_name = exchange_name
+        self.chave = chave
+        self.funcao = funcao
+        self.args = args
+        self.tentativa = 0
+        self.futuro = concurrent.futures.Future()
+
+
+class AgendadorRequisicoes:
+    """Distribui as requisições às exchanges sem prender threads esperando.
+
+    Cada exchange tem seu TokenBucket e seu CircuitBreaker. Uma requisição sem
+    ficha disponível, ou que falhou, volta para a fila com o atraso necessário
+    (backoff exponencial com jitter) em vez de dormir dentro de uma thread do
+    pool, de modo que uma exchange lenta não atrasa as demais.
+
+    Cada exchange ocupa no máximo `por_exchange` threads do pool (por padrão a
+    sua parte igual, arredondada para cima). Uma exchange lenta que não chega a
+    falhar, e por isso não abre o circuito, não prende todas as threads: suas
+    requisições excedentes esperam fora da fila até uma das suas terminar.
+    """
+    def __init__(self, exchanges, max_workers=None, por_exchange=None):
+        self.buckets = {}
+        self.circuitos = {}
+        for nome, exchange in exchanges.items():
+            exchange.enableRateLimit = False  # O bucket substitui o throttle bloqueante do ccxt
+            self.buckets[nome] = TokenBucket.para_exchange(exchange)
+            self.circuitos[nome] = CircuitBreaker(nome, CIRCUITO_LIMITE_FALHAS, CIRCUITO_TEMPO_ABERTO)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self.por_exchange = por_exchange or -(-self.executor._max_workers // max(1, len(exchanges)))
+        self.em_voo = {nome: 0 for nome in exchanges}
+        self.aguardando = {nome: deque() for nome in exchanges}
+        self.fila = []
+        self.sequencia = itertools.count()
+        self.pendentes = set()
+        self.condicao = threading.Condition()
+        threading.Thread(target=self._despachar, daemon=True).start()
+
+    def agendar(self, exchange_name, chave, funcao, *args):
+        """Agenda funcao(*args) para a exchange.
+
+        Retorna um Future resolvido quando a tarefa termina (ou é descartada), ou
+        None se uma tarefa com a mesma chave ainda estiver pendente.
+        """
+        with self.condicao:
+            if (exchange_name, chave) in self.pendentes:
+                return None
+            self.pendentes.add((exchange_name, chave))
+        tarefa = TarefaAgendada(exchange_name, chave, funcao, args)
+        self._enfileirar(tarefa, 0)
+        return tarefa.futuro
+
+    def _enfileirar(self, tarefa, atraso):
+        with self.condicao:
+            heapq.heappush(self.fila, (time.monotonic() + atraso, next(self.sequencia), tarefa))
+            self.condicao.notify()
+
+    def _concluir(self, tarefa, resultado=None, erro=None):
+        with self.condicao:
+            self.pendentes.discard((tarefa.exchange_name, tarefa.chave))
+        if erro is not None:
+            tarefa.futuro.set_exception(erro)
+        else:
+            tarefa.futuro.set_result(resultado)
+
+    def _despachar(self):
+        while True:
+            with self.condicao:
+                while not self.fila or self.fila[0][0] > time.monotonic():
+                    self.condicao.wait(self.fila[0][0] - time.monotonic() if self.fila else None)
+                _, _, tarefa = heapq.heappop(self.fila)
+                if self.em_voo[tarefa.exchange_name] >= self.por_exchange:
+                    self.aguardando[tarefa.exchange_name].append(tarefa)
+                    continue
+            espera = self.buckets[tarefa.exchange_name].consumir()
+            if espera:
+                self._enfileirar(tarefa, espera)
+                continue
+            if not self.circuitos[tarefa.exchange_name].permite():
+                self._concluir(tarefa)
+                continue
+            with self.condicao:
+                self.em_voo[tarefa.exchange_name] += 1
+            self.executor.submit(self._executar, tarefa)
+
+    def _liberar(self, exchange_name):
+        """Devolve a vaga da exchange e põe de volta na fila a próxima requisição que esperava por ela."""
+        with self.condicao:
+            self.em_voo[exchange_name] -= 1
+            if self.aguardando[exchange_name]:
+                heapq.heappush(self.fila, (time.monotonic(), next(self.sequencia), self.aguardando[exchange_name].popleft()))
+                self.condicao.notify()
+
+    def _executar(self, tarefa):
+        try:
+            self._executar_tarefa(tarefa)
+        finally:
+            self._liberar(tarefa.exchange_name)
+
+    def _executar_tarefa(self, tarefa):
+        nome = tarefa.exchange_name.upper()
+        circuito = self.circuitos[tarefa.exchange_name]
+        try:
+            with METRICA_BUSCA.cronometrar(tarefa.exchange_name, tarefa.funcao.__name__):
+                resultado = tarefa.funcao(*tarefa.args)
+        except ccxt.BadRequest as e:
+            METRICA_ERROS.incrementar(tarefa.exchange_name, type(e).__name__)
+            circuito.registrar_sucesso()  # A exchange respondeu; o problema é a requisição
+            logging.error(f"Requisição inválida em {nome} ({tarefa.chave}): {e}")
+            self._concluir(tarefa, erro=e)
         except (ccxt.NetworkError, ccxt.ExchangeError) as e:
-            logging.warning(f"Tentativa {tentativa+1}: Erro ao buscar {moeda} em {exchange_name.upper()}: {e}")
-            time.sleep(2)  # Espera antes de tentar novamente
+            METRICA_ERROS.incrementar(tarefa.exchange_name, type(e).__name__)
+            circuito.registrar_falha()
+            tarefa.tentativa += 1
+            if tarefa.tentativa < MAX_TENTATIVAS:
+                atraso = min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** (tarefa.tentativa - 1)) * random.uniform(0.5, 1.5)
+                logging.warning(f"Tentativa {tarefa.tentativa}: Erro ao buscar {tarefa.chave} em {nome}: {e}. Nova tentativa em {atraso:.1f}s")
+                self._enfileirar(tarefa, atraso)
+            else:
+                logging.error(f"Desistindo de {tarefa.chave} em {nome} após {tarefa.tentativa} tentativas: {e}")
+                self._concluir(tarefa, erro=e)
         except Exception as e:
-            logging.error(f"Erro inesperado ao buscar {moeda} em {exchange_name.upper()}: {e}")
-            return
+            METRICA_ERROS.incrementar(tarefa.exchange_name, type(e).__name__)
+            circuito.registrar_falha()
+            logging.error(f"Erro inesperado ao buscar {tarefa.chave} em {nome}: {e}")
+            self._concluir(tarefa, erro=e)
+        else:
+            circuito.registrar_sucesso()
+            self._concluir(tarefa, resultado)
+
+
+def buscar_preco_exchange(exchange_name, exchange, moeda, emitir=emitir_preco):
+    """Busca o preço de uma moeda em uma exchange específica (uma tentativa; o agendador trata as falhas)."""
+    ticker = exchange.fetch_ticker(moeda)
+    preco = ticker.get('last')
+    if preco:
+        emitir(exchange_name, moeda, preco, ticker.get('timestamp'), topo_ticker(ticker))
+
+
+def buscar_lote_exchange(exchange_name, exchange, moedas, emitir=emitir_preco):
+    """Busca os tickers de várias moedas em uma única chamada fetch_tickers.
+
+    Se a exchange recusar o lote, reduz o tamanho usado por ela a partir do
+    próximo ciclo (TAMANHO_LOTE e depois metades sucessivas). Algumas
+    exchanges devolvem mais símbolos que os pedidos; só os de `moedas` são emitidos.
+    """
+    try:
+        tickers = exchange.fetch_tickers(moedas)
+    except ccxt.BadRequest:
+        if len(moedas) > 1:
+            tamanho = TAMANHO_LOTE if len(moedas) > TAMANHO_LOTE else len(moedas) // 2
+            TAMANHOS_LOTE[exchange_name] = tamanho
+            logging.warning(f"{exchange_name.upper()} recusou lote de {len(moedas)} moedas, usando lotes de {tamanho}.")
+        raise
+    solicitadas = set(moedas)
+    for moeda, ticker in tickers.items():
+        preco = ticker.get('last')
+        if preco and moeda in solicitadas:
+            emitir(exchange_name, moeda, preco, ticker.get('timestamp'), topo_ticker(ticker))
+
+
+def buscar_book_exchange(exchange_name, exchange, moeda, emitir=emitir_book):
+    """Busca o topo do livro de ofertas de uma moeda (uma tentativa; o agendador trata as falhas)."""
+    emitir(exchange_name, moeda, exchange.fetch_order_book(moeda, limit=PROFUNDIDADE_BOOK))
+
+
+def tarefas_exchange(exchange_name, exchange, moedas):
+    """Retorna as tarefas (chave, funcao, args) de um ciclo de busca para a exchange.
+
+    Enquanto os mercados da exchange não são conhecidos (nem pelo cache em
+    disco), a única tarefa é baixá-los; depois, só as moedas que ela lista são
+    buscadas. No modo 'lote' usa um único fetch_tickers quando a exchange
+    suporta, dividido em lotes se a lista completa já foi recusada, e recorre a
+    fetch_ticker por moeda nas exchanges sem fetchTickers. Com PROFUNDIDADE_BOOK
+    > 0 inclui a busca do livro de ofertas de cada moeda.
+    """
+    if not exchange.markets:
+        return [('mercados', cache_mercados.carregar, (exchange_name, exchange))]
+    moedas = cache_mercados.moedas_suportadas(exchange_name, exchange, moedas)
+    if MODO_COLETA != 'lote' or not exchange.has.get('fetchTickers'):
+        tarefas = [(moeda, buscar_preco_exchange, (exchange_name, exchange, moeda)) for moeda in moedas]
+    else:
+        tamanho = TAMANHOS_LOTE.get(exchange_name) or len(moedas) or 1
+        lotes = [moedas[i:i + tamanho] for i in range(0, len(moedas), tamanho)]
+        tarefas = [(f"lote {i}", buscar_lote_exchange, (exchange_name, exchange, lote)) for i, lote in enumerate(lotes)]
+    if PROFUNDIDADE_BOOK and exchange.has.get('fetchOrderBook'):
+        tarefas += [(f"book {moeda}", buscar_book_exchange, (exchange_name, exchange, moeda)) for moeda in moedas]
+    return tarefas
+
 
 def buscar_precos():
-    """Busca os preços de todas as moedas em todas as exchanges utilizando threads."""
+    """Agenda a busca de todas as moedas em todas as exchanges a cada INTERVALO_BUSCA segundos.
+
+    Tarefas de um ciclo anterior que ainda estão pendentes (exchange lenta ou em
+    backoff) não são duplicadas, e o ciclo não espera por elas.
+    """
+    agendador = AgendadorRequisicoes(EXCHANGES)
+    while True:
+        inicio = time.perf_counter()
+        futuros = {}
+        for nome, exchange in EXCHANGES.items():
+            for chave, funcao, args in tarefas_exchange(nome, exchange, moedas_do_shard(nome, MOEDAS)):
+                futuro = agendador.agendar(nome, chave, funcao, *args)
+                if futuro:
+                    futuros[futuro] = nome
+        concluidos, pendentes = concurrent.futures.wait(futuros, timeout=INTERVALO_BUSCA)
+        duracao = time.perf_counter() - inicio
+        METRICA_CICLO.observar(duracao, MODO_COLETA)
+        atrasadas = sorted({futuros[futuro].upper() for futuro in pendentes})
+        logging.info(
+            f"Ciclo de busca ({MODO_COLETA}) concluído em {duracao:.2f}s: {len(concluidos)}/{len(futuros)} requisições"
+            + (f", pendentes em {', '.join(atrasadas)}" if atrasadas else "")
+        )
+        time.sleep(max(0, INTERVALO_BUSCA - duracao))
+
+
+async def garantir_mercados():
+    """Baixa, em paralelo e fora do loop de eventos, os mercados das exchanges que o cache em disco não cobriu.
+
+    Os clientes assíncronos e de WebSocket copiam os mercados dos clientes de
+    EXCHANGES, então assim o cache também vale para eles.
+    """
+    faltando = [nome for nome, exchange in EXCHANGES.items() if not exchange.markets]
+    resultados = await asyncio.gather(
+        *(asyncio.to_thread(cache_mercados.carregar, nome, EXCHANGES[nome]) for nome in faltando),
+        return_exceptions=True
+    )
+    for nome, resultado in zip(faltando, resultados):
+        if isinstance(resultado, Exception):
+            logging.error(f"Erro ao carregar os mercados de {nome.upper()}: {resultado}")
+
+
+def criar_cliente_async(exchange_name, session):
+    """Cria o cliente ccxt.async_support equivalente ao de EXCHANGES, usando a sessão aiohttp informada."""
+    import ccxt.async_support  # Importado só quando usado: custa quase meio segundo na partida
+    exchange = EXCHANGES[exchange_name]
+    classe = getattr(ccxt.async_support, exchange.id)
+    cliente = classe({'apiKey': exchange.apiKey, 'secret': exchange.secret, 'session': session,
+                      'enableRateLimit': False, 'rateLimit': exchange.rateLimit})
+    if exchange.markets:
+        cliente.set_markets(list(exchange.markets.values()), exchange.currencies)
+    return cliente
+
+
+class ColetorAssincrono:
+    """Coletor de preços em asyncio: todas as buscas (exchange, moeda) de um ciclo ficam em voo ao mesmo tempo.
+
+    A concorrência é limitada por semáforos (global e por exchange), a taxa pelo
+    mesmo TokenBucket do modo com threads e as falhas pelo CircuitBreaker. As
+    emissões vão para uma thread dedicada, sem bloquear o loop de eventos.
+    """
+    def __init__(self, clientes, emitir=emitir_preco):
+        self.clientes = clientes
+        self.emitir = emitir
+        self.semaforo = asyncio.Semaphore(CONCORRENCIA_MAXIMA)
+        self.semaforos = {nome: asyncio.Semaphore(CONCORRENCIA_POR_EXCHANGE) for nome in clientes}
+        self.buckets = {nome: TokenBucket.para_exchange(cliente) for nome, cliente in clientes.items()}
+        self.circuitos = {nome: CircuitBreaker(nome, CIRCUITO_LIMITE_FALHAS, CIRCUITO_TEMPO_ABERTO) for nome in clientes}
+        self.emissor = concurrent.futures.ThreadPoolExecutor(1)
+
+    async def buscar(self, exchange_name, moeda):
+        """Busca o preço de uma moeda com backoff em caso de falha. Retorna True se emitiu um preço."""
+        cliente = self.clientes[exchange_name]
+        bucket = self.buckets[exchange_name]
+        circuito = self.circuitos[exchange_name]
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            if (espera := bucket.reservar()):
+                await asyncio.sleep(espera)
+            if not circuito.permite():
+                return False
+            try:
+                async with self.semaforo, self.semaforos[exchange_name]:
+                    inicio = time.perf_counter()
+                    try:
+                        ticker = await cliente.fetch_ticker(moeda)
+                    finally:
+                        METRICA_BUSCA.observar(time.perf_counter() - inicio, exchange_name, 'fetch_ticker')
+            except ccxt.BadRequest as e:
+                METRICA_ERROS.incrementar(exchange_name, type(e).__name__)
+                circuito.registrar_sucesso()  # A exchange respondeu; o problema é a requisição
+                logging.error(f"Requisição inválida em {exchange_name.upper()} ({moeda}): {e}")
+                return False
+            except (ccxt.NetworkError, ccxt.ExchangeError) as e:
+                METRICA_ERROS.incrementar(exchange_name, type(e).__name__)
+                circuito.registrar_falha()
+                if tentativa == MAX_TENTATIVAS:
+                    logging.error(f"Desistindo de {moeda} em {exchange_name.upper()} após {tentativa} tentativas: {e}")
+                    return False
+                atraso = min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** (tentativa - 1)) * random.uniform(0.5, 1.5)
+                logging.warning(f"Tentativa {tentativa}: Erro ao buscar {moeda} em {exchange_name.upper()}: {e}. Nova tentativa em {atraso:.1f}s")
+                await asyncio.sleep(atraso)
+                continue
+            except Exception as e:
+                METRICA_ERROS.incrementar(exchange_name, type(e).__name__)
+                circuito.registrar_falha()
+                logging.error(f"Erro inesperado ao buscar {moeda} em {exchange_name.upper()}: {e}")
+                return False
+            circuito.registrar_sucesso()
+            preco = ticker.get('last')
+            if preco:
+                self.emissor.submit(self.emitir, exchange_name, moeda, preco, ticker.get('timestamp'), topo_ticker(ticker))
+            return bool(preco)
+        return False
+
+    async def ciclo(self, moedas):
+        """Dispara as buscas de todas as moedas em todas as exchanges. Retorna (sucessos, total)."""
+        buscas = []
+        for nome, cliente in self.clientes.items():
+            suportadas = moedas_do_shard(nome, moedas)
+            if cliente.markets:
+                suportadas = cache_mercados.moedas_suportadas(nome, cliente, suportadas)
+            buscas.extend(self.buscar(nome, moeda) for moeda in suportadas)
+        resultados = await asyncio.gather(*buscas)
+        return sum(resultados), len(buscas)
+
+
+def buscar_precos_async():
+    """Busca os preços a cada INTERVALO_BUSCA segundos com clientes ccxt assíncronos e uma única sessão aiohttp."""
+    async def principal():
+        await garantir_mercados()
+        sessao = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+            limit=CONCORRENCIA_MAXIMA, limit_per_host=CONCORRENCIA_POR_EXCHANGE))
+        clientes = {nome: criar_cliente_async(nome, sessao) for nome in EXCHANGES}
+        coletor = ColetorAssincrono(clientes)
+        try:
+            while True:
+                inicio = time.perf_counter()
+                sucessos, total = await coletor.ciclo(MOEDAS)
+                duracao = time.perf_counter() - inicio
+                METRICA_CICLO.observar(duracao, 'async')
+                logging.info(f"Ciclo de busca (async) concluído em {duracao:.2f}s: {sucessos}/{total} requisições")
+                await asyncio.sleep(max(0, INTERVALO_BUSCA - duracao))
+        finally:
+            for cliente in clientes.values():
+                await cliente.close()
+            await sessao.close()
+    asyncio.run(principal())
+
+
+def criar_cliente_stream(exchange_name):
+    """Cria o cliente ccxt.pro equivalente ao cliente REST configurado em EXCHANGES, com os mesmos mercados."""
+    import ccxt.pro  # Importado só quando usado: custa quase meio segundo na partida
+    exchange = EXCHANGES[exchange_name]
+    classe = getattr(ccxt.pro, exchange.id)
+    cliente = classe({'apiKey': exchange.apiKey, 'secret': exchange.secret})
+    if exchange.markets:
+        cliente.set_markets(list(exchange.markets.values()), exchange.currencies)
+    return cliente
+
+
+async def assistir_moedas(assistir_moeda, moedas):
+    """Roda `assistir_moeda(moeda)` para cada moeda até a primeira falha.
+
+    Ao contrário de um gather, cancela e espera as outras assinaturas antes de
+    repassar o erro, para nenhuma continuar lendo de um cliente que vai ser
+    fechado e recriado na reconexão.
+    """
+    tarefas = [asyncio.ensure_future(assistir_moeda(moeda)) for moeda in moedas]
+    if not tarefas:
+        return
+    try:
+        feitas, _ = await asyncio.wait(tarefas, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+    for tarefa in feitas:
+        if not tarefa.cancelled() and tarefa.exception():
+            raise tarefa.exception()
+
+
+async def assistir_exchange(exchange_name, moedas, emitir=emitir_preco):
+    """Assina os tickers de uma exchange via ccxt.pro, reconectando e reassinando em caso de falha."""
+    espera = 1
+    while True:
+        exchange = criar_cliente_stream(exchange_name)
+        try:
+            await exchange.load_markets()
+            suportadas = cache_mercados.moedas_suportadas(exchange_name, exchange, moedas)
+            logging.info(f"Stream de {exchange_name.upper()} assinando {len(suportadas)} moedas.")
+
+            def emitir_ticker(moeda, ticker):
+                preco = ticker.get('last')
+                if preco:
+                    emitir(exchange_name, moeda, preco, ticker.get('timestamp'), topo_ticker(ticker))
+
+            if exchange.has.get('watchTickers'):
+                solicitadas = set(suportadas)
+                while True:
+                    for moeda, ticker in (await exchange.watch_tickers(suportadas)).items():
+                        if moeda in solicitadas:
+                            emitir_ticker(moeda, ticker)
+                    espera = 1
+            else:
+                # Uma assinatura por moeda, cada uma emitindo assim que seu ticker chega
+                async def assistir_moeda(moeda):
+                    nonlocal espera
+                    while True:
+                        emitir_ticker(moeda, await exchange.watch_ticker(moeda))
+                        espera = 1
+                await assistir_moedas(assistir_moeda, suportadas)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Stream de {exchange_name.upper()} interrompido: {e}. Reconectando em {espera}s...")
+        finally:
+            await exchange.close()
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, STREAM_ESPERA_MAXIMA)
+
+
+async def assistir_books(exchange_name, moedas, emitir=emitir_book):
+    """Assina os livros de ofertas de uma exchange via ccxt.pro, reconectando e reassinando em caso de falha."""
+    espera = 1
+    while True:
+        exchange = criar_cliente_stream(exchange_name)
+        try:
+            await exchange.load_markets()
+            suportadas = cache_mercados.moedas_suportadas(exchange_name, exchange, moedas)
+            if exchange.has.get('watchOrderBookForSymbols'):
+                while True:
+                    book = await exchange.watch_order_book_for_symbols(suportadas, PROFUNDIDADE_BOOK)
+                    emitir(exchange_name, book['symbol'], book)
+                    espera = 1
+            else:
+                async def assistir_moeda(moeda):
+                    while True:
+                        emitir(exchange_name, moeda, await exchange.watch_order_book(moeda, PROFUNDIDADE_BOOK))
+                await assistir_moedas(assistir_moeda, suportadas)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Stream de livros de {exchange_name.upper()} interrompido: {e}. Reconectando em {espera}s...")
+        finally:
+            await exchange.close()
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, STREAM_ESPERA_MAXIMA)
+
+
+async def assistir_stream_bruto(url, moedas, emitir=emitir_preco):
+    """Consome um feed WebSocket genérico, reconectando e reassinando em caso de falha.
+
+    O servidor recebe {"acao": "assinar", "moedas": [...]} a cada conexão e envia
+    mensagens JSON no formato {"exchange": ..., "moeda": ..., "preco": ..., "ts": epoch_ms opcional,
+    "topo": [bid, ask, quantidade no bid, quantidade no ask, volume 24h] opcional}.
+    Mensagens malformadas são descartadas sem derrubar a conexão.
+    """
+    espera = 1
     while True:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            for moeda in MOEDAS:
-                for nome, exchange in EXCHANGES.items():
-                    executor.submit(buscar_preco_exchange, nome, exchange, moeda)
-        time.sleep(INTERVALO_BUSCA)
+        try:
+            async with aiohttp.ClientSession() as session, session.ws_connect(url, heartbeat=30) as ws:
+                await ws.send_json({'acao': 'assinar', 'moedas': moedas})
+                logging.info(f"Stream {url} conectado, {len(moedas)} moedas assinadas.")
+                espera = 1
+                async for mensagem in ws:
+                    if mensagem.type == aiohttp.WSMsgType.TEXT:
+                        try:
+                            dados = mensagem.json()
+                            emitir(dados['exchange'], dados['moeda'], dados['preco'], dados.get('ts'), dados.get('topo'))
+                        except (ValueError, KeyError, TypeError) as e:
+                            logging.warning(f"Mensagem inválida no stream {url} descartada ({e!r}): {mensagem.data[:200]}")
+                    elif mensagem.type == aiohttp.WSMsgType.ERROR:
+                        break
+            logging.warning(f"Stream {url} encerrado pelo servidor. Reconectando em {espera}s...")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"Erro no stream {url}: {e}. Reconectando em {espera}s...")
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, STREAM_ESPERA_MAXIMA)
+
+
+def buscar_precos_stream():
+    """Recebe os preços por WebSocket em vez de polling, emitindo cada atualização assim que chega."""
+    async def principal():
+        if STREAM_URL:
+            # O feed genérico traz todas as exchanges juntas, então é particionado só pela moeda
+            await assistir_stream_bruto(STREAM_URL, moedas_do_shard('stream', MOEDAS))
+        else:
+            await garantir_mercados()
+            assinaturas = [assistir_exchange(nome, moedas_do_shard(nome, MOEDAS)) for nome in EXCHANGES]
+            if PROFUNDIDADE_BOOK:
+                assinaturas += [assistir_books(nome, moedas_do_shard(nome, MOEDAS)) for nome in EXCHANGES]
+            await asyncio.gather(*assinaturas)
+    asyncio.run(principal())
+
+
+def funcao_coleta():
+    """Função de coleta do MODO_COLETA configurado."""
+    return {'stream': buscar_precos_stream, 'async': buscar_precos_async}.get(MODO_COLETA, buscar_precos)
+
+
+class PublicadorFila:
+    """Publicador de um processo coletor: envia os ticks em lotes ao processo do servidor por uma fila.
+
+    Substitui o PublicadorEventos nos coletores. A filtragem das mudanças, a
+    gravação dos ticks e a publicação no Socket.IO ficam com o servidor, que
+    recebe os lotes no LancadorShards.
+    """
+    def __init__(self, fila, janela=0.05):
+        self.fila = fila
+        self.janela = janela
+        self.pendentes = []
+        self.trava = threading.Lock()
+        self.thread = None
+
+    def publicar(self, exchange_name, moeda, preco, timestamp=None, topo=None):
+        self._enfileirar(('preco', exchange_name, moeda, preco, timestamp, topo))
+        return False  # Quem registra no log é o servidor, se o preço mudou
+
+    def publicar_book(self, exchange_name, moeda, bids, asks):
+        self._enfileirar(('book', exchange_name, moeda, bids, asks))
+        return False
+
+    def _enfileirar(self, mensagem):
+        with self.trava:
+            self.pendentes.append(mensagem)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._enviar_periodicamente, daemon=True)
+                self.thread.start()
+
+    def _enviar_periodicamente(self):
+        while True:
+            time.sleep(self.janela)
+            with self.trava:
+                pendentes, self.pendentes = self.pendentes, []
+            if pendentes:
+                self.fila.put(pendentes)
+
+
+def coletar_shard(indice, total, fila):
+    """Ponto de entrada de um processo coletor: coleta a partição `indice` de `total` e envia os ticks pela fila."""
+    global SHARD, publicador, gravador_ticks
+    SHARD = (indice, total)
+    publicador = PublicadorFila(fila)
+    gravador_ticks = None
+    for exchange in EXCHANGES.values():
+        exchange.rateLimit *= total  # Cada coletor usa 1/total do limite de requisições da exchange
+    logging.info(f"Coletor {indice + 1}/{total} iniciado (PID {os.getpid()}, modo {MODO_COLETA}).")
+    funcao_coleta()()
+
+
+class LancadorShards:
+    """Sobe `total` processos coletores e publica neste processo os ticks que eles enviam.
+
+    Cada coletor roda `alvo(indice, total, fila, *argumentos)` (coletar_shard por
+    padrão) em um processo próprio, com seu próprio GIL. Os lotes recebidos pela
+    fila passam por `emitir` (emitir_preco) e pelo publicador do servidor, então
+    os clientes Socket.IO não percebem a diferença. Um coletor que morre é reiniciado.
+    """
+    def __init__(self, total, alvo=None, argumentos=(), emitir=None, intervalo_verificacao=5):
+        self.total = total
+        self.alvo = alvo or coletar_shard
+        self.argumentos = argumentos
+        self.emitir = emitir or emitir_preco
+        self.intervalo_verificacao = intervalo_verificacao
+        self.contexto = multiprocessing.get_context('spawn')
+        self.fila = self.contexto.Queue()
+        self.processos = {}
+        self.ativo = False
+
+    def iniciar(self):
+        os.environ['COLETA_AUTOMATICA'] = '0'  # Os coletores importam este módulo sem iniciar uma coleta própria
+        self.ativo = True
+        threading.Thread(target=self._receber, daemon=True).start()
+        threading.Thread(target=self._supervisionar, daemon=True).start()
+        logging.info(f"Coleta particionada em {self.total} processos coletores.")
+
+    def parar(self):
+        self.ativo = False
+        for processo in self.processos.values():
+            processo.terminate()
+        for processo in self.processos.values():
+            processo.join()
+
+    def _supervisionar(self):
+        while self.ativo:
+            for indice in range(self.total):
+                processo = self.processos.get(indice)
+                if processo is not None and processo.is_alive():
+                    continue
+                if processo is not None:
+                    logging.error(f"Coletor {indice + 1}/{self.total} terminou (código {processo.exitcode}), reiniciando.")
+                processo = self.contexto.Process(target=self.alvo, args=(indice, self.total, self.fila, *self.argumentos), daemon=True)
+                processo.start()
+                self.processos[indice] = processo
+            time.sleep(self.intervalo_verificacao)
+
+    def _receber(self):
+        while True:
+            for tipo, exchange_name, moeda, *dados in self.fila.get():
+                if tipo == 'preco':
+                    self.emitir(exchange_name, moeda, *dados)
+                else:
+                    publicador.publicar_book(exchange_name, moeda, *dados)
+
+
+def iniciar_coleta():
+    """Inicia a coleta de preços conforme MODO_COLETA, em uma thread ou, com SHARDS > 1, em processos coletores."""
+    if SHARDS > 1:
+        LancadorShards(SHARDS).iniciar()
+    else:
+        threading.Thread(target=funcao_coleta(), daemon=True).start()
+
+
+# Iniciar a busca de preços ao carregar o módulo (COLETA_AUTOMATICA=0 desativa, ex.: em benchmarks)
+if os.getenv('COLETA_AUTOMATICA', '1') == '1':
+    iniciar_coleta()
+
+
+@socketio.on('connect')
+def enviar_snapshot():
+    """Como só as mudanças são publicadas, um cliente novo recebe antes o estado atual."""
+    publicador.enviar_snapshot()
 
-# Iniciar a busca de preços em uma thread separada
-threading.Thread(target=buscar_precos, daemon=True).start()
 
 @app.route('/')
 def index():
     return "Servidor SocketIO para preços de criptomoedas rodando!"
 
+
+@app.route('/metrics')
+def exportar_metricas():
+    """Métricas do coletor no formato texto do Prometheus."""
+    return Response(metricas.registro.exportar(), mimetype=metricas.TIPO_CONTEUDO)
+
+
 if __name__ == '__main__':
     socketio.run(app, host='localhost', port=5000, debug=True)